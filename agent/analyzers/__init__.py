@@ -1,5 +1,9 @@
-from .base import Analyzer, AnalyzerResult, Finding, build_finding
+from .base import Analyzer, AnalyzerCancelled, AnalyzerResult, Finding, build_finding
 from .bandit import BanditAnalyzer
+from .cache import AnalyzerCache
+from .executor import AnalyzerTiming, GateExecutor
+from .history import GateHistory
+from .impact import TestImpactIndex
 from .pip_audit import PipAuditAnalyzer
 from .pytest_cov import PytestCoverageAnalyzer
 from .repo_hygiene import RepoHygieneAnalyzer
@@ -9,7 +13,13 @@ from .ui import AxeAnalyzer, LighthouseAnalyzer, Pa11yAnalyzer
 
 __all__ = [
     "Analyzer",
+    "AnalyzerCache",
+    "AnalyzerCancelled",
     "AnalyzerResult",
+    "AnalyzerTiming",
+    "GateExecutor",
+    "GateHistory",
+    "TestImpactIndex",
     "Finding",
     "build_finding",
     "RuffAnalyzer",
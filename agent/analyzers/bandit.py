@@ -8,6 +8,8 @@ from .base import Analyzer, CommandResult, Grade, build_finding
 
 class BanditAnalyzer(Analyzer):
     name = "bandit"
+    cache_patterns = ("*.py", ".bandit", "pyproject.toml")
+    cache_scope_to_targets = True
 
     def available(self) -> bool:
         return self._which("bandit")
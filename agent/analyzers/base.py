@@ -3,11 +3,23 @@ from __future__ import annotations
 import json
 import os
 import shutil
+import signal
 import subprocess
+import threading
 import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .cache import AnalyzerCache
+
+
+_CANCEL_POLL_SECONDS = 0.1
+
+
+class AnalyzerCancelled(RuntimeError):
+    """Raised inside an analyzer whose run was cancelled by the gate executor."""
 
 
 @dataclass
@@ -33,6 +45,19 @@ class Finding:
             'data': self.data,
         }
 
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "Finding":
+        return cls(
+            id=payload.get('id', ''),
+            message=payload.get('message', ''),
+            severity=payload.get('severity', 'info'),
+            path=payload.get('path'),
+            line=payload.get('line'),
+            column=payload.get('column'),
+            suggestion=payload.get('suggestion'),
+            data=payload.get('data') or {},
+        )
+
 
 @dataclass
 class CommandResult:
@@ -61,6 +86,7 @@ class AnalyzerResult:
     data: Dict[str, Any]
     artifacts: Dict[str, Any]
     command: Optional[CommandResult] = None
+    cached: bool = False
 
     @property
     def ok(self) -> bool:
@@ -87,15 +113,63 @@ class AnalyzerResult:
             }
             if self.command
             else None,
+            'cached': self.cached,
         }
 
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "AnalyzerResult":
+        command = payload.get('command')
+        return cls(
+            name=payload.get('name', ''),
+            status=payload.get('status', 'error'),
+            summary=payload.get('summary', ''),
+            findings=[Finding.from_dict(f) for f in payload.get('findings') or []],
+            suggestions=list(payload.get('suggestions') or []),
+            data=payload.get('data') or {},
+            artifacts=payload.get('artifacts') or {},
+            command=CommandResult(
+                command=command.get('cmd') or [],
+                code=command.get('code'),
+                output=command.get('output') or '',
+                elapsed=command.get('elapsed') or 0.0,
+            )
+            if isinstance(command, dict)
+            else None,
+            cached=bool(payload.get('cached', False)),
+        )
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    proc.kill()
+
 
 class Analyzer:
     name: str = "base"
     produces_artifact: Optional[str] = None
+    # Result caching (see ``AnalyzerCache``). ``cache_patterns`` limits the
+    # files whose blob hashes feed the cache key; empty means every file.
+    cacheable: bool = True
+    cache_patterns: Tuple[str, ...] = ()
+    cache_scope_to_targets: bool = False
+    cache: Optional["AnalyzerCache"] = None
 
     def __init__(self, settings: Optional[Dict[str, Any]] = None) -> None:
         self.settings = settings or {}
+        self._cancel_event = threading.Event()
+
+    def cancel(self) -> None:
+        """Request cancellation; any running command is killed at the next poll."""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
 
     def available(self) -> bool:
         return True
@@ -144,6 +218,24 @@ class Analyzer:
         repo_root: str,
         cycle_dir: str,
         files: Optional[List[str]] = None,
+    ) -> AnalyzerResult:
+        cache = self.cache if self.cacheable else None
+        key = cache.key_for(self, repo_root, files) if cache is not None else None
+        if key is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                self._persist_artifacts(cycle_dir, hit.artifacts)
+                return hit
+        result = self.run_analysis(repo_root, cycle_dir, files)
+        if key is not None and result.status not in {"error", "skipped"}:
+            cache.put(key, result)
+        return result
+
+    def run_analysis(
+        self,
+        repo_root: str,
+        cycle_dir: str,
+        files: Optional[List[str]] = None,
     ) -> AnalyzerResult:
         if not self.available():
             return AnalyzerResult(
@@ -178,17 +270,40 @@ class Analyzer:
     def _which(cmd: str) -> bool:
         return shutil.which(cmd) is not None
 
-    @staticmethod
-    def _run(cmd: Sequence[str], cwd: Optional[str] = None, timeout: int = 1200) -> CommandResult:
+    def _run(
+        self,
+        cmd: Sequence[str],
+        cwd: Optional[str] = None,
+        timeout: int = 1200,
+        env: Optional[Dict[str, str]] = None,
+    ) -> CommandResult:
+        if self.cancelled:
+            raise AnalyzerCancelled(f"{self.name} cancelled before running {cmd[0]}")
         start = time.time()
-        proc = subprocess.run(
+        proc = subprocess.Popen(
             list(cmd),
             cwd=cwd,
+            env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            timeout=timeout,
+            # Own process group, so a kill also reaches pytest workers and
+            # other grandchildren.
+            start_new_session=os.name == "posix",
         )
-        out = proc.stdout.decode("utf-8", errors="replace")
+        while True:
+            try:
+                raw, _ = proc.communicate(timeout=_CANCEL_POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                if self.cancelled:
+                    _kill_tree(proc)
+                    proc.communicate()
+                    raise AnalyzerCancelled(f"{self.name} cancelled while running {cmd[0]}")
+                if time.time() - start >= timeout:
+                    _kill_tree(proc)
+                    proc.communicate()
+                    raise subprocess.TimeoutExpired(list(cmd), timeout)
+        out = (raw or b"").decode("utf-8", errors="replace")
         return CommandResult(command=list(cmd), code=proc.returncode, output=out, elapsed=time.time() - start)
 
     @staticmethod
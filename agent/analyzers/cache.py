@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+from ..utils import path_lock
+from .base import AnalyzerResult
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .base import Analyzer
+
+# Files the agent itself rewrites every cycle; they never influence analyzer output.
+DEFAULT_IGNORED_PREFIXES = ("agent/artifacts/", "agent/state/", "agent/local/")
+# Tool configuration that applies even when an analyzer is scoped to a few targets.
+_CONFIG_FILES = {"pyproject.toml", "setup.cfg", "tox.ini", "ruff.toml", ".ruff.toml", ".bandit"}
+_DELETED = "deleted"
+
+
+def _git(args: Sequence[str], cwd: str, stdin: Optional[bytes] = None) -> Optional[bytes]:
+    try:
+        proc = subprocess.run(
+            ["git", *args],
+            cwd=cwd,
+            input=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=False,
+            timeout=60,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def build_manifest(
+    repo_root: str,
+    ignored_prefixes: Sequence[str] = DEFAULT_IGNORED_PREFIXES,
+) -> Optional[Dict[str, str]]:
+    """Map every tracked or untracked (non-ignored) path to its git blob hash.
+
+    Clean files reuse the hash recorded in the index; only dirty and
+    untracked files are re-hashed, so this stays cheap on large trees.
+    Returns ``None`` when ``repo_root`` is not a git work tree.
+    """
+
+    staged = _git(["ls-files", "-s", "-z"], repo_root)
+    status = _git(
+        ["status", "--porcelain=v1", "-z", "--untracked-files=all", "--no-renames"], repo_root
+    )
+    if staged is None or status is None:
+        return None
+
+    def _keep(path: str) -> bool:
+        return not any(path.startswith(prefix) for prefix in ignored_prefixes)
+
+    manifest: Dict[str, str] = {}
+    for entry in staged.decode("utf-8", errors="replace").split("\0"):
+        if not entry or "\t" not in entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        parts = meta.split()
+        if len(parts) >= 2 and _keep(path):
+            manifest[path] = parts[1]
+
+    dirty: List[str] = []
+    for entry in status.decode("utf-8", errors="replace").split("\0"):
+        if len(entry) < 4:
+            continue
+        code, path = entry[:2], entry[3:]
+        if not _keep(path):
+            continue
+        if "D" in code or not os.path.isfile(os.path.join(repo_root, path)):
+            manifest[path] = _DELETED
+        else:
+            dirty.append(path)
+
+    if dirty:
+        stdin = "\n".join(dirty).encode("utf-8")
+        hashed = _git(["hash-object", "--stdin-paths"], repo_root, stdin=stdin)
+        if hashed is None:
+            return None
+        for path, oid in zip(dirty, hashed.decode("ascii", errors="replace").split()):
+            manifest[path] = oid
+    return manifest
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+class AnalyzerCache:
+    """Persistent analyzer result cache keyed by the content the analyzer examined.
+
+    A key combines the analyzer name, its settings, the targets it was asked
+    to check and the git blob hashes of the files it reads. Entries live as
+    one JSON file each under ``root`` and are evicted oldest-first once
+    ``max_entries`` is exceeded or when older than ``ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_entries: int = 256,
+        ttl_seconds: Optional[float] = None,
+        ignored_prefixes: Sequence[str] = DEFAULT_IGNORED_PREFIXES,
+    ) -> None:
+        self.root = Path(root)
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.ignored_prefixes = tuple(ignored_prefixes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._manifests: Dict[str, Optional[Dict[str, str]]] = {}
+
+    def manifest(self, repo_root: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            if repo_root not in self._manifests:
+                self._manifests[repo_root] = build_manifest(repo_root, self.ignored_prefixes)
+            return self._manifests[repo_root]
+
+    def invalidate_manifest(self) -> None:
+        with self._lock:
+            self._manifests.clear()
+
+    def key_for(
+        self,
+        analyzer: "Analyzer",
+        repo_root: str,
+        files: Optional[List[str]],
+    ) -> Optional[str]:
+        manifest = self.manifest(repo_root)
+        if manifest is None:
+            return None
+        targets = sorted(files or [])
+        examined = [
+            [path, oid]
+            for path, oid in sorted(manifest.items())
+            if self._examines(analyzer, path, targets)
+        ]
+        payload = {
+            "analyzer": analyzer.name,
+            "class": type(analyzer).__name__,
+            "settings": analyzer.settings,
+            "targets": targets,
+            "files": examined,
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    @staticmethod
+    def _examines(analyzer: "Analyzer", path: str, targets: List[str]) -> bool:
+        name = os.path.basename(path)
+        patterns = analyzer.cache_patterns
+        if patterns and not any(
+            fnmatch.fnmatch(name, p) or fnmatch.fnmatch(path, p) for p in patterns
+        ):
+            return False
+        if analyzer.cache_scope_to_targets and targets and name not in _CONFIG_FILES:
+            return any(path == t or path.startswith(t.rstrip("/") + "/") for t in targets)
+        return True
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def get(self, key: str) -> Optional[AnalyzerResult]:
+        path = self._path(key)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        created = float(payload.get("created_at", 0.0))
+        if self.ttl_seconds and time.time() - created > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # keep recently used entries at the front of the LRU
+        except OSError:
+            pass
+        result = AnalyzerResult.from_dict(payload.get("result") or {})
+        result.cached = True
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: AnalyzerResult) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        payload: Dict[str, Any] = {"created_at": time.time(), "result": result.to_dict()}
+        tmp = self.root / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_text(json.dumps(payload, default=str), encoding="utf-8")
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    def _prune(self) -> None:
+        # Gates in parallel sandboxes each hold their own cache on this root.
+        with path_lock(self.root):
+            entries = sorted(self.root.glob("*.json"), key=_mtime)
+            for stale in entries[: max(0, len(entries) - self.max_entries)]:
+                stale.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for entry in self.root.glob("*.json"):
+            entry.unlink(missing_ok=True)
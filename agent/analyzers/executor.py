@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from .base import Analyzer, AnalyzerCancelled, AnalyzerResult
+
+_WATCH_INTERVAL = 0.05
+# How long a finished gate waits for cancelled analyzers to kill their commands.
+_CANCEL_GRACE = 2.0
+
+
+@dataclass
+class AnalyzerTiming:
+    name: str
+    status: str
+    queued_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    timeout: Optional[float] = None
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "elapsed": self.elapsed,
+            "queue_wait": (self.started_at - self.queued_at) if self.started_at else None,
+            "timeout": self.timeout,
+        }
+
+
+def error_result(name: str, summary: str, error: str, status: str = "error") -> AnalyzerResult:
+    return AnalyzerResult(
+        name=name,
+        status=status,
+        summary=summary,
+        findings=[],
+        suggestions=[],
+        data={"error": error},
+        artifacts={},
+    )
+
+
+class GateExecutor:
+    """Run independent analyzers on a bounded thread pool.
+
+    Analyzers spend nearly all of their time in child processes, so threads
+    are enough to overlap them. Each analyzer gets its own wall-clock budget
+    measured from the moment it starts running (not from when it was queued);
+    when the budget is exceeded the analyzer is cancelled, which kills its
+    running command, and an ``error`` result is recorded in its place.
+
+    Analyzers are submitted in the order given. When ``stop_when`` returns
+    true for the results gathered so far, everything still queued or running
+    is cancelled and reported with status ``cancelled``.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        default_timeout: Optional[float] = None,
+        timeouts: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+
+    def timeout_for(self, analyzer: Analyzer) -> Optional[float]:
+        value = self.timeouts.get(analyzer.name, self.default_timeout)
+        return float(value) if value else None
+
+    def run(
+        self,
+        analyzers: Sequence[Analyzer],
+        repo_root: str,
+        cycle_dir: str,
+        files: Optional[List[str]] = None,
+        stop_when: Optional[Callable[[Dict[str, AnalyzerResult]], bool]] = None,
+    ) -> tuple[Dict[str, AnalyzerResult], Dict[str, AnalyzerTiming]]:
+        results: Dict[str, AnalyzerResult] = {}
+        timings: Dict[str, AnalyzerTiming] = {}
+        if not analyzers:
+            return results, timings
+
+        def _invoke(analyzer: Analyzer) -> AnalyzerResult:
+            timings[analyzer.name].started_at = time.time()
+            try:
+                return analyzer.analyze(repo_root, cycle_dir, files=files)
+            finally:
+                timings[analyzer.name].finished_at = time.time()
+
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(analyzers)))
+        futures: Dict[Future, Analyzer] = {}
+        abandoned: List[Future] = []
+        try:
+            for analyzer in analyzers:
+                timings[analyzer.name] = AnalyzerTiming(
+                    name=analyzer.name,
+                    status="queued",
+                    queued_at=time.time(),
+                    timeout=self.timeout_for(analyzer),
+                )
+                futures[pool.submit(_invoke, analyzer)] = analyzer
+
+            pending = set(futures)
+            timed_out: set[str] = set()
+            while pending:
+                done, pending = wait(pending, timeout=_WATCH_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    analyzer = futures[future]
+                    results[analyzer.name] = self._collect(future, analyzer, timings, timed_out)
+                changed = bool(done)
+                now = time.time()
+                for future in list(pending):
+                    analyzer = futures[future]
+                    timing = timings[analyzer.name]
+                    if timing.timeout is None or timing.started_at is None:
+                        continue
+                    if analyzer.name in timed_out:
+                        continue
+                    if now - timing.started_at >= timing.timeout:
+                        timed_out.add(analyzer.name)
+                        analyzer.cancel()
+                        pending.discard(future)
+                        abandoned.append(future)
+                        changed = True
+                        timing.finished_at = now
+                        timing.status = "timeout"
+                        results[analyzer.name] = error_result(
+                            analyzer.name,
+                            f"timed out after {timing.timeout:.0f}s",
+                            "timeout",
+                        )
+                if changed and pending and stop_when is not None and stop_when(dict(results)):
+                    for future in pending:
+                        self._abandon(future, futures[future], timings, results)
+                    abandoned.extend(pending)
+                    pending = set()
+        finally:
+            for future, analyzer in futures.items():
+                if not future.done():
+                    analyzer.cancel()
+            # Let cancelled analyzers kill their commands before the next gate
+            # starts; ones that cannot be interrupted (pure-Python scans)
+            # finish in the background.
+            if abandoned:
+                wait(abandoned, timeout=_CANCEL_GRACE)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        ordered = {a.name: results[a.name] for a in analyzers if a.name in results}
+        return ordered, timings
+
+    @staticmethod
+    def _abandon(
+        future: Future,
+        analyzer: Analyzer,
+        timings: Dict[str, AnalyzerTiming],
+        results: Dict[str, AnalyzerResult],
+    ) -> None:
+        timing = timings[analyzer.name]
+        if future.cancel():
+            timing.status = "skipped"
+        else:
+            analyzer.cancel()
+            timing.status = "cancelled"
+            timing.finished_at = time.time()
+        results[analyzer.name] = error_result(
+            analyzer.name,
+            "skipped: gate decision already final",
+            "fail-fast",
+            status="cancelled",
+        )
+
+    @staticmethod
+    def _collect(
+        future: Future,
+        analyzer: Analyzer,
+        timings: Dict[str, AnalyzerTiming],
+        timed_out: set[str],
+    ) -> AnalyzerResult:
+        timing = timings[analyzer.name]
+        try:
+            result = future.result()
+        except AnalyzerCancelled as exc:
+            timing.status = "timeout" if analyzer.name in timed_out else "cancelled"
+            return error_result(analyzer.name, str(exc), timing.status)
+        except Exception as exc:  # pragma: no cover - runtime guard
+            timing.status = "error"
+            return error_result(analyzer.name, f"exception: {exc}", str(exc))
+        timing.status = "completed"
+        return result
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from ..utils import path_lock, write_text_atomic
+from .base import Analyzer
+
+_EMA_ALPHA = 0.3
+_DEFAULT_ELAPSED = 30.0
+_MIN_REJECTION_RATE = 0.05
+
+
+class GateHistory:
+    """Historical analyzer cost and rejection rate used to order gate runs.
+
+    Durations are tracked as an exponential moving average so a slow outlier
+    does not reorder the gate for long; rejection rates use add-one
+    smoothing so a new analyzer starts at 50%.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.stats: Dict[str, Dict[str, Any]] = self._read()
+        self._pending: List[Tuple[str, float, bool]] = []
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    def save(self) -> None:
+        """Fold this run's samples into the file; parallel gates share it."""
+        with path_lock(self.path):
+            self.stats = self._read()
+            for sample in self._pending:
+                self._apply(*sample)
+            self._pending = []
+            write_text_atomic(self.path, json.dumps(self.stats, indent=2, sort_keys=True))
+
+    def expected_elapsed(self, name: str) -> float:
+        entry = self.stats.get(name)
+        if entry and entry.get("avg_elapsed") is not None:
+            return float(entry["avg_elapsed"])
+        known = sorted(
+            float(e["avg_elapsed"]) for e in self.stats.values() if e.get("avg_elapsed") is not None
+        )
+        return known[len(known) // 2] if known else _DEFAULT_ELAPSED
+
+    def rejection_rate(self, name: str) -> float:
+        entry = self.stats.get(name) or {}
+        runs = int(entry.get("runs", 0))
+        rejections = int(entry.get("rejections", 0))
+        return (rejections + 1) / (runs + 2)
+
+    def cost(self, name: str) -> float:
+        """Expected seconds spent per rejection; lower runs first."""
+        return self.expected_elapsed(name) / max(self.rejection_rate(name), _MIN_REJECTION_RATE)
+
+    def order(self, analyzers: Sequence[Analyzer]) -> List[Analyzer]:
+        position = {a.name: i for i, a in enumerate(analyzers)}
+        return sorted(analyzers, key=lambda a: (self.cost(a.name), position[a.name]))
+
+    def record(self, name: str, elapsed: float, rejected: bool) -> None:
+        self._pending.append((name, elapsed, rejected))
+        self._apply(name, elapsed, rejected)
+
+    def _apply(self, name: str, elapsed: float, rejected: bool) -> None:
+        entry = self.stats.setdefault(name, {"runs": 0, "rejections": 0, "avg_elapsed": None})
+        previous = entry.get("avg_elapsed")
+        if previous is None:
+            entry["avg_elapsed"] = elapsed
+        else:
+            entry["avg_elapsed"] = (1 - _EMA_ALPHA) * float(previous) + _EMA_ALPHA * elapsed
+        entry["runs"] = int(entry.get("runs", 0)) + 1
+        if rejected:
+            entry["rejections"] = int(entry.get("rejections", 0)) + 1
+
+    def names(self) -> Iterable[str]:
+        return self.stats.keys()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..utils import path_lock, write_text_atomic
+
+DOC_SUFFIXES = (".md", ".rst")
+
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _normalise(path: str, repo_root: str) -> str:
+    if os.path.isabs(path):
+        path = os.path.relpath(path, repo_root)
+    path = path.replace(os.sep, "/")
+    return path[2:] if path.startswith("./") else path
+
+
+class TestImpactIndex:
+    """Persisted mapping from source files to the test files that execute them.
+
+    The index is rebuilt from per-test coverage contexts after every full
+    suite run. Between full runs it answers which tests a change touches;
+    ``plan`` returns ``None`` whenever it cannot answer safely (files no
+    test was seen executing, conftest edits, stale index), which means
+    "run everything"; it only selects nothing when every change is docs.
+    """
+
+    __test__ = False  # not a pytest test class despite the name
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.built_at: float = 0.0
+        self.runs_since_full: int = 0
+        self.files: Dict[str, List[str]] = {}
+        self._rebuilt = False
+        self._selective_runs = 0
+        self.load()
+
+    def load(self) -> None:
+        self.built_at, self.runs_since_full, self.files = 0.0, 0, {}
+        if not self.path.exists():
+            return
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        self.built_at = float(payload.get("built_at", 0.0))
+        self.runs_since_full = int(payload.get("runs_since_full", 0))
+        files = payload.get("files")
+        self.files = files if isinstance(files, dict) else {}
+
+    def record_selective_run(self) -> None:
+        self.runs_since_full += 1
+        self._selective_runs += 1
+
+    def save(self) -> None:
+        """Write the index; parallel gates share it, so a gate that did not
+        rebuild only adds its selective runs to whatever is on disk."""
+        with path_lock(self.path):
+            if not self._rebuilt:
+                selective = self._selective_runs
+                self.load()
+                self.runs_since_full += selective
+            payload = {
+                "built_at": self.built_at,
+                "runs_since_full": self.runs_since_full,
+                "files": self.files,
+            }
+            write_text_atomic(self.path, json.dumps(payload, indent=2, sort_keys=True))
+            self._rebuilt = False
+            self._selective_runs = 0
+
+    @property
+    def empty(self) -> bool:
+        return not self.built_at
+
+    def full_run_reason(self, full_every: int, max_age: Optional[float]) -> Optional[str]:
+        if self.empty:
+            return "no impact index yet"
+        if full_every and self.runs_since_full >= full_every:
+            return f"scheduled full run after {self.runs_since_full} selective runs"
+        if max_age and time.time() - self.built_at > max_age:
+            return "impact index older than max_age"
+        return None
+
+    def plan(self, changed: Iterable[str]) -> Tuple[Optional[List[str]], str]:
+        """Return ``(tests, reason)``; ``tests`` is ``None`` when a full run is required."""
+
+        changed = [c for c in changed if c]
+        if not changed:
+            return None, "no changed files to select on"
+        selected: Set[str] = set()
+        for path in changed:
+            name = os.path.basename(path)
+            if name == "conftest.py":
+                return None, f"{path} affects test collection"
+            if is_test_file(path):
+                selected.add(path)
+            elif path.endswith(DOC_SUFFIXES):
+                continue
+            elif self.files.get(path):
+                selected.update(self.files[path])
+            else:
+                # Absent, or only run at import time outside any test
+                # context: the index cannot say which tests depend on it.
+                return None, f"{path} is not covered by the impact index"
+        return sorted(selected), f"{len(selected)} impacted test files"
+
+    def rebuild(self, coverage_payload: Dict[str, Any], repo_root: str) -> None:
+        files: Dict[str, Set[str]] = {}
+        measured = coverage_payload.get("files") if isinstance(coverage_payload, dict) else None
+        for path, entry in (measured or {}).items():
+            contexts = entry.get("contexts") if isinstance(entry, dict) else None
+            rel = _normalise(path, repo_root)
+            if rel.startswith("../"):
+                continue  # site-packages or the agent itself when run against another repo
+            tests = files.setdefault(rel, set())
+            for labels in (contexts or {}).values():
+                for label in labels:
+                    test_file = label.split("::", 1)[0] if "::" in label else None
+                    if test_file:
+                        tests.add(_normalise(test_file, repo_root))
+        self.files = {path: sorted(tests) for path, tests in files.items()}
+        self.built_at = time.time()
+        self.runs_since_full = 0
+        self._rebuilt = True
@@ -8,6 +8,14 @@ from .base import Analyzer, CommandResult, Grade, build_finding
 
 class PipAuditAnalyzer(Analyzer):
     name = "pip_audit"
+    cache_patterns = (
+        "requirements*.txt",
+        "pyproject.toml",
+        "setup.py",
+        "setup.cfg",
+        "Pipfile.lock",
+        "poetry.lock",
+    )
 
     def available(self) -> bool:
         return self._which("pip-audit")
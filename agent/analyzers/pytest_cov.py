@@ -6,6 +6,11 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from .base import Analyzer, AnalyzerResult, CommandResult, Grade, build_finding
+from .impact import TestImpactIndex, _normalise, is_test_file
+
+_IMPACT_PLUGIN = "agent.analyzers.pytest_impact_plugin"
+_AGENT_PARENT = str(Path(__file__).resolve().parents[2])
+_PYTEST_COMPLETED = (0, 1)  # all tests passed / some tests failed
 
 
 class PytestCoverageAnalyzer(Analyzer):
@@ -14,7 +19,7 @@ class PytestCoverageAnalyzer(Analyzer):
     def available(self) -> bool:
         return self._which("pytest") and self._which("coverage")
 
-    def analyze(
+    def run_analysis(
         self,
         repo_root: str,
         cycle_dir: str,
@@ -34,6 +39,24 @@ class PytestCoverageAnalyzer(Analyzer):
         timeout = int(self.settings.get("timeout", 3600))
         junit_path = Path(cycle_dir) / "junit.xml"
 
+        index = self._impact_index()
+        tests, selection = self._select_tests(index, files)
+        if tests == []:
+            # Only documentation changed; ``plan`` falls back to a full run
+            # for any source file it cannot map to tests.
+            index.record_selective_run()
+            index.save()
+            return AnalyzerResult(
+                name=self.name,
+                status="ok",
+                summary="no impacted tests (documentation only)",
+                findings=[],
+                suggestions=[],
+                data={"selection": selection},
+                artifacts={},
+            )
+        full_run = tests is None
+
         erase_res = self._run(["coverage", "erase"], cwd=repo_root, timeout=timeout)
 
         cmd = [
@@ -42,20 +65,32 @@ class PytestCoverageAnalyzer(Analyzer):
             "-m",
             "pytest",
             "-q",
-            "--maxfail=1",
             "--disable-warnings",
             f"--junitxml={junit_path}",
         ]
+        env = None
+        building = full_run and index is not None
+        if not building:
+            # Index-building runs need every test's contexts, failing or not.
+            cmd.append("--maxfail=1")
+        else:
+            cmd.extend(["-p", _IMPACT_PLUGIN])
+            env = dict(os.environ)
+            paths = (_AGENT_PARENT, env.get("PYTHONPATH"))
+            env["PYTHONPATH"] = os.pathsep.join(p for p in paths if p)
         extra_args = self.settings.get("args") or []
         if isinstance(extra_args, str):
             extra_args = [extra_args]
         cmd.extend(extra_args)
-        if files:
-            cmd.extend(files)
+        if tests:
+            cmd.extend(tests)
 
-        pytest_res = self._run(cmd, cwd=repo_root, timeout=timeout)
+        pytest_res = self._run(cmd, cwd=repo_root, timeout=timeout, env=env)
 
-        cov_res = self._run(["coverage", "json"], cwd=repo_root, timeout=timeout)
+        json_cmd = ["coverage", "json"]
+        if building:
+            json_cmd.append("--show-contexts")
+        cov_res = self._run(json_cmd, cwd=repo_root, timeout=timeout)
 
         cov_json_path = Path(repo_root) / "coverage.json"
         cov_payload: Dict[str, Any] = {}
@@ -72,12 +107,30 @@ class PytestCoverageAnalyzer(Analyzer):
                 # fallback copy
                 dest.write_text(json.dumps(cov_payload, indent=2))
 
+        if index is not None:
+            if full_run:
+                # Failing tests still record contexts; only an interrupted or
+                # broken session (exit 2+) leaves the index incomplete.
+                if pytest_res.code in _PYTEST_COMPLETED and cov_res.code == 0:
+                    index.rebuild(cov_payload, repo_root)
+                    selection["index_rebuilt"] = True
+                _strip_contexts(cov_payload)
+            else:
+                index.record_selective_run()
+            index.save()
+
+        if not full_run:
+            # Tests covering the changed files all ran, so their coverage is
+            # meaningful even though the repo-wide total is not.
+            selection["changed_coverage"] = _changed_coverage(cov_payload, files or [], repo_root)
+
         report = {
             "pytest_code": pytest_res.code,
             "pytest_output": pytest_res.output,
             "coverage": cov_payload,
             "coverage_exit": cov_res.code,
             "erase_exit": erase_res.code,
+            "selection": selection,
         }
 
         artifacts = {"pytest_cov.json": report}
@@ -119,3 +172,58 @@ class PytestCoverageAnalyzer(Analyzer):
             artifacts=artifacts,
             command=pytest_res,
         )
+
+    def _impact_index(self) -> Optional[TestImpactIndex]:
+        path = self.settings.get("impact_index")
+        return TestImpactIndex(Path(path)) if path else None
+
+    def _select_tests(
+        self,
+        index: Optional[TestImpactIndex],
+        files: Optional[List[str]],
+    ) -> tuple[Optional[List[str]], Dict[str, Any]]:
+        if index is None:
+            return None, {"mode": "full", "reason": "test impact selection disabled"}
+        reason = index.full_run_reason(
+            int(self.settings.get("full_every", 10)),
+            self.settings.get("impact_max_age", 86400),
+        )
+        if reason is None:
+            tests, reason = index.plan(files or [])
+            if tests is not None:
+                return tests, {"mode": "impacted", "reason": reason, "tests": tests}
+        return None, {"mode": "full", "reason": reason}
+
+
+def _strip_contexts(cov_payload: Dict[str, Any]) -> None:
+    """Drop per-line contexts once indexed; they dwarf the rest of the report."""
+
+    for entry in (cov_payload.get("files") or {}).values():
+        if isinstance(entry, dict):
+            entry.pop("contexts", None)
+
+
+def _changed_coverage(
+    cov_payload: Dict[str, Any],
+    files: List[str],
+    repo_root: str,
+) -> Optional[Dict[str, Any]]:
+    """Statement coverage across the changed source files the run measured."""
+
+    measured = {
+        _normalise(path, repo_root): entry.get("summary") or {}
+        for path, entry in (cov_payload.get("files") or {}).items()
+        if isinstance(entry, dict)
+    }
+    covered = statements = 0
+    counted: List[str] = []
+    for path in files:
+        summary = measured.get(path)
+        if summary is None or is_test_file(path):
+            continue
+        covered += int(summary.get("covered_lines", 0))
+        statements += int(summary.get("num_statements", 0))
+        counted.append(path)
+    if not statements:
+        return None
+    return {"files": counted, "percent_covered": covered * 100.0 / statements}
@@ -0,0 +1,37 @@
+"""Pytest plugin that labels coverage data with the running test's node id.
+
+Loaded by ``PytestCoverageAnalyzer`` on full-suite runs (``-p
+agent.analyzers.pytest_impact_plugin``). It switches the active coverage
+context per test so ``coverage json --show-contexts`` can be turned into a
+file -> test impact index without overriding the repository's own coverage
+configuration.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+try:  # pragma: no cover - optional dependency
+    import coverage
+except Exception:  # pragma: no cover
+    coverage = None  # type: ignore
+
+
+def _switch(context: str) -> None:
+    if coverage is None:
+        return
+    cov = coverage.Coverage.current()
+    if cov is None:
+        return
+    try:
+        cov.switch_context(context)
+    except Exception:
+        # dynamic_context configured by the repo, or coverage not started.
+        pass
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    _switch(item.nodeid)
+    yield
+    _switch("")
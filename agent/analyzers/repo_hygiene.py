@@ -10,7 +10,7 @@ from .base import Analyzer, AnalyzerResult, build_finding
 class RepoHygieneAnalyzer(Analyzer):
     name = "repo_hygiene"
 
-    def analyze(
+    def run_analysis(
         self,
         repo_root: str,
         cycle_dir: str,
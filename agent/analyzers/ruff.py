@@ -8,6 +8,8 @@ from .base import Analyzer, CommandResult, Grade, build_finding
 
 class RuffAnalyzer(Analyzer):
     name = "ruff"
+    cache_patterns = ("*.py", "*.pyi", "pyproject.toml", "ruff.toml", ".ruff.toml")
+    cache_scope_to_targets = True
 
     def available(self) -> bool:
         return self._which("ruff")
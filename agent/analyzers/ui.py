@@ -16,11 +16,17 @@ def _slugify(url: str) -> str:
 
 class LighthouseAnalyzer(Analyzer):
     name = "lighthouse"
+    cacheable = False
 
     def available(self) -> bool:
         return self._which("lighthouse")
 
-    def analyze(self, repo_root: str, cycle_dir: str, files: Optional[List[str]] = None) -> AnalyzerResult:
+    def run_analysis(
+        self,
+        repo_root: str,
+        cycle_dir: str,
+        files: Optional[List[str]] = None,
+    ) -> AnalyzerResult:
         targets = self.settings.get("targets", [])
         if isinstance(targets, str):
             targets = [targets]
@@ -131,11 +137,17 @@ class LighthouseAnalyzer(Analyzer):
 
 class AxeAnalyzer(Analyzer):
     name = "axe"
+    cacheable = False
 
     def available(self) -> bool:
         return self._which("axe") or self._which("npx")
 
-    def analyze(self, repo_root: str, cycle_dir: str, files: Optional[List[str]] = None) -> AnalyzerResult:
+    def run_analysis(
+        self,
+        repo_root: str,
+        cycle_dir: str,
+        files: Optional[List[str]] = None,
+    ) -> AnalyzerResult:
         targets = self.settings.get("targets", [])
         if isinstance(targets, str):
             targets = [targets]
@@ -213,11 +225,17 @@ class AxeAnalyzer(Analyzer):
 
 class Pa11yAnalyzer(Analyzer):
     name = "pa11y"
+    cacheable = False
 
     def available(self) -> bool:
         return self._which("pa11y")
 
-    def analyze(self, repo_root: str, cycle_dir: str, files: Optional[List[str]] = None) -> AnalyzerResult:
+    def run_analysis(
+        self,
+        repo_root: str,
+        cycle_dir: str,
+        files: Optional[List[str]] = None,
+    ) -> AnalyzerResult:
         targets = self.settings.get("targets", [])
         if isinstance(targets, str):
             targets = [targets]
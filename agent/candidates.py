@@ -0,0 +1,141 @@
+"""Best-of-N patch generation: sample several completions and pick the best."""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+from .patcher import extract_unified_diff
+from .providers import Provider, run_sync
+from .utils import ensure_dir
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .run import GateReport
+
+
+@dataclass
+class Candidate:
+    index: int
+    overrides: Dict[str, Any]
+    cycle_dir: Path
+    raw: Optional[str] = None
+    patch: Optional[str] = None
+    error: Optional[str] = None
+    generation_seconds: float = 0.0
+    duplicate_of: Optional[int] = None
+    applies: Optional[bool] = None
+    gate: Optional["GateReport"] = None
+    sandbox: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def verifiable(self) -> bool:
+        return bool(self.patch) and self.duplicate_of is None
+
+    @property
+    def passed(self) -> bool:
+        return self.gate is not None and self.gate.allow
+
+    @property
+    def findings(self) -> Optional[int]:
+        if self.gate is None:
+            return None
+        return sum(len(res.findings) for res in self.gate.results.values())
+
+    def rank(self) -> tuple:
+        """Sort key: passing first, then fewest findings, then sampling order."""
+        findings = self.findings
+        return (not self.passed, findings if findings is not None else float("inf"), self.index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "overrides": self.overrides,
+            "cycle_dir": str(self.cycle_dir),
+            "has_patch": bool(self.patch),
+            "error": self.error,
+            "generation_seconds": round(self.generation_seconds, 3),
+            "duplicate_of": self.duplicate_of,
+            "applies": self.applies,
+            "allow": self.gate.allow if self.gate is not None else None,
+            "rationale": self.gate.rationale if self.gate is not None else None,
+            "findings": self.findings,
+            "sandbox": self.sandbox,
+        }
+
+
+def sampling_overrides(best_cfg: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Per-candidate provider overrides from the ``loop.best_of`` config block.
+
+    Temperatures cycle through ``temperatures``; when ``seed`` is set each
+    candidate gets ``seed + index`` so runs are reproducible.
+    """
+
+    temperatures = list(best_cfg.get("temperatures") or [0.2, 0.6, 0.9])
+    seed = best_cfg.get("seed")
+    overrides: List[Dict[str, Any]] = []
+    for index in range(count):
+        entry: Dict[str, Any] = {"temperature": float(temperatures[index % len(temperatures)])}
+        if seed is not None:
+            entry["seed"] = int(seed) + index
+        overrides.append(entry)
+    return overrides
+
+
+def normalize_patch(patch: str) -> str:
+    """Canonical form used to spot candidates that propose the same change."""
+    lines = [line.rstrip() for line in patch.strip().splitlines()]
+    return "\n".join(line for line in lines if not line.startswith("index "))
+
+
+def generate_candidates(
+    provider: Provider,
+    prompt: str,
+    cycle_dir: Path,
+    overrides: Sequence[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+) -> List[Candidate]:
+    """Request one completion per ``overrides`` entry concurrently and dedupe the diffs."""
+
+    candidates = [
+        Candidate(index=i, overrides=dict(o), cycle_dir=cycle_dir / "candidates" / f"c{i}")
+        for i, o in enumerate(overrides)
+    ]
+
+    async def _work(candidate: Candidate, limit: asyncio.Semaphore) -> None:
+        async with limit:
+            ensure_dir(str(candidate.cycle_dir))
+            started = time.time()
+            try:
+                variant = provider.variant(**candidate.overrides)
+                candidate.raw = await variant.agenerate(prompt, str(candidate.cycle_dir))
+                candidate.patch = extract_unified_diff(candidate.raw) if candidate.raw else None
+            except Exception as exc:
+                candidate.error = str(exc)
+            finally:
+                candidate.generation_seconds = time.time() - started
+
+    async def _all() -> None:
+        limit = asyncio.Semaphore(max_workers or len(candidates))
+        await asyncio.gather(*(_work(c, limit) for c in candidates))
+
+    if candidates:
+        run_sync(_all())
+
+    seen: Dict[str, int] = {}
+    for candidate in candidates:
+        if not candidate.patch:
+            continue
+        key = normalize_patch(candidate.patch)
+        if key in seen:
+            candidate.duplicate_of = seen[key]
+        else:
+            seen[key] = candidate.index
+    return candidates
+
+
+def select_candidate(candidates: Sequence[Candidate]) -> Optional[Candidate]:
+    """Best verified candidate that passed the gate, or ``None``."""
+    passing = [c for c in candidates if c.verifiable and c.passed]
+    return min(passing, key=Candidate.rank) if passing else None
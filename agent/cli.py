@@ -12,6 +12,8 @@ from typing import List, Optional
 from . import __version__
 from .providers import ProviderError, provider_from_config
 from .providers.keys import KeyStore
+from .providers.ollama import invalidate_tags
+from .tokens import UsageLedger, tokenizer_name
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 AGENT_DIR = REPO_ROOT / "agent"
@@ -95,6 +97,7 @@ def cmd_models(args: argparse.Namespace) -> int:
             return 1
         print(f"Pulling Ollama model: {args.pull}")
         subprocess.run(["ollama", "pull", args.pull], check=False)
+        invalidate_tags()
 
     if args.switch:
         cfg.setdefault("provider", {})["model"] = args.switch
@@ -192,6 +195,27 @@ def cmd_status(_: argparse.Namespace) -> int:
     return 0
 
 
+def cmd_usage(_: argparse.Namespace) -> int:
+    summary = UsageLedger(STATE_DIR / "usage.json").summary()
+    if not summary["models"]:
+        print("No generations recorded yet.")
+        return 0
+    lines = [f"Tokenizer: {tokenizer_name()}"]
+    for title, entries in (("Models", summary["models"]), ("Tasks", summary["tasks"])):
+        lines.append(title)
+        for name, entry in sorted(entries.items()):
+            tps = entry.get("tokens_per_second")
+            lines.append(
+                f"  {name}: {entry.get('calls', 0)} calls, "
+                f"{entry.get('prompt_tokens', 0)} prompt / "
+                f"{entry.get('completion_tokens', 0)} completion tokens, "
+                f"prefill {entry.get('prefill_ms', 0)}ms, decode {entry.get('decode_ms', 0)}ms, "
+                f"{tps if tps is not None else '-'} tok/s"
+            )
+    print("\n".join(lines))
+    return 0
+
+
 def cmd_help(_: argparse.Namespace) -> int:
     cheat_sheet = """Agent CLI quick-start:\n\
   agent                       # launch Textual UI\n\
@@ -272,6 +296,11 @@ def build_parser() -> argparse.ArgumentParser:
     status_cmd = subparsers.add_parser("status", help="Show commit/session status")
     status_cmd.set_defaults(handler=cmd_status)
 
+    usage_cmd = subparsers.add_parser(
+        "usage", help="Show token and latency totals per model and task"
+    )
+    usage_cmd.set_defaults(handler=cmd_usage)
+
     return parser
 
 
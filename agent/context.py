@@ -0,0 +1,352 @@
+"""Token-budgeted prompt context assembly.
+
+``compose_prompt`` used to paste every command's output verbatim. The
+``ContextBuilder`` here instead takes a token budget for the active model
+and fills it in priority order (failing tests, referenced source, fast-path
+files, then logs), truncating or dropping what does not fit and recording
+the outcome so ``prompt.meta.json`` shows exactly what the model saw.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .symbols import SymbolIndex, definitions_for_output
+
+# Lower numbers are filled first.
+PRIORITY_FAILURES = 10
+PRIORITY_SOURCE = 20
+PRIORITY_RELATED = 25
+PRIORITY_FAST_PATH = 30
+PRIORITY_LOGS = 40
+
+DEFAULT_CONTEXT_TOKENS = 8192
+DEFAULT_RESERVE_OUTPUT_TOKENS = 2048
+# Reciprocal-rank fusion constant; damps the gap between the first few ranks.
+_RRF_K = 60
+_CHARS_PER_TOKEN = 4
+_TRUNCATION_MARK = "\n... [truncated {omitted} lines] ...\n"
+
+_TRACEBACK_RE = re.compile(r'File "(?P<path>[^"]+)", line (?P<line>\d+)')
+_LOCATION_RE = re.compile(r"^(?P<path>[\w./\\-]+\.py):(?P<line>\d+)(?::\d+)?", re.MULTILINE)
+_FAILURE_HEADER_RE = re.compile(r"^=+ (FAILURES|ERRORS) =+$")
+_SUMMARY_RE = re.compile(r"^=+ .*(short test summary|passed|failed|error).* =+$", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for code and logs)."""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def context_window(cfg: Dict[str, Any], model: Optional[str]) -> int:
+    """Context window for ``model`` in tokens.
+
+    ``prompt.context_tokens`` maps model names to their window (``default``
+    applies otherwise). An explicit integer ``provider.num_ctx`` wins, since
+    that is what the server will actually allocate.
+    """
+
+    num_ctx = (cfg.get("provider", {}) or {}).get("num_ctx")
+    if isinstance(num_ctx, int) and not isinstance(num_ctx, bool) and num_ctx > 0:
+        return num_ctx
+    windows = (cfg.get("prompt", {}) or {}).get("context_tokens", {}) or {}
+    return int(windows.get(model or "", windows.get("default", DEFAULT_CONTEXT_TOKENS)))
+
+
+def prompt_budget(cfg: Dict[str, Any], model: Optional[str]) -> int:
+    """Tokens available for prompt context for ``model``.
+
+    The model's ``context_window`` minus ``prompt.reserve_output_tokens``,
+    which is held back for the response.
+    """
+
+    prompt_cfg = cfg.get("prompt", {}) or {}
+    reserve = prompt_cfg.get("reserve_output_tokens", DEFAULT_RESERVE_OUTPUT_TOKENS)
+    return max(0, context_window(cfg, model) - int(reserve))
+
+
+@dataclass
+class ContextSection:
+    name: str
+    text: str
+    priority: int
+    order: int
+    # "head" keeps the start, "tail" the end, "middle" both ends, "none" all-or-nothing.
+    truncate: str = "middle"
+    min_tokens: int = 48
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+    def render(self) -> str:
+        body = self.text if self.text.endswith("\n") else self.text + "\n"
+        return f"[{self.name}]\n{body}"
+
+
+def _truncate_lines(text: str, max_chars: int, mode: str) -> str:
+    lines = text.splitlines()
+    if max_chars <= 0 or not lines:
+        return ""
+    kept_head: List[str] = []
+    kept_tail: List[str] = []
+    used = len(_TRUNCATION_MARK) + 8
+    head_turn = mode != "tail"
+    lo, hi = 0, len(lines) - 1
+    while lo <= hi:
+        take_head = head_turn if mode == "middle" else mode == "head"
+        line = lines[lo] if take_head else lines[hi]
+        if used + len(line) + 1 > max_chars:
+            break
+        used += len(line) + 1
+        if take_head:
+            kept_head.append(line)
+            lo += 1
+        else:
+            kept_tail.insert(0, line)
+            hi -= 1
+        head_turn = not head_turn
+    omitted = hi - lo + 1
+    if omitted <= 0:
+        return text
+    if not kept_head and not kept_tail:
+        return ""
+    return "\n".join(kept_head) + _TRUNCATION_MARK.format(omitted=omitted) + "\n".join(kept_tail)
+
+
+class ContextBuilder:
+    """Fill a token budget with prioritised sections, recording what was kept."""
+
+    def __init__(self, budget_tokens: Optional[int], fixed_tokens: int = 0) -> None:
+        self.budget_tokens = budget_tokens
+        self.fixed_tokens = fixed_tokens
+        self.sections: List[ContextSection] = []
+
+    def add(
+        self,
+        name: str,
+        text: str,
+        priority: int,
+        truncate: str = "middle",
+        order: Optional[int] = None,
+    ) -> None:
+        if not text or not text.strip():
+            return
+        self.sections.append(
+            ContextSection(
+                name=name,
+                text=text.rstrip("\n"),
+                priority=priority,
+                order=len(self.sections) if order is None else order,
+                truncate=truncate,
+            )
+        )
+
+    def build(self) -> Tuple[List[ContextSection], Dict[str, Any]]:
+        """Return the kept sections in render order plus inclusion metadata."""
+
+        remaining = None if self.budget_tokens is None else self.budget_tokens - self.fixed_tokens
+        kept: List[ContextSection] = []
+        included: List[Dict[str, Any]] = []
+        dropped: List[Dict[str, Any]] = []
+        for section in sorted(self.sections, key=lambda s: (s.priority, s.order)):
+            tokens = section.tokens
+            if remaining is None or tokens <= remaining:
+                kept.append(section)
+                included.append({"name": section.name, "tokens": tokens, "truncated": False})
+                if remaining is not None:
+                    remaining -= tokens
+                continue
+            header = estimate_tokens(f"[{section.name}]\n")
+            if section.truncate != "none" and remaining - header >= section.min_tokens:
+                text = _truncate_lines(
+                    section.text, (remaining - header) * _CHARS_PER_TOKEN, section.truncate
+                )
+                if text.strip():
+                    trimmed = ContextSection(**{**section.__dict__, "text": text})
+                    kept.append(trimmed)
+                    included.append({
+                        "name": section.name,
+                        "tokens": trimmed.tokens,
+                        "truncated": True,
+                        "original_tokens": tokens,
+                    })
+                    remaining -= trimmed.tokens
+                    continue
+            dropped.append({"name": section.name, "tokens": tokens, "priority": section.priority})
+        kept.sort(key=lambda s: s.order)
+        used = self.fixed_tokens + sum(item["tokens"] for item in included)
+        meta = {
+            "budget_tokens": self.budget_tokens,
+            "fixed_tokens": self.fixed_tokens,
+            "used_tokens": used,
+            "included": included,
+            "dropped": dropped,
+        }
+        return kept, meta
+
+
+def extract_failures(output: str) -> str:
+    """Pytest FAILURES/ERRORS blocks and summary lines from a test log."""
+
+    lines = output.splitlines()
+    blocks: List[str] = []
+    capturing = False
+    for line in lines:
+        if _FAILURE_HEADER_RE.match(line):
+            capturing = True
+        elif capturing and _SUMMARY_RE.match(line):
+            capturing = False
+        if capturing:
+            blocks.append(line)
+    summary = [ln for ln in lines if ln.startswith(("FAILED ", "ERROR "))]
+    return "\n".join(blocks + summary).strip()
+
+
+def referenced_locations(text: str, repo_root: Path, limit: int = 8) -> List[Tuple[str, int]]:
+    """Repo-relative ``(path, line)`` pairs named in tracebacks and linter output."""
+
+    root = Path(repo_root).resolve()
+    found: List[Tuple[str, int]] = []
+    seen = set()
+    matches = list(_TRACEBACK_RE.finditer(text)) + list(_LOCATION_RE.finditer(text))
+    for match in matches:
+        raw = Path(match.group("path"))
+        candidate = raw if raw.is_absolute() else root / raw
+        try:
+            rel = candidate.resolve().relative_to(root).as_posix()
+        except (OSError, ValueError):
+            continue
+        if not (root / rel).is_file() or "site-packages" in rel:
+            continue
+        key = (rel, int(match.group("line")))
+        if key not in seen:
+            seen.add(key)
+            found.append(key)
+        if len(found) >= limit:
+            break
+    return found
+
+
+def source_snippet(repo_root: Path, path: str, line: int, radius: int = 12) -> str:
+    try:
+        lines = (Path(repo_root) / path).read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return ""
+    start = max(1, line - radius)
+    end = min(len(lines), line + radius)
+    body = "\n".join(f"{n:>5} {lines[n - 1]}" for n in range(start, end + 1))
+    return f"# {path}:{start}-{end}\n{body}"
+
+
+def file_excerpt(repo_root: Path, path: Path, max_lines: int = 200) -> str:
+    target = path if path.is_absolute() else Path(repo_root) / path
+    try:
+        rel = target.resolve().relative_to(Path(repo_root).resolve()).as_posix()
+        lines = target.read_text(encoding="utf-8").splitlines()
+    except (OSError, UnicodeDecodeError, ValueError):
+        return ""
+    body = "\n".join(lines[:max_lines])
+    if len(lines) > max_lines:
+        body += f"\n... [{len(lines) - max_lines} more lines]"
+    return f"# {rel}\n{body}"
+
+
+def add_cycle_context(
+    builder: ContextBuilder,
+    repo_root: Path,
+    command_results: Dict[str, Dict[str, Any]],
+    fast_targets: Sequence[Path] = (),
+    log_char_cap: int = 20000,
+    symbols: Optional[SymbolIndex] = None,
+) -> None:
+    """Populate ``builder`` with the standard per-cycle sections.
+
+    With a ``symbols`` index, source context is the full definition
+    enclosing each referenced line plus definitions named in the output;
+    otherwise a fixed window of lines around each location is used.
+    """
+
+    failures: List[str] = []
+    for name, result in command_results.items():
+        output = result.get("output") or ""
+        if result.get("code") not in (0, None) and output:
+            extracted = extract_failures(output)
+            if extracted:
+                failures.append(f"## {name}\n{extracted}")
+    builder.add("failures", "\n\n".join(failures), PRIORITY_FAILURES, truncate="head")
+
+    all_output = "\n".join((r.get("output") or "") for r in command_results.values())
+    locations = referenced_locations(all_output, repo_root)
+    snippets: List[str] = []
+    if symbols is not None:
+        snippets.extend(definitions_for_output(symbols, repo_root, all_output, locations))
+        locations = [
+            (path, line) for path, line in locations if symbols.enclosing(path, line) is None
+        ]
+    snippets.extend(source_snippet(repo_root, path, line) for path, line in locations)
+    for index, snippet in enumerate(s for s in snippets if s):
+        builder.add(f"source:{index}", snippet, PRIORITY_SOURCE, truncate="middle")
+
+    for index, target in enumerate(fast_targets):
+        builder.add(
+            f"fast_path:{index}",
+            file_excerpt(repo_root, Path(target)),
+            PRIORITY_FAST_PATH,
+            truncate="head",
+        )
+
+    for name, result in command_results.items():
+        output = (result.get("output") or "").strip()
+        header = f"enabled={result.get('enabled')} exit={result.get('code')}"
+        text = header + ("\n" + output[-log_char_cap:] if output else "")
+        builder.add(f"command:{name}", text, PRIORITY_LOGS, truncate="tail")
+
+
+def retrieve_related(retrievers: Sequence[Any], query: str, k: int = 5) -> List[Any]:
+    """Merge hits from every retriever for ``query``, best first, one per location.
+
+    Retrievers score on different scales (BM25 vs. cosine), so hits are
+    ranked by reciprocal-rank fusion: a location found near the top by
+    several retrievers beats one found by a single retriever.
+    """
+
+    hits: Dict[Tuple[str, int], Any] = {}
+    fused: Dict[Tuple[str, int], float] = {}
+    for retriever in retrievers:
+        for rank, hit in enumerate(retriever.search(query, k=k)):
+            key = (hit.path, hit.start)
+            hits.setdefault(key, hit)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (_RRF_K + rank + 1)
+    order = sorted(hits, key=lambda key: -fused[key])  # stable: ties keep retriever order
+    return [hits[key] for key in order]
+
+
+def add_related(builder: ContextBuilder, hits: Sequence[Any]) -> None:
+    for index, hit in enumerate(hits):
+        builder.add(f"related:{index}", hit.render(), PRIORITY_RELATED, truncate="head")
+
+
+def repo_map(symbols: SymbolIndex, max_chars: int = 2000) -> str:
+    """Python files grouped by directory, for the stable part of the prompt.
+
+    Only file paths are listed (not symbols), so the map changes when files
+    are added or removed rather than on every edit.
+    """
+
+    by_dir: Dict[str, List[str]] = {}
+    for path in sorted(symbols.files):
+        directory, _, name = path.rpartition("/")
+        by_dir.setdefault(directory or ".", []).append(name)
+    lines: List[str] = []
+    used = 0
+    for index, (directory, names) in enumerate(sorted(by_dir.items())):
+        line = f"{directory}/: {' '.join(names)}"
+        if used + len(line) + 1 > max_chars:
+            lines.append(f"... [{len(by_dir) - index} more directories]")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
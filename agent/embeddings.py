@@ -0,0 +1,312 @@
+"""Semantic retrieval: Ollama embeddings stored in a memory-mapped NumPy matrix."""
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .analyzers.cache import build_manifest
+from .gitwriter import blob_oid
+from .lexical_index import MAX_FILE_BYTES, Hit, _chunks
+from .providers import httpclient
+from .providers.base import ProviderError
+from .utils import write_text_atomic
+
+try:  # pragma: no cover - optional dep
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+DEFAULT_INCLUDE = ("*.py",)
+
+
+def embeddings_available() -> bool:
+    return np is not None and httpclient.available()
+
+
+class OllamaEmbedder:
+    """Batch client for the local Ollama embedding endpoints.
+
+    Uses ``/api/embed`` (one request per batch) and falls back to the older
+    single-prompt ``/api/embeddings`` endpoint on servers that lack it.
+    """
+
+    def __init__(self, base_url: str, model: str, batch_size: int = 16, timeout: int = 120) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.timeout = timeout
+        self.requests_made = 0
+        self._batch_endpoint = True
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if not httpclient.available():
+            raise ProviderError(
+                "requests package not available; install requests to use embeddings"
+            )
+        vectors: List[List[float]] = []
+        for offset in range(0, len(texts), self.batch_size):
+            batch = list(texts[offset:offset + self.batch_size])
+            if self._batch_endpoint:
+                vectors.extend(self._embed_batch(batch))
+            else:
+                vectors.extend(self._embed_each(batch))
+        return vectors
+
+    def _post(self, path: str, payload: Dict[str, Any]):
+        self.requests_made += 1
+        try:
+            return httpclient.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        except Exception as exc:
+            raise ProviderError(f"Ollama embedding request failed: {exc}") from exc
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        resp = self._post("/api/embed", {"model": self.model, "input": batch})
+        if resp.status_code == 404:
+            self._batch_endpoint = False
+            return self._embed_each(batch)
+        if resp.status_code >= 400:
+            raise ProviderError(f"Ollama embedding error {resp.status_code}: {resp.text[:200]}")
+        vectors = _field(resp, "embeddings")
+        if not isinstance(vectors, list) or len(vectors) != len(batch):
+            raise ProviderError("Ollama returned a different number of embeddings than inputs")
+        return vectors
+
+    def _embed_each(self, batch: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in batch:
+            resp = self._post("/api/embeddings", {"model": self.model, "prompt": text})
+            if resp.status_code >= 400:
+                raise ProviderError(f"Ollama embedding error {resp.status_code}: {resp.text[:200]}")
+            vector = _field(resp, "embedding")
+            if not isinstance(vector, list) or not vector:
+                raise ProviderError("Ollama returned no embedding for an input")
+            vectors.append(vector)
+        return vectors
+
+
+def _field(resp: Any, name: str) -> Any:
+    """``name`` from a JSON response body, as a ``ProviderError`` if the body is not JSON."""
+
+    try:
+        payload = resp.json()
+    except ValueError as exc:
+        raise ProviderError(f"Ollama embedding response was not JSON: {resp.text[:200]}") from exc
+    return payload.get(name) if isinstance(payload, dict) else None
+
+
+class EmbeddingIndex:
+    """Unit-normalised chunk embeddings in ``vectors.f32`` (rows keyed by chunk blob hash).
+
+    ``meta.json`` maps every indexed file to its blob hash and chunk list,
+    and every chunk hash to its matrix row. ``sync`` only embeds chunks
+    whose hash has no row yet, in batches, so unchanged files and
+    unchanged parts of edited files cost nothing. Rows no longer referenced
+    are compacted away once they outnumber the live ones.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        embedder: OllamaEmbedder,
+        include: Sequence[str] = DEFAULT_INCLUDE,
+    ) -> None:
+        if np is None:
+            raise ProviderError("numpy not available; install numpy to use embedding retrieval")
+        self.root = Path(root)
+        self.embedder = embedder
+        self.include = tuple(include)
+        self.embedded = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self.meta: Dict[str, Any] = {
+            "model": embedder.model, "dim": 0, "rows": 0, "chunks": {}, "files": {}
+        }
+        self._matrix = None
+        self._locations: Optional[Dict[int, List[tuple]]] = None
+        self._repo_root: Optional[Path] = None
+        self._load()
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.root / "vectors.f32"
+
+    def _load(self) -> None:
+        try:
+            meta = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        if meta.get("model") != self.embedder.model or not self._vectors_path.exists():
+            return  # vectors from another model are not comparable
+        expected = int(meta.get("rows", 0)) * int(meta.get("dim", 0)) * 4
+        size = self._vectors_path.stat().st_size
+        if size < expected or len(meta.get("chunks", {})) != int(meta.get("rows", 0)):
+            # Vectors were rewritten (compaction) but the metadata was not: rows
+            # no longer line up with keys, so start the index over.
+            self._vectors_path.unlink()
+            return
+        if size > expected:
+            # Rows appended before a crash that never reached meta.json.
+            with open(self._vectors_path, "r+b") as handle:
+                handle.truncate(expected)
+        self.meta = meta
+        self._open()
+
+    def _open(self) -> None:
+        rows, dim = int(self.meta["rows"]), int(self.meta["dim"])
+        self._matrix = None
+        if rows:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(rows, dim)
+            )
+
+    def _save_meta(self) -> None:
+        # Written after the vectors so a crash in between only leaves extra
+        # rows, which ``_load`` truncates.
+        write_text_atomic(str(self.root / "meta.json"), json.dumps(self.meta))
+
+    def _wanted(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern)
+            for pattern in self.include
+        )
+
+    def sync(self, repo_root: Path, manifest: Optional[Dict[str, str]] = None) -> bool:
+        manifest = manifest if manifest is not None else build_manifest(str(repo_root))
+        if manifest is None:
+            return False
+        with self._lock:
+            self._repo_root = Path(repo_root)
+            self._locations = None
+            files: Dict[str, Any] = self.meta["files"]
+            current = {
+                p: oid for p, oid in manifest.items() if oid != "deleted" and self._wanted(p)
+            }
+            for path in set(files) - set(current):
+                del files[path]
+            pending: Dict[str, str] = {}
+            # Entries only land in ``files`` once their vectors are stored, so a
+            # failed embed call leaves them to be retried on the next sync.
+            staged: Dict[str, Any] = {}
+            for path, oid in current.items():
+                if files.get(path, {}).get("oid") == oid:
+                    continue
+                target = Path(repo_root) / path
+                try:
+                    if target.stat().st_size > MAX_FILE_BYTES:
+                        continue
+                    text = target.read_text(encoding="utf-8")
+                except (OSError, UnicodeDecodeError):
+                    continue
+                chunks = []
+                for start, end, body in _chunks(text):
+                    key = blob_oid(body.encode("utf-8"))
+                    chunks.append([start, end, key])
+                    if key not in self.meta["chunks"] and body.strip():
+                        pending[key] = f"{path}\n{body}"
+                staged[path] = {"oid": oid, "chunks": chunks}
+            if pending:
+                self._append(list(pending), self.embedder.embed(list(pending.values())))
+            files.update(staged)
+            self._compact_if_sparse()
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._save_meta()
+        return True
+
+    def _append(self, keys: List[str], vectors: List[List[float]]) -> None:
+        block = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block = block / np.where(norms == 0, 1, norms)
+        if self.meta["dim"] and block.shape[1] != self.meta["dim"]:
+            raise ProviderError(
+                "embedding dimension changed; delete the embedding index to rebuild"
+            )
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._matrix = None  # release the map before growing the file
+        with open(self._vectors_path, "ab") as handle:
+            handle.write(block.tobytes())
+        start = int(self.meta["rows"])
+        for offset, key in enumerate(keys):
+            self.meta["chunks"][key] = start + offset
+        self.meta["rows"] = start + len(keys)
+        self.meta["dim"] = int(block.shape[1])
+        self.embedded += len(keys)
+        self._open()
+
+    def _live_keys(self) -> set:
+        return {chunk[2] for entry in self.meta["files"].values() for chunk in entry["chunks"]}
+
+    def _compact_if_sparse(self) -> None:
+        live = self._live_keys()
+        dead = [key for key in self.meta["chunks"] if key not in live]
+        if not dead or len(dead) <= len(live) or self._matrix is None:
+            return
+        keys = [key for key in self.meta["chunks"] if key in live]
+        rows = np.array([self.meta["chunks"][key] for key in keys], dtype=np.int64)
+        if len(rows):
+            kept = np.array(self._matrix[rows])
+        else:
+            kept = np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        self._matrix = None
+        tmp = self._vectors_path.with_suffix(".tmp")
+        tmp.write_bytes(kept.astype(np.float32).tobytes())
+        os.replace(tmp, self._vectors_path)
+        self.meta["chunks"] = {key: index for index, key in enumerate(keys)}
+        self.meta["rows"] = len(keys)
+        self._open()
+
+    def search(self, text: str, k: int = 5) -> List[Hit]:
+        """Top ``k`` chunks by cosine similarity, at most one per file."""
+
+        with self._lock:
+            if self._matrix is None or not self.meta["files"]:
+                return []
+            try:
+                query = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+            except ProviderError as exc:
+                # Retrieval is best-effort; a stopped server must not break prompt assembly.
+                self.last_error = str(exc)
+                return []
+            norm = float(np.linalg.norm(query))
+            if norm == 0 or query.shape[0] != self.meta["dim"]:
+                return []
+            scores = self._matrix @ (query / norm)
+            locations = self._row_locations()
+            rows = np.array(sorted(locations), dtype=np.int64)
+            if not len(rows):
+                return []
+            order = rows[np.argsort(-scores[rows], kind="stable")]
+        hits: List[Hit] = []
+        seen = set()
+        for row in order:
+            for path, start, end in locations[int(row)]:
+                if path in seen:
+                    continue
+                seen.add(path)
+                hits.append(Hit(path=path, start=start, end=end, score=float(scores[row]), text=""))
+                break
+            if len(hits) >= k:
+                break
+        if self._repo_root is not None:
+            for hit in hits:
+                try:
+                    lines = (self._repo_root / hit.path).read_text(encoding="utf-8").splitlines()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                hit.text = "\n".join(lines[hit.start - 1:hit.end])
+        return hits
+
+    def _row_locations(self) -> Dict[int, List[tuple]]:
+        if self._locations is None:
+            locations: Dict[int, List[tuple]] = {}
+            for path, entry in self.meta["files"].items():
+                for start, end, key in entry["chunks"]:
+                    row = self.meta["chunks"].get(key)
+                    if row is not None:
+                        locations.setdefault(row, []).append((path, start, end))
+            self._locations = locations
+        return self._locations
@@ -0,0 +1,205 @@
+"""Shared, cached read access to a git work tree.
+
+Prompt composition, task verification and dashboards all ask the same few
+questions (status, branch, last commit, whitespace/conflict markers). Going
+through ``run_cmd`` costs a bash plus a git process per question. A
+``GitQuery`` per work tree answers object reads from one long-lived
+``git cat-file --batch`` process, resolves refs from the ref files directly,
+and caches ``status``/``diff --check`` output briefly, keyed by the index
+mtime and HEAD so commits and ``git add`` invalidate it immediately.
+"""
+from __future__ import annotations
+
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from .gitwriter import git_dirs, read_ref
+
+DEFAULT_TTL_SECONDS = 2.0
+
+
+class _CatFile:
+    """One ``git cat-file --batch`` process, restarted if it dies."""
+
+    def __init__(self, repo_root: Path) -> None:
+        self.repo_root = repo_root
+        self.proc: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+
+    def _ensure(self) -> subprocess.Popen:
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=str(self.repo_root),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self.proc
+
+    def read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        with self.lock:
+            proc = self._ensure()
+            assert proc.stdin is not None and proc.stdout is not None
+            try:
+                proc.stdin.write(spec.encode("utf-8") + b"\n")
+                proc.stdin.flush()
+                header = proc.stdout.readline().decode("utf-8", errors="replace").split()
+                if len(header) != 3:
+                    return None
+                oid, kind, size = header
+                data = proc.stdout.read(int(size) + 1)[:-1]
+            except (OSError, ValueError):
+                self.close()
+                return None
+            return oid, kind, data
+
+    def close(self) -> None:
+        if self.proc is not None:
+            try:
+                if self.proc.stdin:
+                    self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except Exception:  # pragma: no cover - best effort shutdown
+                self.proc.kill()
+            self.proc = None
+
+
+class GitQuery:
+    """Cached git queries for one work tree; use ``GitQuery.for_repo`` to share instances."""
+
+    _instances: Dict[str, "GitQuery"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, repo_root: Path, ttl: float = DEFAULT_TTL_SECONDS) -> None:
+        self.repo_root = Path(repo_root).resolve()
+        self.ttl = ttl
+        self._cat = _CatFile(self.repo_root)
+        self._cache: Dict[str, Tuple[Tuple, float, Tuple[int, str]]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_repo(cls, repo_root: Path) -> "GitQuery":
+        key = str(Path(repo_root).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(Path(key))
+            return cls._instances[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._instances_lock:
+            for query in cls._instances.values():
+                query.close()
+            cls._instances.clear()
+
+    def close(self) -> None:
+        self._cat.close()
+
+    # -- refs and objects -------------------------------------------------
+
+    def head(self) -> Optional[str]:
+        return read_ref(self.repo_root, "HEAD")
+
+    def branch(self) -> str:
+        """Current branch name, or ``HEAD`` when detached (like ``rev-parse --abbrev-ref``)."""
+        dirs = git_dirs(self.repo_root)
+        if dirs is None:
+            return "HEAD"
+        try:
+            value = (dirs[0] / "HEAD").read_text(encoding="utf-8").strip()
+        except OSError:
+            return "HEAD"
+        if value.startswith("ref: refs/heads/"):
+            return value[len("ref: refs/heads/"):]
+        return "HEAD"
+
+    def cat(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        """``(oid, type, content)`` for any object spec (``HEAD``, ``HEAD:path``, an oid)."""
+        return self._cat.read(spec)
+
+    def show(self, rev: str, path: str) -> Optional[str]:
+        obj = self.cat(f"{rev}:{path}")
+        if obj is None or obj[1] != "blob":
+            return None
+        return obj[2].decode("utf-8", errors="replace")
+
+    def last_commit_oneline(self) -> str:
+        head = self.head()
+        obj = self.cat(head) if head else None
+        if obj is None or obj[1] != "commit":
+            return ""
+        _, _, body = obj[2].decode("utf-8", errors="replace").partition("\n\n")
+        subject = body.strip().splitlines()[0] if body.strip() else ""
+        return f"{obj[0][:7]} {subject}".rstrip()
+
+    # -- cached working tree queries -------------------------------------
+
+    def _state_key(self) -> Tuple:
+        dirs = git_dirs(self.repo_root)
+        index_stamp: Tuple = ()
+        if dirs is not None:
+            try:
+                st = (dirs[0] / "index").stat()
+                index_stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return index_stamp, self.head()
+
+    def _cached(self, name: str, produce: Callable[[], Tuple[int, str]]) -> Tuple[int, str]:
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        # Concurrent callers wait for a single in-flight git process.
+        with lock:
+            key = self._state_key()
+            entry = self._cache.get(name)
+            if entry and entry[0] == key and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            value = produce()
+            # git status may refresh the index; key on the state after the call.
+            self._cache[name] = (self._state_key(), time.monotonic(), value)
+            return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _git(self, *args: str, timeout: int = 30) -> Tuple[int, str]:
+        try:
+            proc = subprocess.run(
+                ["git", *args],
+                cwd=str(self.repo_root),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+                check=False,
+            )
+        except subprocess.TimeoutExpired:
+            return 124, f"[timeout after {timeout}s] git {' '.join(args)}"
+        except OSError as exc:
+            return 127, str(exc)
+        return proc.returncode, proc.stdout.decode("utf-8", errors="replace")
+
+    def status_porcelain(self) -> str:
+        return self._cached("status", lambda: self._git("status", "--porcelain=v1"))[1]
+
+    def diff_check(self) -> Tuple[int, str]:
+        return self._cached("diff_check", lambda: self._git("diff", "--check"))
+
+    def summary(self) -> str:
+        """Status, branch and last commit in the layout the cycle prompt uses."""
+        return "\n".join([
+            self.status_porcelain().rstrip("\n"),
+            "---",
+            self.branch(),
+            "---",
+            self.last_commit_oneline(),
+        ]).strip()
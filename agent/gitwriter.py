@@ -0,0 +1,426 @@
+"""Commit proposed files with a single ``git fast-import`` pass.
+
+The plumbing commit path spawns one process per step (rev-parse, read-tree,
+one ``add`` per file, diff, write-tree, commit-tree, update-ref). Here refs
+are resolved in-process, blob hashes of the proposed files are computed in
+Python, and one long-lived ``fast-import`` process compares them against the
+parent tree (``ls``) and writes the blobs, tree and commit. The branch is
+then moved with a compare-and-swap ``update-ref --stdin`` transaction.
+
+Content and executable bits are committed as found on disk, so anything
+that makes ``git add`` rewrite them (attributes at any level, autocrlf,
+``core.fileMode=false``) needs the ``plumbing`` backend;
+``conversion_blockers`` lists those and ``commit_with_temp_index`` falls
+back when it finds any.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import stat
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+SCRATCH_REF = "refs/agent/commit-scratch"
+
+_IDENT_CACHE: Dict[str, Tuple[str, str]] = {}
+_IDENT_LOCK = threading.Lock()
+
+
+def git_dirs(repo_root: Path) -> Optional[Tuple[Path, Path]]:
+    """Return ``(git_dir, common_dir)`` for ``repo_root`` without spawning git."""
+
+    dot_git = Path(repo_root) / ".git"
+    if dot_git.is_dir():
+        git_dir = dot_git
+    elif dot_git.is_file():
+        text = dot_git.read_text(encoding="utf-8", errors="replace").strip()
+        if not text.startswith("gitdir:"):
+            return None
+        git_dir = Path(text[len("gitdir:"):].strip())
+        if not git_dir.is_absolute():
+            git_dir = (Path(repo_root) / git_dir).resolve()
+    else:
+        return None
+    common_dir = git_dir
+    commondir_file = git_dir / "commondir"
+    if commondir_file.exists():
+        raw = commondir_file.read_text(encoding="utf-8").strip()
+        common_dir = Path(raw) if os.path.isabs(raw) else (git_dir / raw).resolve()
+    return git_dir, common_dir
+
+
+_TRUE = ("true", "yes", "on", "1")
+_FALSE = ("false", "no", "off", "0")
+
+
+def _global_attributes() -> Path:
+    base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return Path(base) / "git" / "attributes"
+
+
+def conversion_blockers(repo_root: Path) -> List[str]:
+    """Reasons ``git add`` could store different bytes or modes than the working tree.
+
+    Empty when ``fast_import_commit`` produces the same commit as the index
+    path. Checks attribute files at every level, ``core.autocrlf`` and
+    ``core.fileMode``.
+    """
+
+    repo_root = Path(repo_root)
+    blockers: List[str] = []
+    _, out = _run(
+        ["git", "config", "-z", "--get-regexp", r"^core\.(autocrlf|filemode|attributesfile)$"],
+        repo_root,
+        b"",
+    )
+    config: Dict[str, str] = {}
+    for item in out.split("\0"):
+        key, _, value = item.partition("\n")
+        if key:
+            config[key.lower()] = value.strip().lower()
+    autocrlf = config.get("core.autocrlf", "false")
+    if autocrlf not in _FALSE:
+        blockers.append(f"core.autocrlf={autocrlf}")
+    if config.get("core.filemode", "true") in _FALSE:
+        blockers.append("core.fileMode=false")
+    attributes_file = config.get("core.attributesfile")
+    if attributes_file:
+        global_attrs = Path(os.path.expanduser(attributes_file))
+    else:
+        global_attrs = _global_attributes()
+    if global_attrs.is_file():
+        blockers.append(f"global attributes {global_attrs}")
+    dirs = git_dirs(repo_root)
+    if dirs is not None and (dirs[1] / "info" / "attributes").is_file():
+        blockers.append(".git/info/attributes")
+    _, out = _run(
+        [
+            "git", "ls-files", "-z", "--cached", "--others", "--exclude-standard",
+            "--", ":(glob)**/.gitattributes",
+        ],
+        repo_root,
+        b"",
+    )
+    blockers.extend(p for p in out.split("\0") if p)
+    return blockers
+
+
+def _packed_ref(common_dir: Path, name: str) -> Optional[str]:
+    try:
+        lines = (common_dir / "packed-refs").read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        if not line or line[0] in "#^":
+            continue
+        oid, _, ref = line.partition(" ")
+        if ref == name:
+            return oid
+    return None
+
+
+def read_ref(repo_root: Path, name: str = "HEAD") -> Optional[str]:
+    """Resolve ``name`` (following symbolic refs) to an object id, in-process.
+
+    Returns ``None`` for unborn branches or when the ref cannot be read.
+    """
+
+    dirs = git_dirs(repo_root)
+    if dirs is None:
+        return None
+    git_dir, common_dir = dirs
+    for _ in range(5):  # symbolic ref chains are short; guard against loops
+        # HEAD and other per-worktree refs live in git_dir, the rest in common_dir.
+        base = git_dir if "/" not in name else common_dir
+        try:
+            value = (base / name).read_text(encoding="utf-8").strip()
+        except OSError:
+            return _packed_ref(common_dir, name)
+        if value.startswith("ref:"):
+            name = value[4:].strip()
+            continue
+        return value or None
+    return None
+
+
+def patch_shortstat(patch_text: str) -> str:
+    """``git diff --shortstat`` style summary computed from a unified diff."""
+
+    files = 0
+    insertions = deletions = 0
+    old_left = new_left = 0
+    for line in (patch_text or "").splitlines():
+        if old_left > 0 or new_left > 0:
+            if line.startswith("+"):
+                insertions += 1
+                new_left -= 1
+            elif line.startswith("-"):
+                deletions += 1
+                old_left -= 1
+            elif line.startswith("\\"):
+                pass
+            else:
+                old_left -= 1
+                new_left -= 1
+            continue
+        if line.startswith("diff --git "):
+            files += 1
+        elif line.startswith("@@"):
+            old_left, new_left = _hunk_sizes(line)
+    if not files:
+        files = sum(1 for line in (patch_text or "").splitlines() if line.startswith("+++ "))
+    if not files:
+        return ""
+    parts = [f"{files} file{'s' if files != 1 else ''} changed"]
+    if insertions or not deletions:
+        parts.append(f"{insertions} insertion{'s' if insertions != 1 else ''}(+)")
+    if deletions or not insertions:
+        parts.append(f"{deletions} deletion{'s' if deletions != 1 else ''}(-)")
+    return ", ".join(parts)
+
+
+def _hunk_sizes(header: str) -> Tuple[int, int]:
+    try:
+        old, new = header.split("@@")[1].split()[:2]
+    except (IndexError, ValueError):
+        return 0, 0
+
+    def _size(spec: str) -> int:
+        _, _, count = spec[1:].partition(",")
+        return int(count) if count else 1
+
+    try:
+        return _size(old), _size(new)
+    except ValueError:
+        return 0, 0
+
+
+def blob_oid(data: bytes, algo: str = "sha1") -> str:
+    digest = hashlib.new(algo)
+    digest.update(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _quote(path: str) -> str:
+    if not any(ch in path for ch in '"\n\\') and not path.startswith('"'):
+        return path
+    escaped = path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _identity(repo_root: Path) -> Tuple[str, str]:
+    """``(author, committer)`` idents without the timestamp, cached per repo."""
+
+    key = str(repo_root)
+    with _IDENT_LOCK:
+        if key not in _IDENT_CACHE:
+            proc = subprocess.run(
+                ["git", "var", "-l"],
+                cwd=key,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=False,
+            )
+            values = {}
+            for line in proc.stdout.decode("utf-8", errors="replace").splitlines():
+                name, _, value = line.partition("=")
+                values[name] = value
+            author = values.get("GIT_AUTHOR_IDENT", "")
+            committer = values.get("GIT_COMMITTER_IDENT", author)
+            if not author:
+                raise RuntimeError("git identity not configured (user.name / user.email)")
+            # Drop the "<timestamp> <tz>" suffix; it is refreshed for every commit.
+            _IDENT_CACHE[key] = (author.rsplit(" ", 2)[0], committer.rsplit(" ", 2)[0])
+        return _IDENT_CACHE[key]
+
+
+def _ident_line(ident: str, env_prefix: str) -> str:
+    name = os.environ.get(f"GIT_{env_prefix}_NAME")
+    email = os.environ.get(f"GIT_{env_prefix}_EMAIL")
+    if name and email:
+        ident = f"{name} <{email}>"
+    offset = -time.timezone if not time.localtime().tm_isdst else -time.altzone
+    sign = "+" if offset >= 0 else "-"
+    offset = abs(offset)
+    return f"{ident} {int(time.time())} {sign}{offset // 3600:02d}{(offset % 3600) // 60:02d}"
+
+
+def _worktree_entry(path: Path) -> Optional[Tuple[str, bytes]]:
+    try:
+        st = path.lstat()
+    except OSError:
+        return None
+    if stat.S_ISLNK(st.st_mode):
+        return "120000", os.readlink(path).encode("utf-8")
+    mode = "100755" if st.st_mode & 0o111 else "100644"
+    return mode, path.read_bytes()
+
+
+class _FastImport:
+    def __init__(self, repo_root: Path) -> None:
+        self.proc = subprocess.Popen(
+            ["git", "fast-import", "--quiet", "--done", "--force"],
+            cwd=str(repo_root),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        self.stdin: IO[bytes] = self.proc.stdin
+        self.stdout: IO[bytes] = self.proc.stdout
+
+    def send(self, text: str, data: Optional[bytes] = None) -> None:
+        self.stdin.write(text.encode("utf-8"))
+        if data is not None:
+            self.stdin.write(b"data %d\n" % len(data))
+            self.stdin.write(data)
+            self.stdin.write(b"\n")
+
+    def ask(self, text: str) -> str:
+        self.send(text)
+        self.stdin.flush()
+        return self.stdout.readline().decode("utf-8", errors="replace").rstrip("\n")
+
+    def finish(self) -> Tuple[int, str]:
+        try:
+            self.send("done\n")
+            self.stdin.close()
+        except BrokenPipeError:  # pragma: no cover - process died early
+            pass
+        err = self.proc.stderr.read().decode("utf-8", errors="replace") if self.proc.stderr else ""
+        return self.proc.wait(), err
+
+    def abort(self) -> str:
+        self.proc.kill()
+        self.proc.wait()
+        return self.proc.stderr.read().decode("utf-8", errors="replace") if self.proc.stderr else ""
+
+
+def _run(args: Sequence[str], cwd: Path, stdin: bytes) -> Tuple[int, str]:
+    proc = subprocess.run(
+        list(args),
+        cwd=str(cwd),
+        input=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=False,
+    )
+    return proc.returncode, proc.stdout.decode("utf-8", errors="replace")
+
+
+def _ignored(repo_root: Path, paths: List[str]) -> List[str]:
+    if not paths:
+        return []
+    payload = "\0".join(paths).encode("utf-8") + b"\0"
+    _, out = _run(["git", "check-ignore", "-z", "--stdin"], repo_root, payload)
+    return [p for p in out.split("\0") if p]
+
+
+def fast_import_commit(
+    repo_root: Path,
+    ref: str,
+    head: str,
+    message: str,
+    proposed_files: Sequence[str],
+) -> Tuple[bool, Dict[str, Any]]:
+    """Commit the working-tree state of ``proposed_files`` on top of ``head``.
+
+    ``ref`` is only moved if it still points at ``head``. Paths that are
+    directories in the working tree are reported as staged files outside the
+    patch, and new files matched by ``.gitignore`` are skipped, mirroring what
+    ``git add -- <path>`` would do on the plumbing path.
+    """
+
+    repo_root = Path(repo_root)
+    meta: Dict[str, Any] = {"backend": "fast-import", "proposed_files": list(proposed_files)}
+    algo = "sha256" if len(head) == 64 else "sha1"
+    importer = _FastImport(repo_root)
+    changes: List[Tuple[str, Optional[Tuple[str, bytes]]]] = []
+    staged: List[str] = []
+    extras: List[str] = []
+    new_paths: List[str] = []
+    try:
+        for path in proposed_files:
+            if (repo_root / path).is_dir():
+                extras.append(path)
+                continue
+            entry = _worktree_entry(repo_root / path)
+            current = importer.ask(f"ls {head} {_quote(path)}\n")
+            if current.startswith("missing "):
+                if entry is not None:
+                    new_paths.append(path)
+                    changes.append((path, entry))
+                continue
+            head_mode, _, rest = current.partition(" ")
+            head_oid = rest.split(" ", 1)[-1].split("\t", 1)[0]
+            if entry is None:
+                changes.append((path, None))
+            elif entry[0] != head_mode or blob_oid(entry[1], algo) != head_oid:
+                changes.append((path, entry))
+        ignored = set(_ignored(repo_root, new_paths))
+        changes = [(p, e) for p, e in changes if p not in ignored]
+        staged = [p for p, _ in changes]
+        meta["staged"] = staged
+        if ignored:
+            meta["ignored"] = sorted(ignored)
+        if extras:
+            importer.abort()
+            meta["staged"] = staged + extras
+            meta["error"] = "staged files outside proposed patch"
+            return False, meta
+
+        author, committer = _identity(repo_root)
+        body = message.encode("utf-8")
+        if not body.endswith(b"\n"):
+            body += b"\n"
+        importer.send(
+            f"commit {SCRATCH_REF}\nmark :1\n"
+            f"author {_ident_line(author, 'AUTHOR')}\n"
+            f"committer {_ident_line(committer, 'COMMITTER')}\n",
+            body,
+        )
+        importer.send(f"from {head}\n")
+        for path, entry in changes:
+            if entry is None:
+                importer.send(f"D {_quote(path)}\n")
+            else:
+                importer.send(f"M {entry[0]} inline {_quote(path)}\n", entry[1])
+        importer.send("\n")
+        commit_oid = importer.ask("get-mark :1\n").strip()
+    except Exception as exc:
+        meta["error"] = f"fast-import failed: {exc} {importer.abort()}".strip()
+        return False, meta
+    code, err = importer.finish()
+    meta["commit-tree"] = {"code": code, "commit": commit_oid or None}
+    if code != 0 or not commit_oid:
+        meta["error"] = f"fast-import failed: {err.strip()[:500]}"
+        return False, meta
+
+    code, out = _run(
+        ["git", "update-ref", "--stdin"],
+        repo_root,
+        f"update {ref} {commit_oid} {head}\ndelete {SCRATCH_REF}\n".encode("utf-8"),
+    )
+    meta["update-ref"] = {"code": code, "out": out, "ref": ref, "old": head, "new": commit_oid}
+    if code != 0:
+        _run(["git", "update-ref", "--stdin"], repo_root, f"delete {SCRATCH_REF}\n".encode("utf-8"))
+        return False, meta
+    meta["index"] = sync_index(repo_root, staged)
+    return True, meta
+
+
+def sync_index(repo_root: Path, paths: Sequence[str]) -> Dict[str, Any]:
+    """Refresh the real index for committed paths so it matches the new HEAD."""
+
+    if not paths:
+        return {"code": 0, "paths": 0}
+    payload = "\0".join(paths).encode("utf-8") + b"\0"
+    code, out = _run(
+        ["git", "update-index", "--add", "--remove", "-z", "--stdin"], Path(repo_root), payload
+    )
+    return {"code": code, "out": out.strip()[:500], "paths": len(paths)}
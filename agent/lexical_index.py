@@ -0,0 +1,216 @@
+"""On-disk BM25 retrieval over repository files (SQLite FTS5, fully offline)."""
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .analyzers.cache import build_manifest
+
+CHUNK_LINES = 60
+CHUNK_STEP = 50
+MAX_FILE_BYTES = 512 * 1024
+# Path matches count double: "the task mentions the config loader" should find config_loader.py.
+_PATH_WEIGHT = 2.0
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in into is it its make "
+    "me my not of on or please should so that the their then there this to use was we what "
+    "when where which will with you your".split()
+)
+
+
+@dataclass
+class Hit:
+    path: str
+    start: int
+    end: int
+    score: float
+    text: str
+
+    def render(self) -> str:
+        return f"# {self.path}:{self.start}-{self.end}\n{self.text}"
+
+
+def query_terms(text: str, limit: int = 32) -> List[str]:
+    terms: List[str] = []
+    for word in _WORD_RE.findall(_CAMEL_RE.sub(" ", text)):
+        word = word.lower()
+        if len(word) < 2 or word in _STOPWORDS or word in terms:
+            continue
+        terms.append(word)
+        if len(terms) >= limit:
+            break
+    return terms
+
+
+def _path_terms(path: str) -> str:
+    return " ".join(_WORD_RE.findall(_CAMEL_RE.sub(" ", path)))
+
+
+def _chunks(text: str) -> Iterator[tuple]:
+    lines = text.splitlines()
+    if not lines:
+        return
+    start = 0
+    while True:
+        window = lines[start:start + CHUNK_LINES]
+        yield start + 1, start + len(window), "\n".join(window)
+        if start + CHUNK_LINES >= len(lines):
+            break
+        start += CHUNK_STEP
+
+
+_SCHEMA_VERSION = 2
+
+
+class LexicalIndex:
+    """BM25 index of tracked and untracked (non-ignored) text files.
+
+    Files are split into overlapping line windows stored in an FTS5 table;
+    a side table records each file's git blob hash so ``sync`` only
+    re-indexes files whose content changed, and the rowid range of its
+    chunks so they can be dropped without scanning the FTS table.
+    SQLite builds without FTS5 leave the index disabled.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.reindexed = 0
+        self.disabled: Optional[str] = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            conn = sqlite3.connect(str(self.path))
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                    conn.execute("DROP TABLE IF EXISTS files")
+                    conn.execute("DROP TABLE IF EXISTS chunks")
+                    conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS files ("
+                    "path TEXT PRIMARY KEY, oid TEXT NOT NULL, first_row INTEGER, last_row INTEGER)"
+                )
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                    "path UNINDEXED, start UNINDEXED, end UNINDEXED, path_terms, body)"
+                )
+                yield conn
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _unavailable(self, exc: sqlite3.OperationalError) -> None:
+        if "fts5" in str(exc).lower():
+            self.disabled = f"SQLite without FTS5: {exc}"
+
+    def sync(self, repo_root: Path, manifest: Optional[Dict[str, str]] = None) -> bool:
+        """Re-index files whose blob hash changed; drop files that disappeared."""
+
+        if self.disabled:
+            return False
+        manifest = manifest if manifest is not None else build_manifest(str(repo_root))
+        if manifest is None:
+            return False
+        current = {p: oid for p, oid in manifest.items() if oid != "deleted"}
+        try:
+            with self._connect() as conn:
+                known = {path: (oid, rows) for path, oid, *rows in conn.execute(
+                    "SELECT path, oid, first_row, last_row FROM files"
+                )}
+                top = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM chunks").fetchone()[0]
+                next_row = int(top) + 1
+
+                def drop_chunks(path: str) -> None:
+                    first, last = known[path][1]
+                    if first is not None:
+                        conn.execute(
+                            "DELETE FROM chunks WHERE rowid BETWEEN ? AND ?", (first, last)
+                        )
+
+                for path in set(known) - set(current):
+                    drop_chunks(path)
+                    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                for path, oid in current.items():
+                    if path in known:
+                        if known[path][0] == oid:
+                            continue
+                        drop_chunks(path)
+                    text = self._read_text(Path(repo_root) / path)
+                    rows = [
+                        (next_row + i, path, start, end, _path_terms(path), body)
+                        for i, (start, end, body) in enumerate(_chunks(text or ""))
+                    ]
+                    if rows:
+                        conn.executemany(
+                            "INSERT INTO chunks (rowid, path, start, end, path_terms, body)"
+                            " VALUES (?, ?, ?, ?, ?, ?)",
+                            rows,
+                        )
+                    span = (next_row, next_row + len(rows) - 1) if rows else (None, None)
+                    next_row += len(rows)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO files (path, oid, first_row, last_row)"
+                        " VALUES (?, ?, ?, ?)",
+                        (path, oid, *span),
+                    )
+                    self.reindexed += 1
+        except sqlite3.OperationalError as exc:
+            self._unavailable(exc)
+            return False
+        return True
+
+    @staticmethod
+    def _read_text(path: Path) -> Optional[str]:
+        try:
+            if path.stat().st_size > MAX_FILE_BYTES:
+                return None
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def search(self, text: str, k: int = 5) -> List[Hit]:
+        """Top ``k`` chunks for ``text`` by BM25, at most one chunk per file."""
+
+        terms = query_terms(text)
+        if not terms or self.disabled:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT path, start, end, body, bm25(chunks, 0, 0, 0, ?, 1.0) AS rank "
+                    "FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?",
+                    (_PATH_WEIGHT, match, k * 4),
+                ).fetchall()
+        except sqlite3.OperationalError as exc:
+            self._unavailable(exc)
+            return []
+        hits: List[Hit] = []
+        seen = set()
+        for path, start, end, body, rank in rows:
+            if path in seen:
+                continue
+            seen.add(path)
+            # FTS5 bm25() is negative (lower is better); flip it for readability.
+            hits.append(
+                Hit(path=path, start=int(start), end=int(end), score=-float(rank), text=body)
+            )
+            if len(hits) >= k:
+                break
+        return hits
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM files").fetchone()[0])
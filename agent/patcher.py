@@ -2,12 +2,18 @@ import os
 import re
 import subprocess
 import tempfile
-from typing import Optional
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 
 ANSI_ESCAPE_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
 FENCE_LABELED_RE = re.compile(r"```(?:diff|patch)\s*\n(.*?)\n```", re.DOTALL | re.IGNORECASE)
 FENCE_ANY_RE = re.compile(r"```[a-zA-Z0-9_+.-]*\s*\n(.*?)\n```", re.DOTALL)
+# Line-level forms of the fence openings above: the rest of the line after
+# the backticks is the label and trailing whitespace.
+FENCE_LABELED_OPEN_RE = re.compile(r"```(?:diff|patch)\s*$", re.IGNORECASE)
+FENCE_ANY_OPEN_RE = re.compile(r"```[a-zA-Z0-9_+.-]*\s*$")
+DIFF_MARKERS = ("--- ", "+++ ", "@@ ")
 
 
 def strip_ansi(s: str) -> str:
@@ -15,41 +21,219 @@ def strip_ansi(s: str) -> str:
 
 
 def extract_unified_diff(text: str) -> Optional[str]:
+    """The patch in a model response.
+
+    In order of preference: the last ```diff/```patch block containing a
+    diff, the last fenced block of any kind containing one, everything from
+    the first ``diff --git`` header, or the whole (ANSI-stripped) text when
+    it has diff markers.
+    """
     if not text:
         return None
-    clean = strip_ansi(text)
-
-    # Prefer the last labeled fenced diff/patch block
-    last = None
-    for m in FENCE_LABELED_RE.finditer(clean):
-        body = m.group(1).strip()
-        if looks_like_unified_diff(body):
-            last = body
-    if last:
-        return last
-
-    # Next, any fenced block that contains diff markers
-    for m in FENCE_ANY_RE.finditer(clean):
-        body = m.group(1).strip()
-        if looks_like_unified_diff(body):
-            last = body
-    if last:
-        return last
-
-    # If there's a git-style diff in the stream, slice from first occurrence
-    idx = clean.find("diff --git ")
-    if idx != -1:
-        return clean[idx:].strip()
-
-    # Fallback to raw if it looks like a diff
-    if looks_like_unified_diff(clean):
-        return clean
+    extractor = StreamingDiffExtractor()
+    extractor.feed(text)
+    extractor.finish()
+    return extractor.result()
+
+
+def looks_like_unified_diff(s: str) -> bool:
+    return any(h in s for h in DIFF_MARKERS)
+
+
+@dataclass
+class FileDiff:
+    """One file's section of a fenced diff, as soon as it is complete."""
+
+    path: Optional[str]
+    text: str
 
+
+def _section_path(lines: List[str]) -> Optional[str]:
+    old_path = None
+    for line in lines:
+        if line.startswith("+++ "):
+            path = line[4:].split("\t")[0].strip()
+            if path != "/dev/null":
+                return path[2:] if path.startswith("b/") else path
+        elif line.startswith("--- ") and old_path is None:
+            old_path = line[4:].split("\t")[0].strip()
+        elif line.startswith("diff --git ") and " b/" in line:
+            return line.rsplit(" b/", 1)[1].strip()
+    if old_path and old_path != "/dev/null":
+        return old_path[2:] if old_path.startswith("a/") else old_path
     return None
 
 
-def looks_like_unified_diff(s: str) -> bool:
-    return any(h in s for h in ("--- ", "+++ ", "@@ "))
+class _FenceScan:
+    """Tracks one fence pattern the way a non-overlapping regex scan would.
+
+    A block opens on a line ending in ``open_re`` and closes at the first
+    line starting with backticks after its first non-blank line (the
+    opening regex's ``\\s*`` may swallow blank lines, never text). The rest
+    of a closing line may open the next block. Bodies are kept as ranges
+    of the extractor's line list.
+    """
+
+    def __init__(self, open_re: "re.Pattern[str]") -> None:
+        self.open_re = open_re
+        self.start: Optional[int] = None
+        self.opened_at = -1
+        self.last: Optional[str] = None
+        self._text_seen = False
+        self._section = 0
+        self._section_hunks = False
+
+    def _open(self, segment: str, lineno: int, complete: bool) -> None:
+        if complete and "```" in segment and self.open_re.search(segment):
+            self.start = self.opened_at = lineno
+            self.start += 1
+            self._text_seen = False
+            self._section = self.start
+            self._section_hunks = False
+
+    def _flush_section(self, lines: List[str], end: int, out: Optional[List[FileDiff]]) -> None:
+        if out is not None and end > self._section:
+            section = lines[self._section:end]
+            text = "\n".join(section).strip()
+            if looks_like_unified_diff(text):
+                out.append(FileDiff(_section_path(section), text))
+        self._section = end
+        self._section_hunks = False
+
+    def line(
+        self, lines: List[str], lineno: int, complete: bool, out: Optional[List[FileDiff]]
+    ) -> None:
+        """Consume ``lines[lineno]``; completed per-file diffs go to ``out`` (if given)."""
+        line = lines[lineno]
+        if self.start is None:
+            self._open(line, lineno, complete)
+            return
+        if not self._text_seen:
+            if line.strip():
+                self._text_seen = True
+        elif line.startswith("```"):
+            self._flush_section(lines, lineno, out)
+            body = "\n".join(lines[self.start:lineno]).strip()
+            if looks_like_unified_diff(body):
+                self.last = body
+            self.start = None
+            self._open(line[3:], lineno, complete)
+            return
+        if line.startswith("diff --git ") or (self._section_hunks and line.startswith("--- ")):
+            self._flush_section(lines, lineno, out)
+        elif line.startswith("@@ "):
+            self._section_hunks = True
+
+
+class StreamingDiffExtractor:
+    """Single-pass, incremental ``extract_unified_diff``.
+
+    Feed the response in chunks of any size (a token stream, say). Work
+    is linear in the output: ANSI stripping and the ``diff --git``/marker
+    searches run once per chunk, and only lines with backticks or inside
+    a fence are looked at individually. ``feed`` returns the per-file diffs
+    of fenced blocks that completed with that chunk: a file's diff
+    completes when the next file header or the closing fence arrives.
+    ``result()`` after ``finish()`` is what ``extract_unified_diff``
+    returns for the whole text.
+    """
+
+    def __init__(self) -> None:
+        self._labeled = _FenceScan(FENCE_LABELED_OPEN_RE)
+        self._any = _FenceScan(FENCE_ANY_OPEN_RE)
+        self._lines: List[str] = []
+        self._partial: List[str] = []
+        self._git_at: Optional[Tuple[int, int]] = None
+        self._markers = False
+        self._fed = False
+        self._finished = False
+
+    def _consume(self, text: str, complete: bool, out: List[FileDiff]) -> None:
+        """Take whole lines (``complete``) or the final unterminated one.
+
+        ANSI escapes never span a newline, so stripping a run of lines at
+        once matches stripping the full text.
+        """
+        if "\x1b" in text:
+            text = strip_ansi(text)
+        first = len(self._lines)
+        self._lines.extend(text.split("\n"))
+        if self._git_at is None:
+            col = text.find("diff --git ")
+            if col != -1:
+                lineno = first + text.count("\n", 0, col)
+                self._git_at = (lineno, col - (text.rfind("\n", 0, col) + 1))
+        if not self._markers and looks_like_unified_diff(text):
+            self._markers = True
+        labeled, any_ = self._labeled, self._any
+        if labeled.start is None and any_.start is None and "```" not in text:
+            return
+        lines = self._lines
+        for lineno in range(first, len(lines)):
+            if labeled.start is None and any_.start is None and "```" not in lines[lineno]:
+                continue
+            # A ```diff block is seen by both scans; report its files once.
+            shared = labeled.start is not None and labeled.opened_at == any_.opened_at
+            labeled.line(lines, lineno, complete, out)
+            if labeled.opened_at == lineno:
+                shared = True
+            any_.line(lines, lineno, complete, None if shared else out)
+
+    def feed(self, chunk: str) -> List[FileDiff]:
+        if self._finished:
+            raise ValueError("feed() after finish()")
+        out: List[FileDiff] = []
+        if not chunk:
+            return out
+        self._fed = True
+        self._partial.append(chunk)
+        if "\n" not in chunk:
+            return out
+        buf = "".join(self._partial)
+        cut = buf.rfind("\n")
+        self._partial = [buf[cut + 1:]]
+        self._consume(buf[:cut], True, out)
+        return out
+
+    def finish(self) -> List[FileDiff]:
+        """Process the trailing unterminated line (it can close but not open a fence)."""
+        out: List[FileDiff] = []
+        if not self._finished:
+            self._finished = True
+            if self._fed:
+                self._consume("".join(self._partial), False, out)
+            self._partial = []
+        return out
+
+    @property
+    def fenced_diff(self) -> Optional[str]:
+        """The fenced diff ``result`` would prefer, if one has closed yet."""
+        return self._labeled.last or self._any.last
+
+    def text(self) -> str:
+        """The ANSI-stripped text consumed so far (complete lines only until ``finish``)."""
+        return "\n".join(self._lines)
+
+    def result(self) -> Optional[str]:
+        if not self._fed:
+            return None
+        fenced = self.fenced_diff
+        if fenced:
+            return fenced
+        if self._git_at is not None:
+            lineno, col = self._git_at
+            return "\n".join([self._lines[lineno][col:]] + self._lines[lineno + 1:]).strip()
+        if self._markers:
+            return self.text()
+        return None
+
+
+def iter_file_diffs(chunks: Iterable[str]) -> Iterator[FileDiff]:
+    """Yield per-file diffs from fenced blocks in ``chunks`` as each one completes."""
+    extractor = StreamingDiffExtractor()
+    for chunk in chunks:
+        yield from extractor.feed(chunk)
+    yield from extractor.finish()
 
 
 def _rewrite_patch_paths(patch_text: str, prefix: str) -> str:
@@ -75,7 +259,17 @@ def _rewrite_patch_paths(patch_text: str, prefix: str) -> str:
     return '\n'.join(lines) + ('\n' if not patch_text.endswith('\n') else '')
 
 
-from typing import Optional
+def _write_patch_file(patch_text: str, path_prefix: Optional[str]) -> str:
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".patch") as tf:
+        if path_prefix:
+            patched = _rewrite_patch_paths(patch_text, path_prefix)
+        else:
+            patched = patch_text
+        if not patched.endswith("\n"):
+            # extract_unified_diff strips the block; git rejects a patch without a final newline.
+            patched += "\n"
+        tf.write(patched)
+        return tf.name
 
 
 def apply_patch_with_git(repo_root: str, patch_text: str, work_dir: str, path_prefix: Optional[str] = None) -> str:
@@ -83,13 +277,7 @@ def apply_patch_with_git(repo_root: str, patch_text: str, work_dir: str, path_pr
     Writes a temporary patch file and runs `git apply`.
     Returns combined stdout/stderr for logging.
     """
-    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".patch") as tf:
-        if path_prefix:
-            patched = _rewrite_patch_paths(patch_text, path_prefix)
-        else:
-            patched = patch_text
-        tf.write(patched)
-        tmp_path = tf.name
+    tmp_path = _write_patch_file(patch_text, path_prefix)
 
     try:
         proc = subprocess.run(
@@ -106,3 +294,24 @@ def apply_patch_with_git(repo_root: str, patch_text: str, work_dir: str, path_pr
             os.unlink(tmp_path)
         except Exception:
             pass
+
+
+def check_patch_applies(
+    repo_root: str, patch_text: str, path_prefix: Optional[str] = None
+) -> Tuple[bool, str]:
+    """Dry-run `git apply --check`; returns (applies cleanly, git output)."""
+    tmp_path = _write_patch_file(patch_text, path_prefix)
+    try:
+        proc = subprocess.run(
+            ["git", "apply", "--check", "--whitespace=fix", tmp_path],
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            check=False,
+        )
+        return proc.returncode == 0, proc.stdout.decode("utf-8", errors="replace")
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except Exception:
+            pass
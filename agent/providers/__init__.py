@@ -3,10 +3,13 @@ from __future__ import annotations
 from typing import Dict, Optional
 
 from .api import HostedAPIProvider
-from .base import ModelInfo, Provider, ProviderError
+from .base import ModelInfo, Provider, ProviderError, run_sync
+from .cache import CachingProvider, ResponseCache
 from .command import CommandProvider
+from .delegating import DelegatingProvider
 from .keys import KeyStore
 from .manual import ManualProvider
+from .middleware import CircuitBreaker, FallbackProvider, ResilientProvider, TokenBucket
 from .ollama import OllamaProvider
 
 __all__ = [
@@ -16,9 +19,17 @@ __all__ = [
     "CommandProvider",
     "OllamaProvider",
     "HostedAPIProvider",
+    "DelegatingProvider",
+    "CachingProvider",
+    "ResponseCache",
+    "ResilientProvider",
+    "FallbackProvider",
+    "CircuitBreaker",
+    "TokenBucket",
     "KeyStore",
     "provider_from_config",
     "ModelInfo",
+    "run_sync",
 ]
 
 
@@ -1,16 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import time
 from typing import Dict, Optional, Tuple
 
+from ..tokens import usage_from_response
+from . import httpclient
 from .base import Provider, ProviderError
 from .keys import KeyStore
 
-try:  # pragma: no cover - optional dep
-    import requests
-except Exception:  # pragma: no cover
-    requests = None  # type: ignore
-
 
 class HostedAPIProvider(Provider):
     """Hosted API provider with keyring-backed secret management."""
@@ -21,8 +20,6 @@ class HostedAPIProvider(Provider):
     def __init__(self, config: Optional[Dict] = None, keystore: Optional[KeyStore] = None) -> None:
         super().__init__(config)
         self.backend = (self.config.get("backend") or "other").lower()
-        self.model = self.config.get("model")
-        self.temperature = float(self.config.get("temperature", 0.2))
         self.timeout = int(self.config.get("timeout", 120))
         self.key_source = self.config.get("key_source", "keyring")
         self.keystore = keystore or KeyStore()
@@ -32,6 +29,15 @@ class HostedAPIProvider(Provider):
             "You are an autonomous software engineer. Return unified diffs only when applicable.",
         )
 
+    @property
+    def model(self) -> Optional[str]:
+        # Read per request so ``set_model`` (router tiers, dashboard) takes effect.
+        return self.config.get("model")
+
+    @property
+    def temperature(self) -> float:
+        return float(self.config.get("temperature", 0.2))
+
     def _get_key(self) -> str:
         key = self.keystore.get(self.key_id)
         if not key:
@@ -41,20 +47,60 @@ class HostedAPIProvider(Provider):
         return key
 
     def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
-        if requests is None:
+        if not httpclient.available():
             raise ProviderError("requests package not available; install requests to use hosted APIs")
         key = self._get_key()
         payload, headers, url = self._build_request(prompt, key)
+        started = time.monotonic()
+        try:
+            resp = httpclient.post(url, headers=headers, json=payload, timeout=self.timeout)
+        except Exception as exc:  # pragma: no cover - network failure
+            raise ProviderError(
+                f"API request failed: {exc}", transient=httpclient.is_transport_error(exc)
+            ) from exc
+        return self._finish(resp, cycle_dir, started)
+
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        if not httpclient.async_available():
+            return await super().agenerate(prompt, cycle_dir)
+        key = self._get_key()
+        payload, headers, url = self._build_request(prompt, key)
+        started = time.monotonic()
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=self.timeout)
+            resp = await httpclient.async_client().post(
+                url, headers=headers, json=payload, timeout=self.timeout
+            )
+        except asyncio.CancelledError:
+            raise
         except Exception as exc:  # pragma: no cover - network failure
-            raise ProviderError(f"API request failed: {exc}") from exc
+            raise ProviderError(
+                f"API request failed: {exc}", transient=httpclient.is_transport_error(exc)
+            ) from exc
+        return self._finish(resp, cycle_dir, started)
+
+    def _finish(self, resp, cycle_dir: str, started: float) -> str:
+        """Check status and save the text and reported usage.
+
+        ``resp`` may come from requests or httpx.
+        """
         if resp.status_code >= 400:
-            raise ProviderError(f"API error {resp.status_code}: {resp.text[:200]} ...")
-        text = self._extract_text(resp.json())
+            raise ProviderError(
+                f"API error {resp.status_code}: {resp.text[:200]} ...",
+                status_code=resp.status_code,
+            )
+        data = resp.json()
+        text = self._extract_text(data)
         out_path = f"{cycle_dir}/provider_output.txt"
         with open(out_path, "w", encoding="utf-8") as f:
             f.write(text or "")
+        stats: Dict = {"total_ms": int((time.monotonic() - started) * 1000)}
+        usage = usage_from_response(data)
+        if usage is not None:
+            stats.update(
+                prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens
+            )
+        with open(f"{cycle_dir}/provider_stats.json", "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
         return text
 
     def _build_request(self, prompt: str, key: str) -> Tuple[Dict, Dict, str]:
@@ -73,6 +119,8 @@ class HostedAPIProvider(Provider):
                 ],
                 "temperature": self.temperature,
             }
+            if self.config.get("seed") is not None:
+                payload["seed"] = int(self.config["seed"])
             return payload, headers, url
         if backend == "anthropic":
             url = self.config.get("url", "https://api.anthropic.com/v1/messages")
@@ -100,6 +148,8 @@ class HostedAPIProvider(Provider):
             "prompt": prompt,
             "temperature": self.temperature,
         }
+        if self.config.get("seed") is not None:
+            payload["seed"] = int(self.config["seed"])
         payload.update(self.config.get("extra_payload", {}))
         headers.update(self.config.get("extra_headers", {}))
         return payload, headers, url
@@ -1,12 +1,32 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import copy
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from . import httpclient
+
+T = TypeVar("T")
 
 
 class ProviderError(RuntimeError):
-    """Raised when provider cannot complete a request."""
+    """Raised when provider cannot complete a request.
+
+    ``status_code`` carries the HTTP status when the failure came from a
+    server response, so callers can tell rate limits and outages apart
+    from bad requests. ``transient`` marks failures where no response
+    arrived at all (connection refused or reset), which are worth
+    repeating; configuration errors and timeouts leave it false.
+    """
+
+    def __init__(
+        self, message: str, status_code: Optional[int] = None, transient: bool = False
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.transient = transient
 
 
 @dataclass
@@ -26,6 +46,8 @@ class Provider(abc.ABC):
 
     name: str = "provider"
     mode: str = "generic"
+    # Called with each chunk of output by providers that stream.
+    on_stream: Optional[Callable[[str], None]] = None
 
     def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
         self.config = config or {}
@@ -34,6 +56,15 @@ class Provider(abc.ABC):
     def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
         """Return provider output (often a diff) or ``None`` if unavailable."""
 
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        """Async ``generate_patch``.
+
+        Providers with a native async client override this so requests can
+        run side by side on one event loop and be cancelled in flight; the
+        default runs ``generate_patch`` in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_patch, prompt, cycle_dir)
+
     def list_models(self) -> Iterable[ModelInfo]:
         """Return available models for selection (empty by default)."""
         return []
@@ -44,6 +75,18 @@ class Provider(abc.ABC):
     def set_model(self, model: str) -> None:
         self.config["model"] = model
 
+    def variant(self, **overrides: Any) -> "Provider":
+        """Return a shallow copy whose config has ``overrides`` merged in.
+
+        Used to sample several completions of one prompt; providers read
+        sampling options such as ``temperature`` and ``seed`` from
+        ``self.config`` at request time.
+        """
+        clone = copy.copy(self)
+        clone.config = {**self.config, **overrides}
+        clone.on_stream = None  # variants run concurrently; their streams would interleave
+        return clone
+
     def supports_slash_command(self, command: str) -> bool:
         return False
 
@@ -51,6 +94,31 @@ class Provider(abc.ABC):
         raise ProviderError(f"slash command {command!r} not supported")
 
 
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run ``coro`` to completion from synchronous code.
+
+    Starts a fresh event loop, so it must not be called from inside one;
+    async callers should simply ``await``.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        getattr(coro, "close", lambda: None)()
+        raise ProviderError(
+            "run_sync() called from a running event loop; await the coroutine instead"
+        )
+
+    async def _main() -> T:
+        try:
+            return await coro
+        finally:
+            await httpclient.aclose()
+
+    return asyncio.run(_main())
+
+
 def ensure_sequence(value: Any) -> List[str]:
     if value is None:
         return []
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .base import Provider, ProviderError
+from .delegating import DelegatingProvider
+
+MODES = ("read_write", "replay")
+
+
+def cache_key(provider: Provider, prompt: str) -> Dict[str, Any]:
+    """The fields a cached response is addressed by (hashed by ``ResponseCache``)."""
+
+    return {
+        "provider": provider.name,
+        "model": provider.current_model(),
+        "temperature": provider.config.get("temperature"),
+        "seed": provider.config.get("seed"),
+        "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+    }
+
+
+class ResponseCache:
+    """Size-bounded, content-addressed store of provider outputs.
+
+    One JSON file per response under ``root/<xx>/<key>.json``. A hit bumps
+    the file's mtime, and when the store grows past ``max_bytes`` the
+    least recently used files are deleted.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(key: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.json"
+
+    def get(self, digest: str) -> Optional[str]:
+        path = self._path(digest)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return entry.get("output")
+
+    def put(self, digest: str, key: Dict[str, Any], output: str) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        entry = {**key, "output": output, "created": time.time()}
+        tmp.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the store fits; return how many."""
+
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.root.glob("*/*.json"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            removed = 0
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            return removed
+
+
+class CachingProvider(DelegatingProvider):
+    """Serve repeated prompts from a ``ResponseCache``.
+
+    In ``read_write`` mode misses go to the wrapped provider and are stored.
+    ``replay`` never calls the provider: a miss is a ``ProviderError``, which
+    makes reruns of recorded cycles deterministic. ``on_event(hit, key)`` is
+    called on every lookup.
+    """
+
+    def __init__(
+        self, inner: Provider, cache: ResponseCache, mode: str = "read_write", on_event=None
+    ) -> None:
+        super().__init__(inner)
+        if mode not in MODES:
+            raise ValueError(f"unknown cache mode {mode!r}; expected one of {MODES}")
+        self.cache = cache
+        self.cache_mode = mode
+        self.on_event = on_event
+
+    def _lookup(self, prompt: str, cycle_dir: str):
+        key = cache_key(self.inner, prompt)
+        digest = ResponseCache.digest(key)
+        output = self.cache.get(digest)
+        if self.on_event is not None:
+            self.on_event(output is not None, key)
+        os.makedirs(cycle_dir, exist_ok=True)
+        with open(os.path.join(cycle_dir, "provider_cache.json"), "w", encoding="utf-8") as f:
+            record = {"hit": output is not None, "digest": digest, "mode": self.cache_mode, **key}
+            json.dump(record, f, indent=2)
+        if output is not None:
+            with open(os.path.join(cycle_dir, "provider_output.txt"), "w", encoding="utf-8") as f:
+                f.write(output)
+        elif self.cache_mode == "replay":
+            raise ProviderError(
+                f"replay mode: no cached response for prompt {key['prompt_sha256'][:12]}"
+            )
+        return key, digest, output
+
+    def _store(
+        self,
+        prompt: str,
+        cycle_dir: str,
+        key: Dict[str, Any],
+        digest: str,
+        output: Optional[str],
+    ) -> None:
+        if not output:
+            return
+        served_provider = getattr(self.inner, "served_provider", None)
+        if served_provider is not None:
+            # Behind a fallback chain, file the response under whichever
+            # provider and model actually produced it.
+            served = served_provider(cycle_dir)
+            if served is None:
+                return
+            key = cache_key(served, prompt)
+            digest = ResponseCache.digest(key)
+        self.cache.put(digest, key, output)
+
+    def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        key, digest, output = self._lookup(prompt, cycle_dir)
+        if output is not None:
+            return output
+        output = self.inner.generate_patch(prompt, cycle_dir)
+        self._store(prompt, cycle_dir, key, digest, output)
+        return output
+
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        key, digest, output = self._lookup(prompt, cycle_dir)
+        if output is not None:
+            return output
+        output = await self.inner.agenerate(prompt, cycle_dir)
+        self._store(prompt, cycle_dir, key, digest, output)
+        return output
@@ -31,6 +31,13 @@ class CommandProvider(Provider):
         model = self.current_model()
         if model and self.model_flag:
             cmd = list(cmd) + list(self.model_flag) + [model]
+        env = self.env
+        sampling = {
+            k: self.config[k] for k in ("temperature", "seed") if self.config.get(k) is not None
+        }
+        if sampling:
+            # Commands cannot take sampling options directly; expose them to wrapper scripts.
+            env = {**env, **{f"AGENT_{k.upper()}": str(v) for k, v in sampling.items()}}
         try:
             proc = subprocess.run(
                 cmd,
@@ -39,7 +46,7 @@ class CommandProvider(Provider):
                 stderr=subprocess.STDOUT,
                 timeout=self.timeout,
                 cwd=self.cwd,
-                env=self.env,
+                env=env,
             )
         except subprocess.TimeoutExpired as exc:  # pragma: no cover - runtime
             raise ProviderError(f"command provider timeout after {self.timeout}s") from exc
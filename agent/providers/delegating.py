@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .base import ModelInfo, Provider
+
+
+class DelegatingProvider(Provider):
+    """Provider that wraps another one and forwards everything it does not override.
+
+    Wrappers (response cache, rate limiting, fallback) stack on top of a
+    concrete provider without the loop noticing: configuration, model
+    selection and the streaming hook all live on the innermost provider.
+    """
+
+    def __init__(self, inner: Provider) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.mode = inner.mode
+
+    @property  # type: ignore[override]
+    def config(self) -> Dict[str, Any]:
+        return self.inner.config
+
+    @config.setter
+    def config(self, value: Dict[str, Any]) -> None:
+        self.inner.config = value
+
+    @property  # type: ignore[override]
+    def on_stream(self) -> Optional[Callable[[str], None]]:
+        return self.inner.on_stream
+
+    @on_stream.setter
+    def on_stream(self, value: Optional[Callable[[str], None]]) -> None:
+        self.inner.on_stream = value
+
+    def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        return self.inner.generate_patch(prompt, cycle_dir)
+
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        return await self.inner.agenerate(prompt, cycle_dir)
+
+    def rewrap(self, inner: Provider) -> "DelegatingProvider":
+        """This wrapper around a different inner provider, sharing wrapper state."""
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.inner = inner
+        return clone
+
+    def variant(self, **overrides: Any) -> Provider:
+        return self.rewrap(self.inner.variant(**overrides))
+
+    def list_models(self) -> Iterable[ModelInfo]:
+        return self.inner.list_models()
+
+    def current_model(self) -> Optional[str]:
+        return self.inner.current_model()
+
+    def set_model(self, model: str) -> None:
+        self.inner.set_model(model)
+
+    def supports_slash_command(self, command: str) -> bool:
+        return self.inner.supports_slash_command(command)
+
+    def run_slash_command(self, command: str, *args: str) -> str:
+        return self.inner.run_slash_command(command, *args)
+
+    def __getattr__(self, name: str) -> Any:
+        # Provider-specific helpers (``pull_model``, ``base_url`` ...).
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
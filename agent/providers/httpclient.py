@@ -0,0 +1,173 @@
+"""Shared pooled HTTP sessions for providers and dashboard helpers.
+
+Every model request used to go through a bare ``requests.post`` and paid
+for a fresh TCP connection (plus a TLS handshake for hosted APIs). Calls
+here reuse one keep-alive ``requests.Session`` per scheme and host for the
+life of the process. Async callers get one pooled ``httpx.AsyncClient``
+per event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+try:  # pragma: no cover - optional dep
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except Exception:  # pragma: no cover
+    requests = None  # type: ignore
+
+try:  # pragma: no cover - optional dep
+    import httpx
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+DEFAULTS: Dict[str, Any] = {
+    "pool_size": 10,
+    # Connection-level retries only: a request that reached the server is
+    # never replayed here, since generation requests are not idempotent.
+    "retries": 2,
+    "backoff": 0.5,
+    "timeout": 120,
+}
+
+_settings: Dict[str, Any] = dict(DEFAULTS)
+_sessions: Dict[str, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def available() -> bool:
+    return requests is not None
+
+
+def async_available() -> bool:
+    return httpx is not None
+
+
+def configure(cfg: Optional[Dict[str, Any]]) -> None:
+    """Apply the ``http`` config section; existing sessions are rebuilt on next use."""
+
+    updated = {**DEFAULTS, **{k: v for k, v in (cfg or {}).items() if k in DEFAULTS}}
+    with _lock:
+        if updated != _settings:
+            _settings.clear()
+            _settings.update(updated)
+            _close_locked()
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def session_for(url: str):
+    """The pooled session for ``url``'s scheme and host."""
+
+    if requests is None:
+        raise RuntimeError("requests package not available")
+    origin = _origin(url)
+    with _lock:
+        session = _sessions.get(origin)
+        if session is None:
+            retry = Retry(
+                total=int(_settings["retries"]),
+                connect=int(_settings["retries"]),
+                read=0,
+                status=0,
+                backoff_factor=float(_settings["backoff"]),
+                allowed_methods=None,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=int(_settings["pool_size"]), max_retries=retry
+            )
+            session = requests.Session()
+            session.mount(origin + "/", adapter)
+            _sessions[origin] = session
+        return session
+
+
+def is_transport_error(exc: BaseException) -> bool:
+    """True when the request failed before any response (refused, reset, DNS, connect timeout).
+
+    Read timeouts are excluded: the server accepted the request and may
+    still be generating, so repeating it only waits out the timeout again.
+    """
+
+    if requests is not None:
+        if isinstance(exc, requests.exceptions.ReadTimeout):
+            return False
+        if isinstance(
+            exc, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)
+        ):
+            return True
+    if httpx is not None:
+        if isinstance(
+            exc,
+            (
+                httpx.ConnectError,
+                httpx.ConnectTimeout,
+                httpx.RemoteProtocolError,
+                httpx.ReadError,
+                httpx.WriteError,
+            ),
+        ):
+            return True
+    return isinstance(exc, ConnectionError)
+
+
+def request(method: str, url: str, **kwargs: Any):
+    kwargs.setdefault("timeout", _settings["timeout"])
+    return session_for(url).request(method, url, **kwargs)
+
+
+def post(url: str, **kwargs: Any):
+    return request("POST", url, **kwargs)
+
+
+def get(url: str, **kwargs: Any):
+    return request("GET", url, **kwargs)
+
+
+def _close_locked() -> None:
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
+
+
+def close_all() -> None:
+    with _lock:
+        _close_locked()
+
+
+def async_client():
+    """The pooled ``httpx.AsyncClient`` for the running event loop."""
+
+    if httpx is None:
+        raise RuntimeError("httpx package not available")
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        size = int(_settings["pool_size"])
+        transport = httpx.AsyncHTTPTransport(
+            retries=int(_settings["retries"]),
+            limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+        )
+        client = httpx.AsyncClient(transport=transport, timeout=_settings["timeout"])
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close the running loop's async client (call before the loop ends)."""
+
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
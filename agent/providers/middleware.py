@@ -0,0 +1,310 @@
+"""Rate limiting, retries, circuit breaking and fallback around providers."""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..tokens import count_tokens
+from .base import Provider, ProviderError
+from .delegating import DelegatingProvider
+
+RETRYABLE_STATUS = frozenset({408, 429})
+
+
+def is_retryable(exc: ProviderError) -> bool:
+    """Request timeouts, rate limits, server errors and connection failures.
+
+    Errors without a status are only retried when marked ``transient``;
+    a missing API key or CLI, or a generation that timed out, fails the
+    same way every time.
+    """
+    status = exc.status_code
+    if status is None:
+        return exc.transient
+    return status in RETRYABLE_STATUS or 500 <= status < 600
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units a minute, holding at most one minute's worth.
+
+    ``reserve`` takes units immediately (the balance may go negative) and
+    returns how long the caller must wait before using them, so sync and
+    async callers share one implementation.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = float(per_minute) / 60.0
+        self.capacity = float(per_minute)
+        self.clock = clock
+        self._level = self.capacity
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = self.clock()
+            self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def debit(self, amount: float) -> None:
+        """Charge ``amount`` without waiting (e.g. output tokens after the fact)."""
+        with self._lock:
+            self._level -= amount
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive errors and stays open for ``reset_seconds``.
+
+    Once that time passes a single trial call is let through (half-open);
+    its success closes the circuit and its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failures: int = 3,
+        reset_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = max(1, int(failures))
+        self.reset_seconds = float(reset_seconds)
+        self.clock = clock
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.consecutive = 0
+                self.opened_at = None
+                return
+            self.consecutive += 1
+            if self.opened_at is not None or self.consecutive >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class ResilientProvider(DelegatingProvider):
+    """Throttle, retry and circuit-break calls to one provider.
+
+    Limits come from the ``middleware`` config block: ``requests_per_minute``
+    and ``tokens_per_minute`` (prompt tokens up front, output tokens once the
+    response arrives), ``max_retries`` with jittered exponential backoff
+    between ``backoff_base`` and ``backoff_max`` seconds on retryable
+    errors (none once ``max_retry_seconds`` would pass since the first
+    attempt), and ``breaker_failures``/``breaker_reset_seconds``.
+    """
+
+    def __init__(
+        self,
+        inner: Provider,
+        cfg: Optional[Dict[str, Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        super().__init__(inner)
+        cfg = cfg or {}
+        rpm, tpm = cfg.get("requests_per_minute"), cfg.get("tokens_per_minute")
+        self.requests = TokenBucket(rpm, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, clock) if tpm else None
+        self.max_retries = int(cfg.get("max_retries", 3))
+        self.backoff_base = float(cfg.get("backoff_base", 1.0))
+        self.backoff_max = float(cfg.get("backoff_max", 30.0))
+        self.max_retry_seconds = float(cfg.get("max_retry_seconds") or 0) or None
+        self.clock = clock
+        self.breaker = CircuitBreaker(
+            int(cfg.get("breaker_failures", 3)),
+            float(cfg.get("breaker_reset_seconds", 60.0)),
+            clock,
+        )
+        self.sleep = sleep
+        self.attempts = 0
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _throttle_wait(self, prompt: str) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(count_tokens(prompt)))
+        return wait
+
+    def _admit(self) -> None:
+        if not self.breaker.allow():
+            raise ProviderError(
+                f"{self.name}: circuit open after {self.breaker.consecutive} consecutive failures"
+            )
+
+    def _settle(
+        self, exc: Optional[ProviderError], output: Optional[str], attempt: int, started: float
+    ) -> Optional[float]:
+        """Record the outcome; return the backoff before retrying, or ``None`` to stop."""
+        self.breaker.record(exc is None)
+        if exc is None:
+            if self.tokens is not None and output:
+                self.tokens.debit(count_tokens(output))
+            return None
+        if attempt >= self.max_retries or not is_retryable(exc) or self.breaker.state == "open":
+            return None
+        delay = self._delay(attempt)
+        budget = self.max_retry_seconds
+        if budget is not None and self.clock() - started + delay > budget:
+            return None
+        return delay
+
+    def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        attempt = 0
+        started = self.clock()
+        while True:
+            self._admit()
+            try:
+                wait = self._throttle_wait(prompt)
+                if wait:
+                    self.sleep(wait)
+                self.attempts += 1
+                output = self.inner.generate_patch(prompt, cycle_dir)
+            except ProviderError as exc:
+                delay = self._settle(exc, None, attempt, started)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Unexpected errors and interrupts still end a half-open trial.
+                self.breaker.record(False)
+                raise
+            self._settle(None, output, attempt, started)
+            return output
+
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        attempt = 0
+        started = self.clock()
+        while True:
+            self._admit()
+            try:
+                wait = self._throttle_wait(prompt)
+                if wait:
+                    await asyncio.sleep(wait)
+                self.attempts += 1
+                output = await self.inner.agenerate(prompt, cycle_dir)
+            except ProviderError as exc:
+                delay = self._settle(exc, None, attempt, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.record(False)
+                raise
+            self._settle(None, output, attempt, started)
+            return output
+
+
+class FallbackProvider(DelegatingProvider):
+    """Try each provider in ``chain`` until one answers.
+
+    The first provider is the one model selection and config apply to.
+    Which provider served the request (and why earlier ones were skipped)
+    is written to ``provider_chain.json`` in the cycle directory.
+    """
+
+    def __init__(self, chain: Sequence[Provider]) -> None:
+        if not chain:
+            raise ValueError("fallback chain needs at least one provider")
+        super().__init__(chain[0])
+        self.chain: List[Provider] = list(chain)
+
+    def variant(self, **overrides: Any) -> Provider:
+        clone = self.rewrap(self.inner.variant(**overrides))
+        clone.chain = [clone.inner] + [p.variant(**overrides) for p in self.chain[1:]]
+        return clone
+
+    def _record(self, cycle_dir: str, served: Optional[str], errors: List[Dict[str, Any]]) -> None:
+        os.makedirs(cycle_dir, exist_ok=True)
+        with open(os.path.join(cycle_dir, "provider_chain.json"), "w", encoding="utf-8") as f:
+            json.dump({"served_by": served, "errors": errors}, f, indent=2)
+
+    def _fail(self, cycle_dir: str, errors: List[Dict[str, Any]]) -> ProviderError:
+        self._record(cycle_dir, None, errors)
+        summary = "; ".join(f"{e['provider']}: {e['error']}" for e in errors)
+        last = errors[-1]
+        return ProviderError(
+            f"all providers failed ({summary})",
+            status_code=last.get("status_code"),
+            transient=last.get("transient", False),
+        )
+
+    @staticmethod
+    def _label(provider: Provider) -> str:
+        return f"{provider.name}:{provider.current_model() or '-'}"
+
+    def served_provider(self, cycle_dir: str) -> Optional[Provider]:
+        """The chain member that answered the request recorded in ``cycle_dir``."""
+        try:
+            with open(os.path.join(cycle_dir, "provider_chain.json"), encoding="utf-8") as f:
+                served = json.load(f).get("served_by")
+        except (OSError, ValueError, AttributeError):
+            return None
+        return next((p for p in self.chain if self._label(p) == served), None)
+
+    def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        errors: List[Dict[str, Any]] = []
+        for provider in self.chain:
+            try:
+                output = provider.generate_patch(prompt, cycle_dir)
+            except ProviderError as exc:
+                errors.append({
+                    "provider": self._label(provider),
+                    "error": str(exc),
+                    "status_code": exc.status_code,
+                    "transient": exc.transient,
+                })
+                continue
+            self._record(cycle_dir, self._label(provider), errors)
+            return output
+        raise self._fail(cycle_dir, errors)
+
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        errors: List[Dict[str, Any]] = []
+        for provider in self.chain:
+            try:
+                output = await provider.agenerate(prompt, cycle_dir)
+            except ProviderError as exc:
+                errors.append({
+                    "provider": self._label(provider),
+                    "error": str(exc),
+                    "status_code": exc.status_code,
+                    "transient": exc.transient,
+                })
+                continue
+            self._record(cycle_dir, self._label(provider), errors)
+            return output
+        raise self._fail(cycle_dir, errors)
@@ -1,17 +1,186 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import os
 import shutil
 import subprocess
-from typing import Dict, Iterable, List, Optional
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from ..patcher import StreamingDiffExtractor
+from . import httpclient
 from .base import ModelInfo, Provider, ProviderError
 from .command import CommandProvider
 
-try:  # pragma: no cover - optional dep
-    import requests
-except Exception:  # pragma: no cover
-    requests = None  # type: ignore
+
+def generation_stats(result: Dict) -> Dict[str, Any]:
+    """Token counts and timings (ms) from an Ollama generate response.
+
+    ``prompt_eval_count`` only counts prompt tokens that were evaluated, so
+    a prefix served from the KV cache shows up as a smaller count.
+    """
+    stats: Dict[str, Any] = {}
+    for key in ("prompt_eval_count", "eval_count"):
+        if isinstance(result.get(key), int):
+            stats[key] = result[key]
+    for key in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+        if isinstance(result.get(key), int):
+            stats[key.replace("_duration", "_ms")] = result[key] // 1_000_000
+    if result.get("stopped"):
+        stats["stopped"] = result["stopped"]
+    return stats
+
+
+_TAGS_CACHE: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+_TAGS_LOCK = threading.Lock()
+
+
+def fetch_tags(
+    base_url: str, ttl: float = 30.0, timeout: float = 5.0
+) -> Optional[List[Dict[str, Any]]]:
+    """Locally available models from ``/api/tags``, cached per server for ``ttl`` seconds.
+
+    Returns ``None`` when the server cannot be reached so callers can fall
+    back to the CLI; failures are not cached.
+    """
+    base_url = base_url.rstrip("/")
+    now = time.monotonic()
+    with _TAGS_LOCK:
+        cached = _TAGS_CACHE.get(base_url)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+    if not httpclient.available():
+        return None
+    try:
+        resp = httpclient.get(f"{base_url}/api/tags", timeout=timeout)
+        resp.raise_for_status()
+        models = [m for m in resp.json().get("models", []) if isinstance(m, dict)]
+    except Exception:
+        return None
+    with _TAGS_LOCK:
+        _TAGS_CACHE[base_url] = (now, models)
+    return models
+
+
+def invalidate_tags(base_url: Optional[str] = None) -> None:
+    """Drop cached model lists (for one server, or all of them)."""
+    with _TAGS_LOCK:
+        if base_url is None:
+            _TAGS_CACHE.clear()
+        else:
+            _TAGS_CACHE.pop(base_url.rstrip("/"), None)
+
+
+def _describe(details: Any) -> Optional[str]:
+    if isinstance(details, dict):
+        parts = [
+            details.get("family"),
+            details.get("parameter_size"),
+            details.get("quantization_level"),
+        ]
+        return " ".join(str(p) for p in parts if p) or None
+    return details
+
+
+def _status_of(exc: Exception) -> Optional[int]:
+    """HTTP status behind a requests/httpx error, if there was a response."""
+    if isinstance(exc, ProviderError):
+        return exc.status_code
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _transient(exc: Exception) -> bool:
+    if isinstance(exc, ProviderError):
+        return exc.transient
+    return httpclient.is_transport_error(exc)
+
+
+class _DiffWatch:
+    """Incremental view of streamed output used to stop generation early.
+
+    ``complete`` turns true once the first fenced diff block has closed;
+    ``seen_marker`` once the output has shown any sign of a diff (a code
+    fence or diff header). ``extract_unified_diff`` prefers the *last* diff
+    block, so a model that revises its patch in a second block would have
+    it cut off; that is why ``stream_early_stop`` is opt-in.
+    """
+
+    _MARKERS = ("```", "diff --git ", "--- ", "+++ ", "@@ ")
+    _OVERLAP = max(len(m) for m in _MARKERS) - 1
+
+    def __init__(self) -> None:
+        self.complete = False
+        self.seen_marker = False
+        self._extractor = StreamingDiffExtractor()
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        if not self.seen_marker:
+            window = self._tail + text
+            self.seen_marker = any(m in window for m in self._MARKERS)
+            self._tail = window[-self._OVERLAP:]
+        self._extractor.feed(text)
+        if not self.complete and self._extractor.fenced_diff is not None:
+            self.complete = True
+
+
+class _StreamReader:
+    """Consumes streamed generate events, deciding when to stop early.
+
+    Tokens are appended to ``output_path`` and passed to ``on_stream`` as
+    they arrive. The caller stops reading (and closes the response, which
+    makes Ollama cancel generation) once ``feed`` returns true: after the
+    first diff fence closes (only with ``stream_early_stop``), or when
+    ``stream_abort_chars`` pass without any sign of a diff. The abort is off
+    by default (0): prompts ask the model to reason before the diff, and
+    larger models can take many characters to get there.
+    """
+
+    def __init__(self, provider: "OllamaProvider", output_path: str) -> None:
+        self.on_stream = provider.on_stream
+        self.early_stop = bool(provider.config.get("stream_early_stop", False))
+        self.abort_chars = int(provider.config.get("stream_abort_chars") or 0)
+        self.watch = _DiffWatch()
+        self.parts: List[str] = []
+        self.size = 0
+        self.result: Dict = {}
+        self._out = open(output_path, "w", encoding="utf-8")
+
+    @property
+    def output(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, line) -> bool:
+        if not line:
+            return False
+        event = json.loads(line)
+        if event.get("error"):
+            raise ProviderError(str(event["error"]))
+        text = event.get("response", "")
+        if text:
+            self.parts.append(text)
+            self.size += len(text)
+            self._out.write(text)
+            self._out.flush()
+            if self.on_stream is not None:
+                self.on_stream(text)
+            self.watch.feed(text)
+        if event.get("done"):
+            self.result = event
+            return True
+        if self.early_stop and self.watch.complete:
+            self.result = {"stopped": "diff_complete"}
+            return True
+        if self.abort_chars and self.size >= self.abort_chars and not self.watch.seen_marker:
+            self.result = {"stopped": "no_diff"}
+            return True
+        return False
+
+    def close(self) -> None:
+        self._out.close()
 
 
 class OllamaProvider(CommandProvider):
@@ -52,15 +221,19 @@ class OllamaProvider(CommandProvider):
 
     def generate_patch(self, prompt: str, cycle_dir: str) -> Optional[str]:
         """Generate patch using HTTP API if available, otherwise fall back to CLI."""
-        if self.use_api and requests is not None:
+        if self.use_api and httpclient.available():
             try:
                 return self._generate_via_api(prompt, cycle_dir)
             except Exception as e:
                 # Fall back to CLI on API failure if CLI is available
                 if self.has_cli:
-                    print(f"Ollama API failed, falling back to CLI: {e}")
+                    self._note_cli_fallback(cycle_dir, e)
                 else:
-                    raise ProviderError(f"Ollama API request failed and no CLI available: {e}")
+                    raise ProviderError(
+                        f"Ollama API request failed and no CLI available: {e}",
+                        status_code=_status_of(e),
+                        transient=_transient(e),
+                    )
 
         # Fall back to CLI mode if available
         if self.has_cli:
@@ -68,10 +241,36 @@ class OllamaProvider(CommandProvider):
         else:
             raise ProviderError("Cannot generate patch: Ollama CLI not available and API mode disabled")
 
-    def _generate_via_api(self, prompt: str, cycle_dir: str) -> Optional[str]:
-        """Generate patch using Ollama HTTP API."""
-        import os
+    async def agenerate(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        """Native async generation over httpx; other setups use the sync path in a thread."""
+        if not (self.use_api and httpclient.async_available()):
+            return await super().agenerate(prompt, cycle_dir)
+        try:
+            return await self._agenerate_via_api(prompt, cycle_dir)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self.has_cli:
+                raise ProviderError(
+                    f"Ollama API request failed and no CLI available: {e}",
+                    status_code=_status_of(e),
+                    transient=_transient(e),
+                )
+            self._note_cli_fallback(cycle_dir, e)
+            return await asyncio.to_thread(CommandProvider.generate_patch, self, prompt, cycle_dir)
+
+    @staticmethod
+    def _note_cli_fallback(cycle_dir: str, exc: Exception) -> None:
+        # Recorded beside the cycle's other artifacts; best-of workers share stdout.
+        os.makedirs(cycle_dir, exist_ok=True)
+        with open(os.path.join(cycle_dir, "provider_fallback.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"fallback": "cli", "api_error": str(exc), "status_code": _status_of(exc)},
+                f,
+                indent=2,
+            )
 
+    def _api_request(self, prompt: str, cycle_dir: str) -> Tuple[str, Dict]:
         os.makedirs(cycle_dir, exist_ok=True)
         with open(os.path.join(cycle_dir, "prompt.md"), "w", encoding="utf-8") as f:
             f.write(prompt)
@@ -79,30 +278,97 @@ class OllamaProvider(CommandProvider):
         model = self.current_model() or "llama3"
         url = f"{self.base_url}/api/generate"
 
+        options = {"temperature": float(self.config.get("temperature", 0.2))}
+        if self.config.get("seed") is not None:
+            options["seed"] = int(self.config["seed"])
+        num_ctx = self.config.get("num_ctx")
+        if isinstance(num_ctx, dict):  # per-model windows, as in prompt.context_tokens
+            num_ctx = num_ctx.get(model, num_ctx.get("default"))
+        if num_ctx:
+            # Ollama otherwise loads with its own default window (2048) and
+            # silently truncates prompts built for the configured budget.
+            options["num_ctx"] = int(num_ctx)
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.2,
-            }
+            "stream": bool(self.config.get("stream", True)),
+            "options": options,
         }
+        if self.config.get("keep_alive") is not None:
+            # Keeping the model loaded also keeps its KV cache, so a repeated
+            # prompt prefix is not re-evaluated on the next cycle.
+            payload["keep_alive"] = self.config["keep_alive"]
+        return url, payload
 
-        try:
-            response = requests.post(url, json=payload, timeout=self.timeout)
-            response.raise_for_status()
-            result = response.json()
-            output = result.get("response", "")
-
+    def _write_result(self, cycle_dir: str, output: str, result: Dict, streamed: bool) -> str:
+        if not streamed:
             with open(os.path.join(cycle_dir, "provider_output.txt"), "w", encoding="utf-8") as f:
                 f.write(output)
+        with open(os.path.join(cycle_dir, "provider_stats.json"), "w", encoding="utf-8") as f:
+            json.dump(generation_stats(result), f, indent=2)
+        return output
 
-            return output
+    def _generate_via_api(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        """Generate patch using Ollama HTTP API."""
+        url, payload = self._api_request(prompt, cycle_dir)
+        stream = payload["stream"]
+        try:
+            response = httpclient.post(url, json=payload, timeout=self.timeout, stream=stream)
+            response.raise_for_status()
+            if not stream:
+                result = response.json()
+                return self._write_result(cycle_dir, result.get("response", ""), result, False)
+            reader = _StreamReader(self, os.path.join(cycle_dir, "provider_output.txt"))
+            try:
+                for line in response.iter_lines():
+                    if reader.feed(line):
+                        break
+            finally:
+                response.close()
+                reader.close()
+            return self._write_result(cycle_dir, reader.output, reader.result, True)
+        except Exception as exc:
+            raise ProviderError(
+                f"Ollama API request failed: {exc}",
+                status_code=_status_of(exc),
+                transient=_transient(exc),
+            ) from exc
+
+    async def _agenerate_via_api(self, prompt: str, cycle_dir: str) -> Optional[str]:
+        url, payload = self._api_request(prompt, cycle_dir)
+        client = httpclient.async_client()
+        try:
+            if not payload["stream"]:
+                response = await client.post(url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                result = response.json()
+                return self._write_result(cycle_dir, result.get("response", ""), result, False)
+            reader = _StreamReader(self, os.path.join(cycle_dir, "provider_output.txt"))
+            try:
+                # Leaving the block closes the connection, which cancels generation server-side.
+                async with client.stream(
+                    "POST", url, json=payload, timeout=self.timeout
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if reader.feed(line):
+                            break
+            finally:
+                reader.close()
+            return self._write_result(cycle_dir, reader.output, reader.result, True)
+        except asyncio.CancelledError:
+            raise
         except Exception as exc:
-            raise ProviderError(f"Ollama API request failed: {exc}") from exc
+            raise ProviderError(
+                f"Ollama API request failed: {exc}",
+                status_code=_status_of(exc),
+                transient=_transient(exc),
+            ) from exc
 
     def list_models(self) -> Iterable[ModelInfo]:
-        payload = self._list_json()
+        payload = fetch_tags(self.base_url, float(self.config.get("models_ttl_seconds", 30)))
+        if payload is None:
+            payload = self._list_json()
         if not payload:
             return []
         models: List[ModelInfo] = []
@@ -111,7 +377,7 @@ class OllamaProvider(CommandProvider):
                 name = entry.get("name")
                 if not name:
                     continue
-                models.append(ModelInfo(name=name, description=entry.get("details")))
+                models.append(ModelInfo(name=name, description=_describe(entry.get("details"))))
             elif isinstance(entry, str):
                 models.append(ModelInfo(name=entry))
         return models
@@ -148,4 +414,6 @@ class OllamaProvider(CommandProvider):
             subprocess.run(["ollama", "pull", model], check=True, timeout=3600)
         except subprocess.CalledProcessError as exc:  # pragma: no cover - runtime
             raise ProviderError(f"ollama pull failed for {model}") from exc
+        finally:
+            invalidate_tags(self.base_url)
 
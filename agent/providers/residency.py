@@ -0,0 +1,115 @@
+"""Keep Ollama models loaded between cycles and warm them ahead of use."""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+from . import httpclient
+
+_DURATION_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*$")
+_UNIT_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value: Union[str, int, float, None]) -> Optional[float]:
+    """Seconds for an Ollama ``keep_alive`` value; negative means forever."""
+
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION_RE.match(str(value))
+    if not match:
+        return None
+    return float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+class ModelResidency:
+    """Preloads models with empty generate requests and tracks load times.
+
+    Ollama loads a model on an empty ``/api/generate`` call and keeps it for
+    ``keep_alive``. Warm-ups run on a single background worker so the loop
+    can keep running commands while weights load; each finished warm-up is
+    kept until ``drain`` hands it to the cycle metadata.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        keep_alive: Union[str, int, float, None] = None,
+        timeout: int = 600,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-warmup")
+        self._pending: Dict[str, Future] = {}
+        self._done: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def keep_alive_for(self, cooldown: float, margin: float = 60.0) -> Union[str, int, float, None]:
+        """``keep_alive`` long enough to span the loop's cooldown.
+
+        Never shortens the configured value.
+        """
+
+        configured = parse_keep_alive(self.keep_alive)
+        if configured is not None and (configured < 0 or configured >= cooldown + margin):
+            return self.keep_alive
+        return int(cooldown + margin)
+
+    def warm(self, model: str, keep_alive: Union[str, int, float, None] = None) -> Dict[str, Any]:
+        """Load ``model`` now; returns the timing record."""
+
+        payload: Dict[str, Any] = {"model": model}
+        if keep_alive is not None or self.keep_alive is not None:
+            payload["keep_alive"] = keep_alive if keep_alive is not None else self.keep_alive
+        started = time.time()
+        record: Dict[str, Any] = {"model": model, "started": started}
+        try:
+            resp = httpclient.post(
+                f"{self.base_url}/api/generate", json=payload, timeout=self.timeout
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            record["ok"] = True
+            if isinstance(data.get("load_duration"), int):
+                record["load_ms"] = data["load_duration"] // 1_000_000
+        except Exception as exc:
+            record["ok"] = False
+            record["error"] = str(exc)
+        record["elapsed_ms"] = int((time.time() - started) * 1000)
+        with self._lock:
+            self._done.append(record)
+        return record
+
+    def warm_async(self, model: str, keep_alive: Union[str, int, float, None] = None) -> Future:
+        """Queue a warm-up unless one for ``model`` is already in flight."""
+
+        with self._lock:
+            pending = self._pending.get(model)
+            if pending is not None and not pending.done():
+                return pending
+            future = self._pool.submit(self.warm, model, keep_alive)
+            self._pending[model] = future
+            return future
+
+    def loaded(self) -> List[str]:
+        """Models Ollama currently holds in memory (``/api/ps``)."""
+
+        try:
+            resp = httpclient.get(f"{self.base_url}/api/ps", timeout=10)
+            resp.raise_for_status()
+            return [m.get("name") or m.get("model") for m in resp.json().get("models", [])]
+        except Exception:
+            return []
+
+    def drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            done, self._done = self._done, []
+        return done
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
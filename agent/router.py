@@ -0,0 +1,184 @@
+"""Per-cycle model routing between a fast tier and stronger fallbacks."""
+from __future__ import annotations
+
+import json
+import os
+import re
+import shlex
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Tools (or make/tox targets) whose failures are usually mechanical lint/format fixes.
+DEFAULT_FAST_COMMANDS = (
+    "lint", "format", "ruff", "black", "isort", "flake8", "pycodestyle", "autopep8",
+)
+DEFAULT_STRONG_KEYWORDS = (
+    "architecture", "design", "feature", "implement", "migrate", "redesign", "refactor", "rewrite",
+)
+
+
+@dataclass
+class Tier:
+    name: str
+    model: str
+    max_prompt_tokens: Optional[int] = None
+
+
+@dataclass
+class RouteDecision:
+    tier: str
+    model: str
+    reasons: List[str] = field(default_factory=list)
+    decision_ms: float = 0.0
+    prompt_tokens: int = 0
+    generation_seconds: Optional[float] = None
+    passed: Optional[bool] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ModelRouter:
+    """Pick a model tier for each cycle and learn from gate outcomes.
+
+    Cycles start on the first (cheapest) tier. A cycle moves up when the
+    prompt is too large for the tier, the user task asks for design-level
+    work, the tier's smoothed gate pass rate is poor, or (most commonly)
+    the previous cycle on the tier below failed the gate; a passing cycle
+    drops back to the first tier. Pass rates persist in ``path``.
+    """
+
+    def __init__(
+        self, path: Path, tiers: Sequence[Tier], cfg: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if not tiers:
+            raise ValueError("router needs at least one tier")
+        cfg = cfg or {}
+        self.path = Path(path)
+        self.tiers = list(tiers)
+        self.fast_commands = tuple(cfg.get("fast_commands", DEFAULT_FAST_COMMANDS))
+        self.strong_keywords = tuple(cfg.get("strong_keywords", DEFAULT_STRONG_KEYWORDS))
+        self.min_success_rate = float(cfg.get("min_success_rate", 0.3))
+        self.min_samples = int(cfg.get("min_samples", 5))
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.escalate_from: Optional[int] = None
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            payload = {}
+        if isinstance(payload, dict):
+            self.stats = payload.get("stats") or {}
+            self.escalate_from = payload.get("escalate_from")
+
+    @classmethod
+    def from_config(cls, path: Path, cfg: Dict[str, Any]) -> Optional["ModelRouter"]:
+        tiers = [
+            Tier(t["name"], t["model"], t.get("max_prompt_tokens"))
+            for t in cfg.get("tiers", [])
+            if t.get("model")
+        ]
+        return cls(path, tiers, cfg) if tiers else None
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"stats": self.stats, "escalate_from": self.escalate_from}
+        self.path.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8")
+
+    def success_rate(self, tier: str) -> float:
+        entry = self.stats.get(tier) or {}
+        return (int(entry.get("passed", 0)) + 1) / (int(entry.get("attempts", 0)) + 2)
+
+    def _index(self, name: str) -> int:
+        return next((i for i, t in enumerate(self.tiers) if t.name == name), 0)
+
+    def is_mechanical(self, command: str) -> bool:
+        """Whether ``command`` (a configured line such as ``ruff check``) runs a fast tool."""
+
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            words = command.split()
+        return any(os.path.basename(word) in self.fast_commands for word in words)
+
+    def route(
+        self,
+        prompt_tokens: int,
+        failing_commands: Sequence[str] = (),
+        task: Optional[str] = None,
+    ) -> RouteDecision:
+        started = time.perf_counter()
+        reasons: List[str] = []
+        index = 0
+        top = len(self.tiers) - 1
+
+        if self.escalate_from is not None:
+            # A failing top tier stays put rather than dropping back to the first tier.
+            index = min(self.escalate_from + 1, top)
+            failed = self.tiers[min(self.escalate_from, top)].name
+            reasons.append(f"escalated: {failed} failed the gate last cycle")
+        if task and index < top:
+            words = set(re.findall(r"[a-z]+", task.lower()))
+            hits = sorted(words.intersection(self.strong_keywords))
+            if hits:
+                index = top
+                reasons.append(f"task mentions {', '.join(hits)}")
+        while index < top:
+            limit = self.tiers[index].max_prompt_tokens
+            if not limit or prompt_tokens <= limit:
+                break
+            reasons.append(f"prompt {prompt_tokens} tokens exceeds {self.tiers[index].name} limit")
+            index += 1
+        mechanical = (
+            index == 0
+            and bool(failing_commands)
+            and all(self.is_mechanical(c) for c in failing_commands)
+        )
+        if mechanical:
+            reasons.append("only mechanical findings: " + ", ".join(failing_commands))
+        while index < top and not mechanical:
+            entry = self.stats.get(self.tiers[index].name) or {}
+            if int(entry.get("attempts", 0)) < self.min_samples:
+                break
+            rate = self.success_rate(self.tiers[index].name)
+            if rate >= self.min_success_rate:
+                break
+            reasons.append(
+                f"{self.tiers[index].name} pass rate {rate:.2f} below {self.min_success_rate:.2f}"
+            )
+            index += 1
+        if not reasons:
+            reasons.append("default tier")
+        tier = self.tiers[index]
+        return RouteDecision(
+            tier=tier.name,
+            model=tier.model,
+            reasons=reasons,
+            decision_ms=round((time.perf_counter() - started) * 1000, 3),
+            prompt_tokens=prompt_tokens,
+        )
+
+    def decision_for(self, model: Optional[str], reason: str) -> Optional[RouteDecision]:
+        """Decision for a generation that ``model`` already produced (e.g. a pipelined patch)."""
+
+        tier = next((t for t in self.tiers if t.model == model), None)
+        return RouteDecision(tier=tier.name, model=tier.model, reasons=[reason]) if tier else None
+
+    def escalation_model(self) -> Optional[str]:
+        """Model the next cycle escalates to, if the last one failed below the top tier."""
+
+        if self.escalate_from is None or self.escalate_from >= len(self.tiers) - 1:
+            return None
+        return self.tiers[self.escalate_from + 1].model
+
+    def record(self, decision: RouteDecision, passed: bool) -> None:
+        decision.passed = passed
+        entry = self.stats.setdefault(decision.tier, {"attempts": 0, "passed": 0})
+        entry["attempts"] += 1
+        if passed:
+            entry["passed"] += 1
+            self.escalate_from = None
+        else:
+            self.escalate_from = self._index(decision.tier)
+        self.save()
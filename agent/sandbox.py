@@ -0,0 +1,197 @@
+"""Pool of git worktrees used to verify patches away from the live tree."""
+from __future__ import annotations
+
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Never copied into a sandbox snapshot: cycle artifacts are large and
+# agent/local holds control files and locally stored API keys.
+DEFAULT_EXCLUDES = ("agent/artifacts", "agent/local")
+
+
+class SandboxError(RuntimeError):
+    """Raised when a sandbox worktree cannot be created or reset."""
+
+
+@dataclass
+class Sandbox:
+    index: int
+    path: Path
+    snapshot: Optional[str] = None
+
+
+def _git(
+    args: Sequence[str],
+    cwd: Path,
+    env: Optional[Dict[str, str]] = None,
+    check: bool = True,
+) -> Tuple[int, str]:
+    proc = subprocess.run(
+        ["git", *args],
+        cwd=str(cwd),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=False,
+    )
+    out = proc.stdout.decode("utf-8", errors="replace")
+    if check and proc.returncode != 0:
+        raise SandboxError(f"git {' '.join(args)} failed: {out.strip()[:500]}")
+    return proc.returncode, out
+
+
+class WorktreePool:
+    """Pre-created ``git worktree`` checkouts that mirror the live tree on demand.
+
+    ``snapshot()`` records the current working tree (tracked changes and
+    untracked, non-ignored files) as a detached commit without touching the
+    real index or any branch. ``acquire()`` hands out a worktree reset to
+    that snapshot; resetting an existing worktree only rewrites files that
+    differ, so reuse is much cheaper than a fresh checkout.
+
+    Worktrees live under ``<git-common-dir>/agent-worktrees`` so repo-wide
+    scans of the main tree never descend into them.
+    """
+
+    def __init__(
+        self,
+        repo_root: Path,
+        size: int = 2,
+        root: Optional[Path] = None,
+        excludes: Sequence[str] = DEFAULT_EXCLUDES,
+    ) -> None:
+        self.repo_root = Path(repo_root)
+        self.size = max(1, int(size))
+        self.excludes = tuple(excludes)
+        self._git_dir = Path(self._rev_parse("--absolute-git-dir"))
+        common = self._rev_parse("--git-common-dir")
+        if os.path.isabs(common):
+            self._common_dir = Path(common)
+        else:
+            self._common_dir = (self.repo_root / common).resolve()
+        self.root = Path(root) if root else self._common_dir / "agent-worktrees"
+        self._free: "queue.Queue[Sandbox]" = queue.Queue()
+        self._slots: Set[int] = set()  # worktree indexes created or being created
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._worktree_lock = threading.Lock()
+
+    def _rev_parse(self, flag: str) -> str:
+        _, out = _git(["rev-parse", flag], self.repo_root)
+        return out.strip().splitlines()[-1]
+
+    def snapshot(self) -> str:
+        """Commit the live working tree to a dangling commit and return its oid."""
+
+        with self._snapshot_lock, tempfile.TemporaryDirectory(prefix="agent-snapshot-") as tmp:
+            env = os.environ.copy()
+            env["GIT_INDEX_FILE"] = str(Path(tmp) / "index")
+            real_index = self._git_dir / "index"
+            # Start from the real index so its stat cache spares re-hashing clean files.
+            if real_index.exists():
+                shutil.copyfile(real_index, env["GIT_INDEX_FILE"])
+            pathspec = ["."] + [f":(exclude){path}" for path in self.excludes]
+            _git(["add", "-A", "--", *pathspec], self.repo_root, env=env)
+            for path in self.excludes:
+                _git(
+                    ["rm", "-r", "-q", "--cached", "--ignore-unmatch", "--", path],
+                    self.repo_root,
+                    env=env,
+                )
+            _, tree = _git(["write-tree"], self.repo_root, env=env)
+            code, head = _git(["rev-parse", "--verify", "-q", "HEAD"], self.repo_root, check=False)
+            args = ["commit-tree", tree.strip(), "-m", "agent sandbox snapshot"]
+            if code == 0:
+                args[2:2] = ["-p", head.strip()]
+            commit_env = env.copy()
+            commit_env.setdefault("GIT_AUTHOR_NAME", "agent")
+            commit_env.setdefault("GIT_AUTHOR_EMAIL", "agent@localhost")
+            commit_env.setdefault("GIT_COMMITTER_NAME", "agent")
+            commit_env.setdefault("GIT_COMMITTER_EMAIL", "agent@localhost")
+            _, oid = _git(args, self.repo_root, env=commit_env)
+        return oid.strip().splitlines()[-1]
+
+    def _reserve(self) -> Optional[int]:
+        """Claim a free worktree index, or ``None`` when the pool is full."""
+
+        with self._lock:
+            index = next((i for i in range(self.size) if i not in self._slots), None)
+            if index is not None:
+                self._slots.add(index)
+            return index
+
+    def _create(self, snapshot: str, index: int) -> Sandbox:
+        path = self.root / f"wt-{index}"
+        if path.exists():
+            # Left over from a previous run; reuse it if git still knows it.
+            code, _ = _git(["rev-parse", "--git-dir"], path, check=False)
+            if code == 0:
+                return Sandbox(index=index, path=path)
+            shutil.rmtree(path, ignore_errors=True)
+        # A concurrent prune deletes the admin dir of a worktree still being added.
+        with self._worktree_lock:
+            _git(["worktree", "prune"], self.repo_root, check=False)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _git(["worktree", "add", "--detach", "--force", str(path), snapshot], self.repo_root)
+        return Sandbox(index=index, path=path, snapshot=snapshot)
+
+    def _reset(self, sandbox: Sandbox, snapshot: str) -> None:
+        if sandbox.snapshot != snapshot:
+            _git(["checkout", "--detach", "--force", "-q", snapshot], sandbox.path)
+        else:
+            _git(["reset", "--hard", "-q"], sandbox.path)
+        _git(["clean", "-ffdq"], sandbox.path)
+        sandbox.snapshot = snapshot
+
+    @contextmanager
+    def acquire(
+        self, snapshot: Optional[str] = None, timeout: Optional[float] = None
+    ) -> Iterator[Sandbox]:
+        """Yield a sandbox mirroring ``snapshot`` (default: the live tree right now)."""
+
+        snapshot = snapshot or self.snapshot()
+        try:
+            sandbox = self._free.get_nowait()
+        except queue.Empty:
+            sandbox = None
+        if sandbox is None:
+            index = self._reserve()
+            if index is not None:
+                try:
+                    sandbox = self._create(snapshot, index)
+                except BaseException:
+                    with self._lock:
+                        self._slots.discard(index)
+                    raise
+            else:
+                try:
+                    sandbox = self._free.get(timeout=timeout)
+                except queue.Empty as exc:
+                    raise SandboxError("no sandbox became free in time") from exc
+        try:
+            self._reset(sandbox, snapshot)
+            yield sandbox
+        finally:
+            self._free.put(sandbox)
+
+    def paths(self) -> List[Path]:
+        return sorted(self.root.glob("wt-*")) if self.root.exists() else []
+
+    def close(self, remove: bool = False) -> None:
+        """Forget handed-out sandboxes; with ``remove`` also delete the worktrees."""
+
+        if remove:
+            for path in self.paths():
+                _git(["worktree", "remove", "--force", str(path)], self.repo_root, check=False)
+                shutil.rmtree(path, ignore_errors=True)
+            _git(["worktree", "prune"], self.repo_root, check=False)
+        self._free = queue.Queue()
+        self._slots = set()
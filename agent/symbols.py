@@ -0,0 +1,299 @@
+"""Persisted AST symbol index used to put exact definitions into prompts."""
+from __future__ import annotations
+
+import ast
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from .analyzers.cache import DEFAULT_IGNORED_PREFIXES, build_manifest
+from .gitwriter import blob_oid
+
+_INDEX_VERSION = 1
+
+# Names worth resolving from test and linter output.
+_TB_FUNCTION_RE = re.compile(r'File "[^"]+", line \d+, in (?P<name>[A-Za-z_]\w*)')
+_QUOTED_NAME_RE = re.compile(
+    r"(?:name|attribute|function|class) [`'\"](?P<name>[A-Za-z_][\w.]*)[`'\"]"
+)
+_CALL_RE = re.compile(r"(?P<name>[A-Za-z_][\w.]*)\(")
+_SOURCE_LINE_RE = re.compile(r"^>\s+(?P<code>.+)$|^E\s+(?P<err>.+)$", re.MULTILINE)
+_SKIP_NAMES = {
+    "assert", "print", "len", "str", "int", "dict", "list", "set", "tuple", "isinstance", "module",
+}
+
+
+@dataclass
+class Symbol:
+    name: str
+    qualname: str
+    kind: str  # "function", "class" or "method"
+    path: str
+    start: int
+    end: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _walk(tree: ast.AST, path: str) -> List[Symbol]:
+    symbols: List[Symbol] = []
+
+    def visit(node: ast.AST, prefix: str, in_class: bool) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{prefix}{child.name}"
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                end = getattr(child, "end_lineno", None) or child.lineno
+                symbols.append(Symbol(child.name, qualname, kind, path, start, end))
+                visit(child, qualname + ".", isinstance(child, ast.ClassDef))
+
+    visit(tree, "", False)
+    return symbols
+
+
+def _imports(tree: ast.AST) -> List[str]:
+    names: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = "." * node.level + (node.module or "")
+            names.extend(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+    return sorted(set(names))
+
+
+def parse_file(source: str, path: str) -> Optional[Dict[str, Any]]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    return {
+        "symbols": [s.to_dict() for s in _walk(tree, path)],
+        "imports": _imports(tree),
+    }
+
+
+def names_in_output(text: str, limit: int = 20) -> List[str]:
+    """Function, class and attribute names mentioned by tracebacks and linters."""
+
+    found: List[str] = []
+    seen: Set[str] = set()
+
+    def add(name: str) -> None:
+        tail = name.rsplit(".", 1)[-1]
+        if tail in seen or tail in _SKIP_NAMES or tail.startswith("test_") or len(found) >= limit:
+            return
+        seen.add(tail)
+        found.append(name)
+
+    for match in _TB_FUNCTION_RE.finditer(text):
+        add(match.group("name"))
+    for match in _QUOTED_NAME_RE.finditer(text):
+        add(match.group("name"))
+    code_lines = [m.group("code") or m.group("err") or "" for m in _SOURCE_LINE_RE.finditer(text)]
+    lines = text.splitlines()
+    # In plain Python tracebacks the offending source follows each ``File ...`` line.
+    code_lines.extend(nxt for cur, nxt in zip(lines, lines[1:]) if _TB_FUNCTION_RE.search(cur))
+    for code in code_lines:
+        for call in _CALL_RE.finditer(code):
+            add(call.group("name"))
+    return found
+
+
+class SymbolIndex:
+    """Functions, classes and imports per Python file, keyed by git blob hash.
+
+    ``sync`` compares blob hashes from the git manifest and re-parses only
+    files whose content changed; ``refresh`` does the same for a handful of
+    paths reported by the file watcher without asking git at all.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.parsed = 0
+        self._by_name: Optional[Dict[str, List[Symbol]]] = None
+        self.load()
+
+    @property
+    def built(self) -> bool:
+        return bool(self.files)
+
+    def load(self) -> None:
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        if isinstance(payload, dict) and payload.get("version") == _INDEX_VERSION:
+            self.files = payload.get("files") or {}
+            self._by_name = None
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        payload = {"version": _INDEX_VERSION, "files": self.files}
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _update(self, repo_root: Path, rel: str, oid: Optional[str]) -> None:
+        if oid is None:
+            if self.files.pop(rel, None) is not None:
+                self._by_name = None
+            return
+        if self.files.get(rel, {}).get("oid") == oid:
+            return
+        try:
+            source = (Path(repo_root) / rel).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            self.files.pop(rel, None)
+            self._by_name = None
+            return
+        entry = parse_file(source, rel) or {"symbols": [], "imports": [], "error": "syntax"}
+        entry["oid"] = oid
+        self.files[rel] = entry
+        self.parsed += 1
+        self._by_name = None
+
+    def sync(self, repo_root: Path) -> bool:
+        """Bring the whole index up to date from git blob hashes."""
+
+        manifest = build_manifest(str(repo_root))
+        if manifest is None:
+            return False
+        python = {p: oid for p, oid in manifest.items() if p.endswith(".py") and oid != "deleted"}
+        for rel in list(self.files):
+            if rel not in python:
+                self._update(repo_root, rel, None)
+        for rel, oid in python.items():
+            self._update(repo_root, rel, oid)
+        return True
+
+    def refresh(self, repo_root: Path, paths: Iterable[Path]) -> None:
+        """Re-index only ``paths`` (e.g. FastPathMonitor events).
+
+        Deleted files, and files under a deleted directory, leave the index.
+        """
+
+        root = Path(repo_root).resolve()
+        for path in paths:
+            target = Path(path) if Path(path).is_absolute() else root / path
+            try:
+                rel = target.resolve().relative_to(root).as_posix()
+            except (OSError, ValueError):
+                continue
+            if any(rel.startswith(p) for p in DEFAULT_IGNORED_PREFIXES):
+                continue
+            if not rel.endswith(".py"):
+                if not target.exists():  # a removed or renamed-away directory
+                    for gone in [p for p in self.files if p.startswith(rel + "/")]:
+                        self._update(root, gone, None)
+                continue
+            try:
+                data = target.read_bytes()
+            except OSError:
+                self._update(root, rel, None)
+                continue
+            self._update(root, rel, blob_oid(data))
+
+    def _index(self) -> Dict[str, List[Symbol]]:
+        if self._by_name is None:
+            by_name: Dict[str, List[Symbol]] = {}
+            for entry in self.files.values():
+                for raw in entry.get("symbols", []):
+                    symbol = Symbol(**raw)
+                    by_name.setdefault(symbol.name, []).append(symbol)
+                    if symbol.qualname != symbol.name:
+                        by_name.setdefault(symbol.qualname, []).append(symbol)
+            self._by_name = by_name
+        return self._by_name
+
+    def lookup(self, name: str) -> List[Symbol]:
+        """Definitions for ``name`` (plain, qualified like ``Cls.meth``, or dotted module path)."""
+
+        index = self._index()
+        if name in index:
+            return list(index[name])
+        return list(index.get(name.rsplit(".", 1)[-1], []))
+
+    def enclosing(self, path: str, line: int) -> Optional[Symbol]:
+        """Innermost definition in ``path`` that contains ``line``."""
+
+        best: Optional[Symbol] = None
+        for raw in self.files.get(path, {}).get("symbols", []):
+            if raw["start"] <= line <= raw["end"]:
+                if best is None or raw["start"] >= best.start:
+                    best = Symbol(**raw)
+        return best
+
+    def imports(self, path: str) -> List[str]:
+        return list(self.files.get(path, {}).get("imports", []))
+
+
+def definition_source(
+    repo_root: Path, symbol: Symbol, max_lines: int = 80, focus: Optional[int] = None
+) -> str:
+    """Numbered source of ``symbol``, at most ``max_lines`` long.
+
+    Long definitions are cut to a window centred on ``focus`` (e.g. the
+    line a traceback points at), or to their first lines without one.
+    """
+
+    try:
+        text = (Path(repo_root) / symbol.path).read_text(encoding="utf-8", errors="replace")
+        lines = text.splitlines()
+    except OSError:
+        return ""
+    last = min(symbol.end, len(lines))
+    start = symbol.start
+    if focus is not None and symbol.start <= focus <= last:
+        start = max(symbol.start, min(focus - max_lines // 2, last - max_lines + 1))
+    end = min(last, start + max_lines - 1)
+    body = "\n".join(f"{n:>5} {lines[n - 1]}" for n in range(start, end + 1))
+    before = f"      ... [{start - symbol.start} lines above]\n" if start > symbol.start else ""
+    more = f"\n      ... [{symbol.end - end} more lines]" if symbol.end > end else ""
+    header = f"# {symbol.path}:{symbol.start}-{symbol.end} {symbol.kind} {symbol.qualname}"
+    return f"{header}\n{before}{body}{more}"
+
+
+def definitions_for_output(
+    index: SymbolIndex,
+    repo_root: Path,
+    text: str,
+    locations: Sequence = (),
+    limit: int = 8,
+) -> List[str]:
+    """Source of definitions enclosing ``locations`` and named in ``text``."""
+
+    chosen: List[Symbol] = []
+    keys: Set[tuple] = set()
+    focus: Dict[tuple, int] = {}
+
+    def take(symbol: Optional[Symbol], line: Optional[int] = None) -> None:
+        if symbol is None or len(chosen) >= limit:
+            return
+        key = (symbol.path, symbol.start)
+        if key not in keys:
+            keys.add(key)
+            chosen.append(symbol)
+            if line is not None:
+                focus[key] = line
+
+    for path, line in locations:
+        take(index.enclosing(path, line), line)
+    for name in names_in_output(text):
+        matches = index.lookup(name)
+        if len(matches) <= 3:  # ambiguous names (``run``, ``__init__``) only add noise
+            for symbol in matches:
+                take(symbol)
+    sources = (
+        definition_source(repo_root, sym, focus=focus.get((sym.path, sym.start))) for sym in chosen
+    )
+    return [s for s in sources if s]
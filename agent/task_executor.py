@@ -479,16 +479,16 @@ class TaskExecutor:
 
     def _check_conflicts(self) -> tuple[bool, str]:
         """Check for merge conflicts."""
-        from .utils import run_cmd
-        code, output = run_cmd("git diff --check", timeout=10)
+        from .gitquery import GitQuery
+        code, output = GitQuery.for_repo(Path.cwd()).diff_check()
         if code == 0:
             return True, "No merge conflicts"
         return False, "Merge conflicts detected"
 
     def _check_git_clean(self) -> tuple[bool, str]:
         """Check git status."""
-        from .utils import run_cmd
-        code, output = run_cmd("git status --porcelain", timeout=10)
+        from .gitquery import GitQuery
+        output = GitQuery.for_repo(Path.cwd()).status_porcelain()
         if not output.strip():
             return True, "Working directory clean"
         return False, "Uncommitted changes present"
@@ -172,6 +172,10 @@ class ThinkingLogger:
             "next_action": next_action,
         })
 
+    def stream(self, source: str, min_chars: int = 400, interval: float = 1.0) -> "StreamLog":
+        """Return a callback that appends streamed model output in batches."""
+        return StreamLog(self, source, min_chars, interval)
+
     def log_event(self, event_type: str, data: Dict[str, Any]) -> None:
         """Log a generic event.
 
@@ -244,3 +248,37 @@ class ThinkingLogger:
         """Clear thinking history."""
         if self.thinking_file.exists():
             self.thinking_file.unlink()
+
+
+class StreamLog:
+    """Buffers streamed tokens and logs them as ``model_stream`` events.
+
+    Tokens arrive far faster than the dashboards poll, so text is flushed
+    once ``min_chars`` accumulate or ``interval`` seconds pass.
+    """
+
+    def __init__(
+        self, logger: ThinkingLogger, source: str, min_chars: int = 400, interval: float = 1.0
+    ):
+        self.logger = logger
+        self.source = source
+        self.min_chars = min_chars
+        self.interval = interval
+        self._buffer: list = []
+        self._size = 0
+        self._last = time.time()
+
+    def __call__(self, text: str) -> None:
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.min_chars or time.time() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.logger.log_event(
+                "model_stream", {"source": self.source, "text": "".join(self._buffer)}
+            )
+        self._buffer = []
+        self._size = 0
+        self._last = time.time()
@@ -0,0 +1,258 @@
+"""Token counting and accounting of what providers report they used."""
+from __future__ import annotations
+
+import functools
+import json
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .utils import path_lock, write_text_atomic
+
+try:  # pragma: no cover - optional dep
+    import tiktoken
+except Exception:  # pragma: no cover - optional dep
+    tiktoken = None  # type: ignore
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Pieces a BPE vocabulary rarely merges across: letter runs, up to three
+# digits, single punctuation marks and whitespace runs.
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|\s+|[^\sA-Za-z\d]")
+_LETTERS_PER_TOKEN = 5
+
+
+@functools.lru_cache(maxsize=4)
+def _encoding(name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:  # pragma: no cover - encoding files not cached offline
+        return None
+
+
+def heuristic_tokens(text: str) -> int:
+    """Tokenizer-shaped estimate used when no BPE vocabulary is installed.
+
+    Long identifiers split into several tokens, each punctuation mark and
+    digit group costs one, and a single space folds into the next word.
+    """
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            count += (len(piece) + _LETTERS_PER_TOKEN - 1) // _LETTERS_PER_TOKEN
+        elif first.isspace():
+            count += 0 if piece == " " else 1
+        else:
+            count += 1
+    return count
+
+
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    """Tokens in ``text``: exact with ``tiktoken``, otherwise ``heuristic_tokens``."""
+    if not text:
+        return 0
+    enc = _encoding(encoding)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return heuristic_tokens(text)
+
+
+def tokenizer_name(encoding: str = DEFAULT_ENCODING) -> str:
+    return f"tiktoken:{encoding}" if _encoding(encoding) is not None else "heuristic"
+
+
+@dataclass
+class Usage:
+    """Tokens and latency for one generation.
+
+    ``prefill_ms`` is prompt evaluation and ``decode_ms`` output generation;
+    hosted APIs report neither, so only ``total_ms`` (wall time) is known
+    there. ``source`` is ``provider`` when the counts came from the response
+    and ``cache`` for a replayed response, which has no timing at all.
+    """
+
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    prefill_ms: Optional[int] = None
+    decode_ms: Optional[int] = None
+    load_ms: Optional[int] = None
+    total_ms: Optional[int] = None
+    source: str = "estimate"
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        elapsed = self.decode_ms or self.total_ms
+        if not self.completion_tokens or not elapsed:
+            return None
+        return round(self.completion_tokens * 1000 / elapsed, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["tokens_per_second"] = self.tokens_per_second
+        return data
+
+
+def _int(value: Any) -> Optional[int]:
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def usage_from_response(payload: Dict[str, Any]) -> Optional[Usage]:
+    """Provider-reported usage from an OpenAI, Anthropic, Gemini or Ollama response."""
+    if not isinstance(payload, dict):
+        return None
+    usage = payload.get("usage")
+    if isinstance(usage, dict):
+        if "input_tokens" in usage:  # Anthropic
+            return Usage(
+                _int(usage.get("input_tokens")), _int(usage.get("output_tokens")), source="provider"
+            )
+        if "prompt_tokens" in usage:  # OpenAI-compatible
+            return Usage(
+                _int(usage.get("prompt_tokens")),
+                _int(usage.get("completion_tokens")),
+                source="provider",
+            )
+    meta = payload.get("usageMetadata")
+    if isinstance(meta, dict):  # Gemini
+        return Usage(
+            _int(meta.get("promptTokenCount")),
+            _int(meta.get("candidatesTokenCount")),
+            source="provider",
+        )
+    if "prompt_eval_count" in payload or "eval_count" in payload:  # Ollama, durations in ns
+
+        def ms(key: str) -> Optional[int]:
+            value = _int(payload.get(key))
+            return value // 1_000_000 if value is not None else None
+
+        return Usage(
+            _int(payload.get("prompt_eval_count")),
+            _int(payload.get("eval_count")),
+            prefill_ms=ms("prompt_eval_duration"),
+            decode_ms=ms("eval_duration"),
+            load_ms=ms("load_duration"),
+            total_ms=ms("total_duration"),
+            source="provider",
+        )
+    return None
+
+
+def usage_from_stats(stats: Dict[str, Any]) -> Optional[Usage]:
+    """Usage from a cycle's ``provider_stats.json`` (Ollama or hosted API layout)."""
+    if not isinstance(stats, dict):
+        return None
+    prompt = _int(stats.get("prompt_eval_count", stats.get("prompt_tokens")))
+    completion = _int(stats.get("eval_count", stats.get("completion_tokens")))
+    if prompt is None and completion is None:
+        return None
+    return Usage(
+        prompt,
+        completion,
+        prefill_ms=_int(stats.get("prompt_eval_ms")),
+        decode_ms=_int(stats.get("eval_ms")),
+        load_ms=_int(stats.get("load_ms")),
+        total_ms=_int(stats.get("total_ms")),
+        source="provider",
+    )
+
+
+_TOTAL_FIELDS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "prefill_ms",
+    "decode_ms",
+    "total_ms",
+    "estimated_prompt_tokens",
+)
+
+
+class UsageLedger:
+    """Running token and latency totals per model and per task, kept in ``path``.
+
+    ``record`` flags a generation as slow when its decode speed falls below
+    ``slow_ratio`` of the model's average over at least ``min_samples``
+    earlier generations.
+    """
+
+    def __init__(self, path: Path, slow_ratio: float = 0.5, min_samples: int = 3) -> None:
+        self.path = Path(path)
+        self.slow_ratio = float(slow_ratio)
+        self.min_samples = int(min_samples)
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+        self.models: Dict[str, Dict[str, Any]] = payload.get("models") or {}
+        self.tasks: Dict[str, Dict[str, Any]] = payload.get("tasks") or {}
+
+    @staticmethod
+    def tokens_per_second(entry: Dict[str, Any]) -> Optional[float]:
+        timed = entry.get("timed_completion_tokens", 0)
+        elapsed = entry.get("timed_ms", 0)
+        return round(timed * 1000 / elapsed, 2) if timed and elapsed else None
+
+    def _add(self, entry: Dict[str, Any], usage: Usage, estimate: Optional[int]) -> None:
+        entry["calls"] = entry.get("calls", 0) + 1
+        if usage.source == "provider":
+            entry["reported_calls"] = entry.get("reported_calls", 0) + 1
+        elif usage.source == "cache":
+            entry["cached_calls"] = entry.get("cached_calls", 0) + 1
+        values = {**asdict(usage), "estimated_prompt_tokens": estimate}
+        for key in _TOTAL_FIELDS:
+            if values.get(key) is not None:
+                entry[key] = entry.get(key, 0) + values[key]
+        elapsed = usage.decode_ms or usage.total_ms
+        if usage.completion_tokens and elapsed:
+            entry["timed_completion_tokens"] = (
+                entry.get("timed_completion_tokens", 0) + usage.completion_tokens
+            )
+            entry["timed_ms"] = entry.get("timed_ms", 0) + elapsed
+            entry["timed_calls"] = entry.get("timed_calls", 0) + 1
+
+    def record(
+        self,
+        model: Optional[str],
+        task: Optional[str],
+        usage: Usage,
+        estimate: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Add one generation; returns its figures plus the model's baseline speed."""
+        with path_lock(str(self.path)):  # best-of candidates record from worker threads
+            entry = self.models.setdefault(model or "unknown", {})
+            baseline = None
+            if entry.get("timed_calls", 0) >= self.min_samples:
+                baseline = self.tokens_per_second(entry)
+            speed = usage.tokens_per_second
+            self._add(entry, usage, estimate)
+            self._add(self.tasks.setdefault(task or "(no task)", {}), usage, estimate)
+            self._write()
+        return {
+            **usage.to_dict(),
+            "estimated_prompt_tokens": estimate,
+            "baseline_tokens_per_second": baseline,
+            "slow": bool(baseline and speed is not None and speed < baseline * self.slow_ratio),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        def view(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+            return {
+                name: {**e, "tokens_per_second": self.tokens_per_second(e)}
+                for name, e in entries.items()
+            }
+
+        return {"models": view(self.models), "tasks": view(self.tasks)}
+
+    def save(self) -> None:
+        with path_lock(str(self.path)):
+            self._write()
+
+    def _write(self) -> None:
+        # Atomic: an interrupted write must not leave a file that loads as empty.
+        payload = {"models": self.models, "tasks": self.tasks}
+        write_text_atomic(str(self.path), json.dumps(payload, indent=2, sort_keys=True))
@@ -1,9 +1,10 @@
 import os
 import shutil
 import subprocess
+import threading
 import time
 from glob import glob
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
 
 
 def now_ts() -> str:
@@ -37,6 +38,27 @@ def write_text(path: str, content: str) -> None:
         f.write(content)
 
 
+_PATH_LOCKS: Dict[str, threading.Lock] = {}
+_PATH_LOCKS_GUARD = threading.Lock()
+
+
+def path_lock(path: str) -> threading.Lock:
+    """Process-wide lock for read-modify-write updates of one state file."""
+    key = os.path.abspath(str(path))
+    with _PATH_LOCKS_GUARD:
+        return _PATH_LOCKS.setdefault(key, threading.Lock())
+
+
+def write_text_atomic(path: str, content: str) -> None:
+    """Write via a temp file and ``os.replace`` so readers never see a partial file."""
+    path = str(path)
+    ensure_dir(os.path.dirname(path))
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
 def read_text(path: str) -> Optional[str]:
     if not os.path.exists(path):
         return None
@@ -182,7 +182,8 @@ class ModelDownloader:
             return False, "Ollama is not installed"
         if not model:
             return False, "No model specified for Ollama provider"
-        if not ModelDownloader.check_model_exists(model):
+        base_url = provider.get("base_url") or "http://localhost:11434"
+        if not ModelDownloader.check_model_exists(model, base_url):
             return False, f"Model '{model}' not present locally"
         return True, ""
 
@@ -282,8 +283,20 @@ class ModelDownloader:
             return False
 
     @staticmethod
-    def check_model_exists(model_name: str) -> bool:
-        """Check if model is already downloaded."""
+    def check_model_exists(model_name: str, base_url: str = "http://localhost:11434") -> bool:
+        """Check if model is already downloaded.
+
+        Asks the Ollama server (``/api/tags``, cached briefly) and only runs
+        ``ollama list`` when the server cannot be reached.
+        """
+        try:
+            from agent.providers.ollama import fetch_tags
+
+            tags = fetch_tags(base_url)
+        except Exception:
+            tags = None
+        if tags is not None:
+            return any(model_name in (m.get("name"), m.get("model")) for m in tags)
         try:
             result = subprocess.run(
                 ['ollama', 'list'],
@@ -313,6 +326,12 @@ class ModelDownloader:
                 capture_output=False,  # Show output to user
                 text=True
             )
+            try:
+                from agent.providers.ollama import invalidate_tags
+
+                invalidate_tags()
+            except Exception:
+                pass
 
             return result.returncode == 0
         except Exception as e:
@@ -719,7 +719,7 @@ Generate tasks now:"""
         """Call OpenAI API for task generation."""
         try:
             import os
-            import requests
+            from agent.providers import httpclient
 
             api_key = os.getenv("OPENAI_API_KEY") or ModelDownloader.get_stored_api_key("openai")
             if not api_key:
@@ -738,7 +738,7 @@ Generate tasks now:"""
                 "max_tokens": 1000
             }
 
-            response = requests.post(
+            response = httpclient.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=headers,
                 json=data,
@@ -761,7 +761,7 @@ Generate tasks now:"""
         """Call Anthropic API for task generation."""
         try:
             import os
-            import requests
+            from agent.providers import httpclient
 
             api_key = os.getenv("ANTHROPIC_API_KEY") or ModelDownloader.get_stored_api_key("anthropic")
             if not api_key:
@@ -780,7 +780,7 @@ Generate tasks now:"""
                 "max_tokens": 1000
             }
 
-            response = requests.post(
+            response = httpclient.post(
                 "https://api.anthropic.com/v1/messages",
                 headers=headers,
                 json=data,
@@ -803,7 +803,7 @@ Generate tasks now:"""
         """Call Google Gemini API for task generation."""
         try:
             import os
-            import requests
+            from agent.providers import httpclient
 
             api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY") or ModelDownloader.get_stored_api_key("gemini")
             if not api_key:
@@ -818,7 +818,7 @@ Generate tasks now:"""
                 }]
             }
 
-            response = requests.post(url, json=data, timeout=30)
+            response = httpclient.post(url, json=data, timeout=30)
 
             if response.status_code == 200:
                 result = response.json()
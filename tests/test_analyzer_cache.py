@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import subprocess
+from typing import List
+
+import pytest
+
+from agent.analyzers.base import Analyzer, CommandResult
+from agent.analyzers.cache import AnalyzerCache
+
+
+class CountingAnalyzer(Analyzer):
+    name = "counting"
+    cache_patterns = ("*.py",)
+
+    def __init__(self) -> None:
+        super().__init__({"flag": True})
+        self.calls = 0
+
+    def execute(self, repo_root: str, cycle_dir: str, targets: List[str]) -> CommandResult:
+        self.calls += 1
+        return CommandResult(command=["count"], code=0, output="ok", elapsed=0.0)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    (root / "mod.py").write_text("x = 1\n", encoding="utf-8")
+    (root / "README.md").write_text("readme\n", encoding="utf-8")
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    return root
+
+
+def _analyze(analyzer, repo, tmp_path, cache_root):
+    analyzer.cache = AnalyzerCache(cache_root)
+    return analyzer.analyze(str(repo), str(tmp_path / "cycle"))
+
+
+def test_unchanged_tree_hits_cache(repo, tmp_path):
+    analyzer = CountingAnalyzer()
+    cache_root = tmp_path / "cache"
+
+    first = _analyze(analyzer, repo, tmp_path, cache_root)
+    second = _analyze(analyzer, repo, tmp_path, cache_root)
+
+    assert analyzer.calls == 1
+    assert not first.cached
+    assert second.cached
+    assert second.status == first.status
+    assert second.command.output == "ok"
+
+
+def test_relevant_change_misses_cache(repo, tmp_path):
+    analyzer = CountingAnalyzer()
+    cache_root = tmp_path / "cache"
+    _analyze(analyzer, repo, tmp_path, cache_root)
+
+    (repo / "README.md").write_text("changed\n", encoding="utf-8")
+    _analyze(analyzer, repo, tmp_path, cache_root)
+    assert analyzer.calls == 1
+
+    (repo / "mod.py").write_text("x = 2\n", encoding="utf-8")
+    _analyze(analyzer, repo, tmp_path, cache_root)
+    assert analyzer.calls == 2
+
+
+def test_settings_are_part_of_the_key(repo, tmp_path):
+    analyzer = CountingAnalyzer()
+    cache_root = tmp_path / "cache"
+    _analyze(analyzer, repo, tmp_path, cache_root)
+
+    analyzer.settings["flag"] = False
+    _analyze(analyzer, repo, tmp_path, cache_root)
+
+    assert analyzer.calls == 2
+
+
+def test_non_git_directory_disables_cache(tmp_path):
+    plain = tmp_path / "plain"
+    plain.mkdir()
+    analyzer = CountingAnalyzer()
+    _analyze(analyzer, plain, tmp_path, tmp_path / "cache")
+    _analyze(analyzer, plain, tmp_path, tmp_path / "cache")
+
+    assert analyzer.calls == 2
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent.providers import ProviderError, run_sync
+from agent.providers.api import HostedAPIProvider
+from agent.providers.command import CommandProvider
+from agent.providers.manual import ManualProvider
+from agent.providers.ollama import OllamaProvider
+
+
+class _Keys:
+    def get(self, key_id):
+        return "secret"
+
+
+@pytest.fixture
+def slow_server():
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(0.3)
+            if self.path == "/api/generate":
+                body = {"response": f"seed {payload['options'].get('seed')}", "done": True}
+            else:
+                body = {"output": payload["prompt"].upper()}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_default_agenerate_runs_generate_patch_in_a_thread(tmp_path):
+    class Echo(ManualProvider):
+        def generate_patch(self, prompt, cycle_dir):
+            return f"{threading.current_thread() is threading.main_thread()}:{prompt}"
+
+    assert run_sync(Echo().agenerate("hi", str(tmp_path))) == "False:hi"
+
+
+def test_run_sync_refuses_to_nest_event_loops():
+    async def outer():
+        with pytest.raises(ProviderError):
+            run_sync(asyncio.sleep(0))
+
+    asyncio.run(outer())
+
+
+def test_ollama_requests_run_concurrently_on_one_loop(tmp_path, slow_server):
+    pytest.importorskip("httpx")
+    provider = OllamaProvider({"model": "m", "base_url": slow_server, "stream": False})
+    provider.has_cli = False
+
+    async def sample():
+        return await asyncio.gather(*(
+            provider.variant(seed=i).agenerate("p", str(tmp_path / f"c{i}")) for i in range(4)
+        ))
+
+    started = time.time()
+    outputs = run_sync(sample())
+
+    assert outputs == ["seed 0", "seed 1", "seed 2", "seed 3"]
+    assert time.time() - started < 1.0
+    assert (tmp_path / "c2" / "provider_output.txt").read_text() == "seed 2"
+
+
+def test_ollama_api_failure_falls_back_to_cli_without_printing(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("httpx")
+    monkeypatch.setattr(
+        CommandProvider, "generate_patch", lambda self, prompt, cycle_dir: "from cli"
+    )
+    provider = OllamaProvider({"model": "m", "base_url": "http://127.0.0.1:9", "stream": False})
+    provider.has_cli = True
+
+    assert run_sync(provider.agenerate("p", str(tmp_path))) == "from cli"
+    assert capsys.readouterr().out == ""
+    assert json.loads((tmp_path / "provider_fallback.json").read_text())["fallback"] == "cli"
+
+
+def test_hosted_request_can_be_cancelled_in_flight(tmp_path, slow_server):
+    pytest.importorskip("httpx")
+    provider = HostedAPIProvider({"backend": "other", "url": f"{slow_server}/v1"}, keystore=_Keys())
+
+    async def cancel_one():
+        done = await provider.agenerate("ok", str(tmp_path))
+        task = asyncio.ensure_future(provider.agenerate("late", str(tmp_path)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return done
+
+    assert run_sync(cancel_one()) == "OK"
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+import agent.run as run_module
+from agent.analyzers.base import AnalyzerResult, Finding
+from agent.candidates import generate_candidates, sampling_overrides
+from agent.providers.command import CommandProvider
+from agent.run import AgentLoop, GateReport
+
+# Seeds 0 and 1 propose the same change, 2 and 3 two different ones.
+PROVIDER_SCRIPT = r'''
+import os, sys
+sys.stdin.read()
+seed = int(os.environ.get("AGENT_SEED", "0"))
+body = {0: "bad", 1: "bad", 2: "good", 3: "good enough"}[seed]
+print("```diff")
+print("diff --git a/answer.txt b/answer.txt")
+print("new file mode 100644")
+print("--- /dev/null")
+print("+++ b/answer.txt")
+print("@@ -0,0 +1 @@")
+print(f"+{body}")
+print("```")
+'''
+
+
+def _provider(tmp_path):
+    script = tmp_path / "provider.py"
+    script.write_text(PROVIDER_SCRIPT, encoding="utf-8")
+    return CommandProvider({"args": [sys.executable, str(script)]}), script
+
+
+def test_sampling_overrides_cycle_temperatures_and_offset_seeds():
+    overrides = sampling_overrides({"temperatures": [0.1, 0.9], "seed": 7}, 3)
+
+    assert overrides == [
+        {"temperature": 0.1, "seed": 7},
+        {"temperature": 0.9, "seed": 8},
+        {"temperature": 0.1, "seed": 9},
+    ]
+
+
+def test_identical_diffs_are_deduplicated(tmp_path):
+    provider, _ = _provider(tmp_path)
+    overrides = sampling_overrides({"seed": 0}, 3)
+    candidates = generate_candidates(provider, "prompt", tmp_path, overrides)
+
+    assert [c.duplicate_of for c in candidates] == [None, 0, None]
+    assert [c.verifiable for c in candidates] == [True, False, True]
+    assert provider.config.get("seed") is None
+
+
+def test_loop_keeps_passing_candidate_with_fewest_findings(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    _, script = _provider(tmp_path)
+    cfg = {
+        "provider": {"type": "command", "command": {"args": [sys.executable, str(script)]}},
+        "loop": {
+            "max_cycles": 1,
+            "cooldown_seconds": 0,
+            "fast_path_on_fs_change": False,
+            "best_of": {"n": 4, "seed": 0},
+        },
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    (repo / "agent").mkdir()
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+
+    def fake_gate(repo_root, cfg, cycle_dir, proposed_files=None, state_root=None, fail_fast=None):
+        body = (repo_root / "answer.txt").read_text().strip()
+        count = {"bad": 0, "good": 1, "good enough": 3}[body]
+        findings = [Finding(id=f"W{i}", message="nit", severity="LOW") for i in range(count)]
+        result = AnalyzerResult("lint", "ok", body, findings, [], {}, {})
+        allow = body != "bad"
+        return GateReport(allow=allow, rationale=[] if allow else ["bad"], results={"lint": result})
+
+    monkeypatch.setattr(run_module, "run_production_gate", fake_gate)
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    try:
+        loop.run()
+    finally:
+        loop.sandboxes.close(remove=True)
+
+    assert (repo / "answer.txt").read_text() == "good\n"
+    meta = json.loads(next((repo / "agent" / "artifacts").glob("*/cycle.meta.json")).read_text())
+    scores = {
+        c["index"]: (c["allow"], c["findings"], c["duplicate_of"]) for c in meta["candidates"]
+    }
+    assert scores == {
+        0: (False, 0, None),
+        1: (None, None, 0),
+        2: (True, 1, None),
+        3: (True, 3, None),
+    }
+    assert meta["applied"] is True
+
+
+def test_loop_reports_the_closest_miss_with_its_own_patch(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    script = tmp_path / "provider.py"
+    script.write_text(
+        "import os, sys\nsys.stdin.read()\n"
+        "name = 'ab'[int(os.environ.get('AGENT_SEED', '0'))] + '.txt'\n"
+        "print(f'```diff\\ndiff --git a/{name} b/{name}\\nnew file mode 100644\\n"
+        "--- /dev/null\\n+++ b/{name}\\n@@ -0,0 +1 @@\\n+x\\n```')\n",
+        encoding="utf-8",
+    )
+    cfg = {
+        "provider": {"type": "command", "command": {"args": [sys.executable, str(script)]}},
+        "loop": {
+            "max_cycles": 1,
+            "cooldown_seconds": 0,
+            "fast_path_on_fs_change": False,
+            "best_of": {"n": 2, "seed": 0},
+        },
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    (repo / "agent").mkdir()
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+
+    def fake_gate(repo_root, cfg, cycle_dir, proposed_files=None, state_root=None, fail_fast=None):
+        count = 3 if (repo_root / "a.txt").exists() else 1
+        findings = [Finding(id=f"W{i}", message="nit", severity="LOW") for i in range(count)]
+        result = AnalyzerResult("lint", "fail", ",".join(proposed_files), findings, [], {}, {})
+        return GateReport(allow=False, rationale=["blocked"], results={"lint": result})
+
+    monkeypatch.setattr(run_module, "run_production_gate", fake_gate)
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    try:
+        loop.run()
+    finally:
+        loop.sandboxes.close(remove=True)
+
+    meta = json.loads(next((repo / "agent" / "artifacts").glob("*/cycle.meta.json")).read_text())
+    assert meta["applied"] is False
+    assert meta["proposed_files"] == ["b.txt"]
+    assert meta["gate"]["results"]["lint"]["summary"] == "b.txt"
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+import subprocess
+
+import pytest
+
+from agent.gitwriter import conversion_blockers, fast_import_commit, patch_shortstat, read_ref
+from agent.run import commit_with_temp_index
+
+
+def _git(repo, *args):
+    proc = subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True)
+    return proc.stdout
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for key, value in {
+        "GIT_AUTHOR_NAME": "t",
+        "GIT_AUTHOR_EMAIL": "t@example.com",
+        "GIT_COMMITTER_NAME": "t",
+        "GIT_COMMITTER_EMAIL": "t@example.com",
+    }.items():
+        monkeypatch.setenv(key, value)
+    root = tmp_path / "repo"
+    root.mkdir()
+    _git(root, "init", "-q")
+    (root / "keep.txt").write_text("keep\n")
+    (root / "edit.txt").write_text("old\n")
+    (root / "gone.txt").write_text("bye\n")
+    (root / ".gitignore").write_text("*.log\n")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "init")
+    # Working tree: one edit, one deletion, one new file, one unrelated change.
+    (root / "edit.txt").write_text("new\n")
+    (root / "gone.txt").unlink()
+    (root / "dir with space").mkdir()
+    (root / "dir with space" / "new.sh").write_text("#!/bin/sh\n")
+    os.chmod(root / "dir with space" / "new.sh", 0o755)
+    (root / "keep.txt").write_text("unrelated\n")
+    (root / "debug.log").write_text("noise\n")
+    return root
+
+
+PROPOSED = ["edit.txt", "gone.txt", "dir with space/new.sh", "debug.log"]
+
+
+@pytest.mark.parametrize("backend", ["fast-import", "plumbing"])
+def test_backends_commit_only_proposed_files(repo, tmp_path, backend):
+    head = read_ref(repo)
+    assert head == _git(repo, "rev-parse", "HEAD").strip()
+
+    ok, meta = commit_with_temp_index(
+        repo, None, "agent edits: test", PROPOSED, tmp_path, backend=backend
+    )
+
+    assert ok, meta
+    assert meta["backend"] == backend
+    assert sorted(meta["staged"]) == ["dir with space/new.sh", "edit.txt", "gone.txt"]
+    assert _git(repo, "rev-parse", "HEAD~1").strip() == head
+    assert _git(repo, "log", "-1", "--format=%s").strip() == "agent edits: test"
+    files = _git(repo, "ls-tree", "-r", "HEAD").splitlines()
+    assert any(
+        line.startswith("100755") and line.endswith("dir with space/new.sh") for line in files
+    )
+    assert not any(line.endswith("gone.txt") or line.endswith("debug.log") for line in files)
+    assert _git(repo, "show", "HEAD:edit.txt") == "new\n"
+    assert _git(repo, "show", "HEAD:keep.txt") == "keep\n"
+    # The real index follows the commit; only the unrelated edit stays pending.
+    assert _git(repo, "status", "--porcelain").splitlines() == [" M keep.txt"]
+    assert "refs/agent/" not in _git(repo, "for-each-ref")
+
+
+def test_fast_import_refuses_directory_and_stale_head(repo, tmp_path):
+    ok, meta = commit_with_temp_index(repo, None, "m", ["dir with space"], tmp_path)
+    assert not ok and meta["error"] == "staged files outside proposed patch"
+
+    head = read_ref(repo)
+    (repo / "other.txt").write_text("x\n")
+    _git(repo, "add", "other.txt")
+    _git(repo, "commit", "-q", "-m", "moved")
+    ok, meta = fast_import_commit(repo, "HEAD", head, "m", ["edit.txt"])
+    assert not ok
+    assert meta["update-ref"]["code"] != 0
+    assert _git(repo, "log", "-1", "--format=%s").strip() == "moved"
+
+
+def test_patch_shortstat_matches_git_format():
+    patch = "\n".join([
+        "diff --git a/a.txt b/a.txt",
+        "--- a/a.txt",
+        "+++ b/a.txt",
+        "@@ -1,2 +1,2 @@",
+        "--- dashed line removed",
+        "+new",
+        " same",
+        "diff --git a/b.txt b/b.txt",
+        "new file mode 100644",
+        "--- /dev/null",
+        "+++ b/b.txt",
+        "@@ -0,0 +1 @@",
+        "+hello",
+    ])
+
+    assert patch_shortstat(patch) == "2 files changed, 2 insertions(+), 1 deletion(-)"
+    assert patch_shortstat("") == ""
+
+
+def test_conversion_settings_route_commits_through_the_index(repo, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "xdg"))
+    assert conversion_blockers(repo) == []
+
+    (repo / "dir with space" / ".gitattributes").write_text("*.sh text eol=lf\n")
+    _git(repo, "config", "core.fileMode", "false")
+    _git(repo, "config", "core.autocrlf", "input")
+    blockers = conversion_blockers(repo)
+    assert blockers == [
+        "core.autocrlf=input",
+        "core.fileMode=false",
+        "dir with space/.gitattributes",
+    ]
+
+    ok, meta = commit_with_temp_index(repo, None, "m", ["edit.txt"], tmp_path)
+    assert ok and meta["backend"] == "plumbing"
+    assert meta["fast_import_skipped"] == blockers
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+
+from agent.context import (
+    PRIORITY_FAILURES,
+    PRIORITY_LOGS,
+    ContextBuilder,
+    extract_failures,
+    prompt_budget,
+    referenced_locations,
+    retrieve_related,
+)
+from agent.lexical_index import Hit
+from agent.run import STATIC_PROMPT_PREFIX, CommitState, SessionState, compose_prompt
+from agent.symbols import SymbolIndex
+
+PYTEST_LOG = """\
+..F
+=================================== FAILURES ===================================
+_________________________________ test_total __________________________________
+    def test_total():
+>       assert total([1, 2]) == 4
+E       assert 3 == 4
+
+tests/test_calc.py:4: AssertionError
+=========================== short test summary info ============================
+FAILED tests/test_calc.py::test_total - assert 3 == 4
+1 failed, 2 passed in 0.02s
+"""
+
+
+def test_budget_fills_by_priority_and_records_drops():
+    builder = ContextBuilder(budget_tokens=60)
+    builder.add("logs", "x" * 400, PRIORITY_LOGS, truncate="none")
+    builder.add("failures", "boom", PRIORITY_FAILURES)
+
+    kept, meta = builder.build()
+
+    assert [s.name for s in kept] == ["failures"]
+    assert meta["dropped"] == [{"name": "logs", "tokens": 102, "priority": PRIORITY_LOGS}]
+
+
+def test_oversized_log_is_truncated_keeping_its_tail():
+    builder = ContextBuilder(budget_tokens=200)
+    builder.add("log", "\n".join(f"line {i}" for i in range(500)), PRIORITY_LOGS, truncate="tail")
+
+    kept, meta = builder.build()
+
+    assert meta["included"][0]["truncated"] is True
+    assert meta["used_tokens"] <= 200
+    assert kept[0].text.rstrip().endswith("line 499")
+    assert "line 0\n" not in kept[0].text
+
+
+def test_failures_and_locations_are_extracted(tmp_path):
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_calc.py").write_text(
+        "import calc\n\n\ndef test_total():\n    assert False\n"
+    )
+
+    failures = extract_failures(PYTEST_LOG)
+
+    assert failures.startswith("=" * 35 + " FAILURES")
+    assert "FAILED tests/test_calc.py::test_total" in failures
+    assert "1 failed, 2 passed" not in failures
+    assert referenced_locations(PYTEST_LOG, tmp_path) == [("tests/test_calc.py", 4)]
+
+
+def test_related_hits_are_fused_by_rank_across_retrievers():
+    class Retriever:
+        def __init__(self, *paths):
+            self.hits = [Hit(path, 1, 2, 1.0, "") for path in paths]
+
+        def search(self, query, k=5):
+            return self.hits[:k]
+
+    lexical = Retriever("a.py", "b.py")
+    semantic = Retriever("b.py", "c.py")
+
+    hits = retrieve_related([lexical, semantic], "query")
+    assert [hit.path for hit in hits] == ["b.py", "a.py", "c.py"]
+
+
+def test_prompt_budget_uses_model_window():
+    cfg = {
+        "prompt": {
+            "context_tokens": {"default": 4096, "big": 32768},
+            "reserve_output_tokens": 1000,
+        }
+    }
+
+    assert prompt_budget(cfg, "big") == 31768
+    assert prompt_budget(cfg, "other") == 3096
+    cfg["provider"] = {"num_ctx": 16384}
+    assert prompt_budget(cfg, "big") == 15384
+
+
+def test_compose_prompt_writes_context_metadata(tmp_path):
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_calc.py").write_text(
+        "def test_total():\n    assert total([1, 2]) == 4\n" * 3
+    )
+    cycle_dir = tmp_path / "cycle"
+    results = {
+        "test": {"enabled": True, "code": 1, "output": PYTEST_LOG},
+        "analyze": {"enabled": True, "code": 0, "output": "noise\n" * 5000},
+    }
+    session = SessionState(
+        enabled=False, default_duration=0, default_post_review_delay=0, max_duration=0
+    )
+    scheduler = CommitState(auto_commit=False, cadence_seconds=0)
+
+    prompt = compose_prompt(
+        tmp_path, cycle_dir, results, session, scheduler, None, budget_tokens=1500
+    )
+
+    meta = json.loads((cycle_dir / "prompt.meta.json").read_text())
+    names = [item["name"] for item in meta["included"]]
+    assert names[:2] == ["failures", "source:0"]
+    assert "[failures]" in prompt and "# tests/test_calc.py" in prompt
+    assert prompt.index("Output format:") < prompt.index("[git]") < prompt.index("[failures]")
+    assert meta["prompt_tokens"] <= 1500 + 10
+    assert any(item["name"] == "command:analyze" for item in meta["included"] + meta["dropped"])
+
+
+def test_prompt_prefix_is_stable_across_cycles(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "mod.py").write_text("def f():\n    return 1\n")
+    symbols = SymbolIndex(tmp_path / "symbols.json")
+    symbols.refresh(tmp_path, [tmp_path / "pkg" / "mod.py"])
+    session = SessionState(
+        enabled=False, default_duration=0, default_post_review_delay=0, max_duration=0
+    )
+    scheduler = CommitState(auto_commit=False, cadence_seconds=0)
+
+    first = compose_prompt(tmp_path, tmp_path / "c1", {"test": {"code": 1, "output": PYTEST_LOG}},
+                           session, scheduler, None, symbols=symbols)
+    second = compose_prompt(tmp_path, tmp_path / "c2", {"test": {"code": 0, "output": "3 passed"}},
+                            session, scheduler, "pkg", symbols=symbols)
+
+    meta1 = json.loads((tmp_path / "c1" / "prompt.meta.json").read_text())
+    meta2 = json.loads((tmp_path / "c2" / "prompt.meta.json").read_text())
+    assert first.startswith(STATIC_PROMPT_PREFIX) and "[repo_map]\npkg/: mod.py" in first
+    assert meta1["prefix"]["sha256"] == meta2["prefix"]["sha256"]
+    prefix_len = first.index("[git]")
+    assert first[:prefix_len] == second[:prefix_len]
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from agent.patcher import (
+    FENCE_ANY_RE,
+    FENCE_LABELED_RE,
+    FileDiff,
+    StreamingDiffExtractor,
+    extract_unified_diff,
+    iter_file_diffs,
+    looks_like_unified_diff,
+    strip_ansi,
+)
+
+
+def regex_extract(text):
+    """The regex-based extractor the streaming one replaced, kept as the oracle."""
+    if not text:
+        return None
+    clean = strip_ansi(text)
+    last = None
+    for m in FENCE_LABELED_RE.finditer(clean):
+        body = m.group(1).strip()
+        if looks_like_unified_diff(body):
+            last = body
+    if last:
+        return last
+    for m in FENCE_ANY_RE.finditer(clean):
+        body = m.group(1).strip()
+        if looks_like_unified_diff(body):
+            last = body
+    if last:
+        return last
+    idx = clean.find("diff --git ")
+    if idx != -1:
+        return clean[idx:].strip()
+    if looks_like_unified_diff(clean):
+        return clean
+    return None
+
+
+TWO_FILES = (
+    "diff --git a/agent/a.py b/agent/a.py\n"
+    "--- a/agent/a.py\n+++ b/agent/a.py\n@@ -1,2 +1,2 @@\n-x = 1\n+x = 2\n y = 3\n"
+    "diff --git a/agent/b.py b/agent/b.py\n"
+    "--- a/agent/b.py\n+++ b/agent/b.py\n@@ -5 +5 @@\n-old\n+new\n"
+)
+
+# Shapes seen in provider_output.txt across local and hosted models.
+CORPUS = [
+    "",
+    "I could not find anything to change.",
+    "Plan: bump x.\n```diff\n" + TWO_FILES + "```\nThat fixes the failing test.\n",
+    "```patch\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n```",
+    "First try:\n```diff\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n```\nBetter:\n```DIFF  \n\n"
+    "--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+c\n```\n",
+    "```python\nprint('hi')\n```\n```\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n```\n",
+    "\x1b[32m```diff\x1b[0m\n\x1b[31m--- a/x.py\x1b[0m\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n```\n",
+    "Running tests...\n"
+    + "PASSED test_%d --- ok\n" * 3
+    + "diff --git a/x b/x\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\n\n",
+    "--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n",
+    "```diff\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n",  # unclosed fence
+    "```diff\n```\n--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n```\n",
+    "```diff\n\n```\nno diff in here\n```\n",
+    "Here ```diff\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\n``` "
+    "```diff\n--- a/y\n+++ b/y\n@@ -1 +1 @@\n-c\n+d\n```",
+    "````diff\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\n````\n",
+    "```diff\r\n--- a/x\r\n+++ b/x\r\n@@ -1 +1 @@\r\n-a\r\n+b\r\n```\r\n",
+    "```sh\ngit diff\n```\n```text\n@@ -1 +1 @@\n```\n",
+    "note ```python\n" + "log line --- x\n" * 50,
+]
+
+FRAGMENTS = [
+    "```", "```diff", "```PATCH", "```python", "```diff ", " ```diff", "x```diff", "````",
+    "``` ```diff", "diff --git a/x b/x", "--- a/x", "+++ b/x", "+++ /dev/null", "@@ -1 +1 @@",
+    "-a", "+b", "", "  ", "text",
+    "\x1b[31m```diff\x1b[0m", "pre diff --git a/y b/y", "```c++", "\r",
+]
+
+
+def _chunked(text, rng):
+    extractor = StreamingDiffExtractor()
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 9)
+        extractor.feed(text[i:i + step])
+        i += step
+    extractor.finish()
+    return extractor.result()
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_matches_regex_extractor_on_corpus(text):
+    expected = regex_extract(text)
+
+    assert extract_unified_diff(text) == expected
+    assert _chunked(text, random.Random(len(text))) == expected
+
+
+def test_matches_regex_extractor_on_generated_outputs():
+    rng = random.Random(1234)
+    for _ in range(3000):
+        text = "\n".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 12)))
+        if rng.random() < 0.5:
+            text += "\n"
+        expected = regex_extract(text)
+        assert extract_unified_diff(text) == expected, text
+        assert _chunked(text, rng) == expected, text
+
+
+def test_yields_each_file_as_soon_as_it_closes():
+    extractor = StreamingDiffExtractor()
+    body = [line + "\n" for line in TWO_FILES.splitlines()]
+    tokens = ["Plan\n```diff\n"] + body + ["```\n", "done"]
+    yielded = [(i, d) for i, token in enumerate(tokens) for d in extractor.feed(token)]
+    yielded += [(len(tokens), d) for d in extractor.finish()]
+
+    header_b = tokens.index("diff --git a/agent/b.py b/agent/b.py\n")
+    closing = tokens.index("```\n")
+    assert [(i, d.path) for i, d in yielded] == [(header_b, "agent/a.py"), (closing, "agent/b.py")]
+    assert "\n".join(d.text for _, d in yielded) == TWO_FILES.strip()
+    assert extractor.result() == TWO_FILES.strip()
+
+
+def test_iter_file_diffs_handles_plain_unified_diffs():
+    text = (
+        "```\n--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b\n"
+        "--- a/y\n+++ /dev/null\n@@ -1 +0,0 @@\n-c\n```\n"
+    )
+
+    assert list(iter_file_diffs([text[:17], text[17:]])) == [
+        FileDiff("x", "--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+b"),
+        FileDiff("y", "--- a/y\n+++ /dev/null\n@@ -1 +0,0 @@\n-c"),
+    ]
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import re
+import subprocess
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from agent.embeddings import EmbeddingIndex, OllamaEmbedder  # noqa: E402
+from agent.providers.base import ProviderError  # noqa: E402
+
+DIM = 64
+
+
+def _vector(text: str):
+    vec = [0.0] * DIM
+    for word in re.findall(r"[a-z]+", text.lower()):
+        vec[zlib.crc32(word.encode()) % DIM] += 1.0
+    return vec
+
+
+class _Server:
+    def __init__(self, batch_endpoint: bool = True, raw_body: bytes = b"") -> None:
+        self.calls = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.calls.append((self.path, payload))
+                if raw_body:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(raw_body)))
+                    self.end_headers()
+                    self.wfile.write(raw_body)
+                    return
+                if self.path == "/api/embed" and batch_endpoint:
+                    body = {"embeddings": [_vector(t) for t in payload["input"]]}
+                elif self.path == "/api/embeddings":
+                    body = {"embedding": _vector(payload["prompt"])}
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    srv = _Server()
+    yield srv
+    srv.close()
+
+
+def _repo(tmp_path):
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / "billing.py").write_text(
+        "def invoice_total(items):\n    return sum(price for price in items)\n"
+    )
+    (tmp_path / "network.py").write_text(
+        "def open_socket(host, port):\n    return connect(host, port)\n"
+    )
+    (tmp_path / "notes.txt").write_text("invoice invoice invoice\n")
+    return tmp_path
+
+
+def test_sync_batches_and_search_ranks_by_similarity(tmp_path, server):
+    repo = _repo(tmp_path)
+    embedder = OllamaEmbedder(server.url, "embed-model", batch_size=8)
+    index = EmbeddingIndex(tmp_path / "state", embedder)
+
+    assert index.sync(repo)
+    hits = index.search("invoice total price", k=1)
+
+    assert index.embedded == 2  # notes.txt is outside the include patterns
+    assert [path for path, _ in server.calls] == ["/api/embed", "/api/embed"]
+    assert hits[0].path == "billing.py"
+    assert "def invoice_total" in hits[0].render()
+
+
+def test_only_changed_chunks_are_embedded_and_index_persists(tmp_path, server):
+    repo = _repo(tmp_path)
+    state = tmp_path / "state"
+    EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model")).sync(repo)
+    (repo / "network.py").write_text("def close_socket(sock):\n    sock.close()\n")
+
+    reloaded = EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model"))
+    reloaded.sync(repo)
+
+    assert reloaded.embedded == 1
+    assert reloaded.search("close socket", k=1)[0].path == "network.py"
+    assert EmbeddingIndex(state, OllamaEmbedder(server.url, "other-model")).meta["rows"] == 0
+
+
+def test_failed_embed_leaves_files_to_retry(tmp_path, server):
+    repo = _repo(tmp_path)
+    embedder = OllamaEmbedder(server.url, "embed-model")
+    index = EmbeddingIndex(tmp_path / "state", embedder)
+    real_embed = embedder.embed
+
+    def down(texts):
+        raise ProviderError("embedding server stopped")
+
+    embedder.embed = down
+    with pytest.raises(ProviderError):
+        index.sync(repo)
+    assert index.meta["files"] == {}
+
+    embedder.embed = real_embed
+    assert index.sync(repo)
+    assert index.embedded == 2
+    assert index.search("invoice total price", k=1)[0].path == "billing.py"
+
+
+def test_falls_back_to_single_prompt_endpoint():
+    srv = _Server(batch_endpoint=False)
+    try:
+        embedder = OllamaEmbedder(srv.url, "embed-model", batch_size=4)
+        vectors = embedder.embed(["alpha", "beta", "gamma"])
+        embedder.embed(["delta"])
+    finally:
+        srv.close()
+
+    assert len(vectors) == 3
+    assert [path for path, _ in srv.calls] == ["/api/embed"] + ["/api/embeddings"] * 4
+
+
+def test_non_json_response_is_a_provider_error(tmp_path):
+    srv = _Server(raw_body=b"<html>proxy error</html>")
+    try:
+        embedder = OllamaEmbedder(srv.url, "embed-model")
+        with pytest.raises(ProviderError, match="not JSON"):
+            embedder.embed(["alpha"])
+        index = EmbeddingIndex(tmp_path / "state", embedder)
+        with pytest.raises(ProviderError):
+            index.sync(_repo(tmp_path))
+    finally:
+        srv.close()
+
+
+def test_rows_written_without_metadata_are_dropped_on_load(tmp_path, server):
+    repo = _repo(tmp_path)
+    state = tmp_path / "state"
+    EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model")).sync(repo)
+    with open(state / "vectors.f32", "ab") as handle:  # a crash after appending, before meta.json
+        handle.write(b"\0" * DIM * 4 * 3)
+
+    reloaded = EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model"))
+    (repo / "network.py").write_text("def close_socket(sock):\n    sock.close()\n")
+    reloaded.sync(repo)
+
+    assert reloaded.search("close socket", k=1)[0].path == "network.py"
+    assert reloaded.search("invoice total price", k=1)[0].path == "billing.py"
+
+
+def test_vectors_rewritten_without_metadata_start_over(tmp_path, server):
+    repo = _repo(tmp_path)
+    state = tmp_path / "state"
+    EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model")).sync(repo)
+    # A compaction that never reached meta.json.
+    (state / "vectors.f32").write_bytes(b"\0" * DIM * 4)
+
+    reloaded = EmbeddingIndex(state, OllamaEmbedder(server.url, "embed-model"))
+    assert reloaded.meta["rows"] == 0
+    reloaded.sync(repo)
+    assert reloaded.embedded == 2
+    assert reloaded.search("invoice total price", k=1)[0].path == "billing.py"
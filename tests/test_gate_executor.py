@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import sys
+import time
+from typing import List
+
+import pytest
+
+from agent.analyzers.base import Analyzer, CommandResult
+from agent.analyzers.executor import GateExecutor
+from agent.analyzers.history import GateHistory
+
+
+class SleepAnalyzer(Analyzer):
+    def __init__(self, name: str, seconds: float) -> None:
+        super().__init__({})
+        self.name = name
+        self.seconds = seconds
+
+    def execute(self, repo_root: str, cycle_dir: str, targets: List[str]) -> CommandResult:
+        return self._run(
+            [sys.executable, "-c", f"import time; time.sleep({self.seconds})"],
+            cwd=repo_root,
+            timeout=30,
+        )
+
+
+def test_analyzers_run_concurrently(tmp_path):
+    analyzers = [SleepAnalyzer(f"sleep{i}", 0.5) for i in range(3)]
+    executor = GateExecutor(max_workers=3)
+
+    started = time.time()
+    results, timings = executor.run(analyzers, str(tmp_path), str(tmp_path))
+    elapsed = time.time() - started
+
+    assert list(results) == ["sleep0", "sleep1", "sleep2"]
+    assert all(res.ok for res in results.values())
+    assert elapsed < 1.2
+    assert all(t.status == "completed" and t.elapsed >= 0.5 for t in timings.values())
+
+
+def test_worker_cap_is_respected(tmp_path):
+    analyzers = [SleepAnalyzer(f"sleep{i}", 0.3) for i in range(2)]
+    executor = GateExecutor(max_workers=1)
+
+    started = time.time()
+    executor.run(analyzers, str(tmp_path), str(tmp_path))
+
+    assert time.time() - started >= 0.6
+
+
+def test_per_analyzer_timeout_kills_command(tmp_path):
+    analyzers = [SleepAnalyzer("slow", 10), SleepAnalyzer("fast", 0.1)]
+    executor = GateExecutor(max_workers=2, timeouts={"slow": 0.3})
+
+    started = time.time()
+    results, timings = executor.run(analyzers, str(tmp_path), str(tmp_path))
+
+    assert time.time() - started < 3
+    assert results["slow"].status == "error"
+    assert "timed out" in results["slow"].summary
+    assert timings["slow"].status == "timeout"
+    assert results["fast"].ok
+
+
+class SpawningAnalyzer(Analyzer):
+    """Runs a command whose own child outlives it unless the whole group is killed."""
+
+    name = "spawner"
+
+    def __init__(self, pid_file) -> None:
+        super().__init__({})
+        self.pid_file = pid_file
+
+    def execute(self, repo_root: str, cycle_dir: str, targets: List[str]) -> CommandResult:
+        script = (
+            "import subprocess, sys, time\n"
+            "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])\n"
+            f"open({str(self.pid_file)!r}, 'w').write(str(child.pid))\n"
+            "time.sleep(30)\n"
+        )
+        return self._run([sys.executable, "-c", script], cwd=repo_root, timeout=60)
+
+
+def _alive(pid: int, grace: float = 1.0) -> bool:
+    # SIGKILL lands asynchronously; give the kernel a moment to finish the exit.
+    deadline = time.time() + grace
+    while True:
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                if fh.read().split(")")[-1].split()[0] == "Z":
+                    return False
+        except OSError:
+            return False
+        if time.time() >= deadline:
+            return True
+        time.sleep(0.05)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_timeout_kills_the_commands_child_processes_before_returning(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    executor = GateExecutor(max_workers=1, timeouts={"spawner": 0.5})
+
+    results, _ = executor.run([SpawningAnalyzer(pid_file)], str(tmp_path), str(tmp_path))
+
+    assert "timed out" in results["spawner"].summary
+    assert not _alive(int(pid_file.read_text()))
+
+
+class FailingAnalyzer(SleepAnalyzer):
+    def execute(self, repo_root: str, cycle_dir: str, targets: List[str]) -> CommandResult:
+        return self._run(
+            [sys.executable, "-c", "import sys; sys.exit(3)"], cwd=repo_root, timeout=30
+        )
+
+
+def test_stop_when_cancels_running_and_queued(tmp_path):
+    analyzers = [
+        FailingAnalyzer("lint", 0),
+        SleepAnalyzer("tests", 10),
+        SleepAnalyzer("scan", 10),
+        SleepAnalyzer("audit", 10),
+    ]
+    executor = GateExecutor(max_workers=2)
+
+    started = time.time()
+    results, timings = executor.run(
+        analyzers,
+        str(tmp_path),
+        str(tmp_path),
+        stop_when=lambda partial: any(res.status == "failed" for res in partial.values()),
+    )
+
+    assert time.time() - started < 3
+    assert results["lint"].status == "failed"
+    assert results["tests"].status == "cancelled"
+    assert results["scan"].status == "cancelled"
+    assert results["audit"].status == "cancelled"
+    assert timings["tests"].status == "cancelled"
+    assert timings["audit"].status == "skipped"
+
+
+def test_history_orders_cheap_high_rejection_first(tmp_path):
+    history = GateHistory(tmp_path / "history.json")
+    for _ in range(5):
+        history.record("pytest_cov", 600.0, rejected=True)
+        history.record("ruff", 2.0, rejected=True)
+        history.record("repo_hygiene", 1.0, rejected=False)
+    history.save()
+
+    reloaded = GateHistory(tmp_path / "history.json")
+    names = ("pytest_cov", "repo_hygiene", "ruff", "semgrep")
+    ordered = reloaded.order([SleepAnalyzer(n, 0) for n in names])
+
+    assert ordered[0].name == "ruff"
+    assert ordered[-1].name == "pytest_cov"
+
+
+def test_history_merges_runs_from_parallel_gates(tmp_path):
+    first = GateHistory(tmp_path / "history.json")
+    second = GateHistory(tmp_path / "history.json")
+    first.record("ruff", 2.0, rejected=True)
+    second.record("ruff", 4.0, rejected=False)
+    first.save()
+    second.save()
+
+    stats = GateHistory(tmp_path / "history.json").stats["ruff"]
+    assert (stats["runs"], stats["rejections"]) == (2, 1)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import subprocess
+
+from agent.gitquery import GitQuery
+
+
+def _git(repo, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "trunk")
+    (repo / "a.txt").write_text("one\n")
+    _git(repo, "add", "a.txt")
+    _git(repo, "commit", "-q", "-m", "first commit")
+    return repo
+
+
+def test_answers_match_git_cli(tmp_path):
+    repo = _repo(tmp_path)
+    query = GitQuery(repo)
+    try:
+        assert query.branch() == "trunk"
+        assert query.last_commit_oneline() == _git(repo, "log", "-1", "--oneline").strip()
+        assert query.show("HEAD", "a.txt") == "one\n"
+        assert query.show("HEAD", "missing.txt") is None
+
+        _git(repo, "checkout", "-q", "--detach")
+        assert query.branch() == "HEAD"
+    finally:
+        query.close()
+
+
+def test_status_is_cached_until_index_or_ttl_changes(tmp_path):
+    repo = _repo(tmp_path)
+    query = GitQuery(repo, ttl=60)
+    try:
+        assert query.status_porcelain() == ""
+        (repo / "b.txt").write_text("new\n")
+        # Within the TTL an untouched index means a cached answer.
+        assert query.status_porcelain() == ""
+        assert query.hits == 1
+
+        _git(repo, "add", "b.txt")
+        assert query.status_porcelain() == "A  b.txt\n"
+
+        (repo / "c.txt").write_text("new\n")
+        query.invalidate()
+        assert "?? c.txt" in query.status_porcelain()
+    finally:
+        query.close()
+
+
+def test_for_repo_shares_instances(tmp_path):
+    repo = _repo(tmp_path)
+    try:
+        assert GitQuery.for_repo(repo) is GitQuery.for_repo(repo / ".")
+    finally:
+        GitQuery.close_all()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent.providers import httpclient  # noqa: E402
+from agent.run import AgentLoop  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", connections
+    httpclient.close_all()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_to_one_host_reuse_a_connection(server):
+    url, connections = server
+
+    for _ in range(5):
+        assert httpclient.post(f"{url}/api/generate", json={"n": 1}).text == "ok"
+
+    assert len(connections) == 1
+    assert httpclient.session_for(url + "/other") is httpclient.session_for(url + "/api/generate")
+
+
+def test_configure_rebuilds_sessions_only_when_settings_change(server):
+    url, _ = server
+    session = httpclient.session_for(url)
+
+    httpclient.configure({"pool_size": httpclient.DEFAULTS["pool_size"]})
+    assert httpclient.session_for(url) is session
+
+    try:
+        httpclient.configure({"pool_size": 2, "unknown": 1})
+        rebuilt = httpclient.session_for(url)
+        assert rebuilt is not session
+        assert rebuilt.get_adapter(url + "/").poolmanager.connection_pool_kw["maxsize"] == 2
+    finally:
+        httpclient.configure(None)
+
+
+def test_refused_connections_are_transport_errors_but_read_timeouts_are_not():
+    import requests
+
+    with pytest.raises(requests.exceptions.ConnectionError) as refused:
+        httpclient.get("http://127.0.0.1:9/", timeout=2)
+
+    assert httpclient.is_transport_error(refused.value)
+    assert not httpclient.is_transport_error(requests.exceptions.ReadTimeout("read timed out"))
+    assert not httpclient.is_transport_error(ValueError("bad url"))
+
+
+def test_loop_applies_http_config_edits_between_cycles(tmp_path, monkeypatch, server):
+    url, _ = server
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    cfg = {
+        "provider": {"type": "command", "command": {"args": [sys.executable, "-c", "print()"]}},
+        "loop": {"fast_path_on_fs_change": False},
+        "sessions": {"enabled": False},
+    }
+    config_path = repo / "agent" / "config.json"
+    config_path.write_text(json.dumps(cfg), encoding="utf-8")
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    session = httpclient.session_for(url)
+
+    try:
+        config_path.write_text(json.dumps({**cfg, "http": {"pool_size": 3}}), encoding="utf-8")
+        loop._refresh_controls()
+        rebuilt = httpclient.session_for(url)
+        assert rebuilt is not session
+        assert rebuilt.get_adapter(url + "/").poolmanager.connection_pool_kw["maxsize"] == 3
+    finally:
+        httpclient.configure(None)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import subprocess
+import time
+
+from agent.lexical_index import LexicalIndex, query_terms
+from agent.run import CommitState, SessionState, compose_prompt
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "pkg").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    (repo / "pkg" / "config_loader.py").write_text("def load(path):\n    return read_yaml(path)\n")
+    (repo / "pkg" / "billing.py").write_text(
+        "\n".join(f"line {i}" for i in range(100))
+        + "\ndef invoice_total(items):\n    return sum(items)\n"
+    )
+    (repo / "pkg" / "noise.py").write_text("def unrelated():\n    return 1\n")
+    (repo / "image.bin").write_bytes(b"\0\1\2invoice")
+    return repo
+
+
+def test_query_terms_split_identifiers_and_drop_stopwords():
+    terms = query_terms("Please fix the invoiceTotal in config_loader")
+    assert terms == ["fix", "invoice", "total", "config", "loader"]
+
+
+def test_search_ranks_relevant_chunks(tmp_path):
+    repo = _repo(tmp_path)
+    index = LexicalIndex(tmp_path / "index.sqlite")
+    assert index.sync(repo)
+
+    hits = index.search("invoice total is wrong")
+    assert hits[0].path == "pkg/billing.py"
+    assert hits[0].start > 1 and "invoice_total" in hits[0].text
+    assert index.search("the config loader")[0].path == "pkg/config_loader.py"
+    assert all(hit.path != "image.bin" for hit in index.search("invoice"))
+
+
+def test_sync_is_incremental_by_content_hash(tmp_path):
+    repo = _repo(tmp_path)
+    index = LexicalIndex(tmp_path / "index.sqlite")
+    index.sync(repo)
+    first = index.reindexed
+
+    index.sync(repo)
+    assert index.reindexed == first
+
+    (repo / "pkg" / "noise.py").write_text("def shipping_rates():\n    return 2\n")
+    (repo / "pkg" / "config_loader.py").unlink()
+    index.sync(repo)
+    assert index.reindexed == first + 1
+    assert index.search("shipping rates")[0].path == "pkg/noise.py"
+    assert index.search("config loader") == []
+    assert index.search("unrelated") == []  # the rewritten file's old chunks are gone
+
+
+def test_missing_fts5_disables_the_index(tmp_path, monkeypatch):
+    repo = _repo(tmp_path)
+    index = LexicalIndex(tmp_path / "index.sqlite")
+
+    def no_fts5(self):
+        raise sqlite3.OperationalError("no such module: fts5")
+
+    monkeypatch.setattr(LexicalIndex, "_connect", no_fts5)
+
+    assert index.sync(repo) is False
+    assert "FTS5" in index.disabled
+    assert index.search("invoice") == []
+
+
+def test_compose_prompt_includes_task_related_files(tmp_path):
+    repo = _repo(tmp_path)
+    (repo / "agent" / "local" / "control").mkdir(parents=True)
+    (repo / "agent" / "local" / "control" / "task.txt").write_text(
+        "Round the invoice total to cents"
+    )
+    index = LexicalIndex(tmp_path / "index.sqlite")
+    index.sync(repo)
+    session = SessionState(
+        enabled=False, default_duration=0, default_post_review_delay=0, max_duration=0
+    )
+    scheduler = CommitState(auto_commit=False, cadence_seconds=0)
+
+    started = time.perf_counter()
+    prompt = compose_prompt(
+        repo, tmp_path / "cycle", {}, session, scheduler, None, retrievers=[index], retrieval_k=2
+    )
+    assert time.perf_counter() - started < 2
+
+    meta = json.loads((tmp_path / "cycle" / "prompt.meta.json").read_text())
+    assert meta["retrieval"][0]["path"] == "pkg/billing.py"
+    assert "[related:0]\n# pkg/billing.py" in prompt
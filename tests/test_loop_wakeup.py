@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from agent.run import FastPathMonitor, WakeupMonitor
+
+
+def _monitor(tmp_path):
+    control = tmp_path / "agent" / "local" / "control"
+    control.mkdir(parents=True)
+    fast_path = FastPathMonitor(tmp_path, enabled=False)
+    return WakeupMonitor(tmp_path, fast_path, poll_interval=0.01, debounce=0), control
+
+
+def _later(delay, action):
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+def test_cooldown_expires_without_activity(tmp_path):
+    monitor, _ = _monitor(tmp_path)
+
+    started = time.monotonic()
+    assert monitor.wait(0.1) == "cooldown"
+    assert time.monotonic() - started >= 0.1
+
+
+def test_control_command_wakes_loop(tmp_path):
+    monitor, control = _monitor(tmp_path)
+    _later(0.05, lambda: (control / "commit_now.cmd").write_text("now", encoding="utf-8"))
+
+    started = time.monotonic()
+    assert monitor.wait(10) == "control"
+    assert time.monotonic() - started < 1
+
+
+def test_task_change_wakes_loop_once(tmp_path):
+    monitor, control = _monitor(tmp_path)
+    _later(0.05, lambda: (control / "task.txt").write_text("fix the tests", encoding="utf-8"))
+
+    assert monitor.wait(10) == "task"
+    monitor.mark_seen()
+    assert monitor.wait(0.05) == "cooldown"
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+from agent.router import ModelRouter, Tier
+from agent.run import AgentLoop
+
+TIERS = [Tier("fast", "small", max_prompt_tokens=1000), Tier("strong", "big")]
+
+
+def test_starts_fast_and_escalates_only_after_a_gate_failure(tmp_path):
+    router = ModelRouter(tmp_path / "router.json", TIERS)
+
+    first = router.route(200, ["test"])
+    router.record(first, passed=False)
+    second = router.route(200, ["test"])
+    router.record(second, passed=True)
+
+    assert (first.model, second.model) == ("small", "big")
+    assert "escalated" in second.reasons[0]
+    assert router.route(200).model == "small"
+    stats = json.loads((tmp_path / "router.json").read_text())["stats"]
+    assert stats["fast"] == {"attempts": 1, "passed": 0}
+
+
+def test_failing_top_tier_stays_on_the_top_tier(tmp_path):
+    router = ModelRouter(tmp_path / "router.json", TIERS)
+    router.escalate_from = 1  # the strong tier failed the gate last cycle
+
+    first = router.route(200, ["test"])
+    router.record(first, passed=False)
+    second = router.route(200, ["test"])
+
+    assert (first.model, second.model) == ("big", "big")
+    assert "escalated: strong" in second.reasons[0]
+
+
+def test_large_prompts_and_design_tasks_go_to_the_strong_tier(tmp_path):
+    router = ModelRouter(tmp_path / "router.json", TIERS)
+
+    assert router.route(5000).model == "big"
+    assert router.route(100, task="Refactor the loader into plugins").model == "big"
+    mechanical = router.route(100, ["lint"], task="fix typos")
+    assert mechanical.reasons == ["only mechanical findings: lint"]
+
+
+def test_poor_pass_rate_skips_the_fast_tier_except_for_mechanical_fixes(tmp_path):
+    router = ModelRouter(
+        tmp_path / "router.json", TIERS, {"min_samples": 3, "min_success_rate": 0.4}
+    )
+    router.stats = {"fast": {"attempts": 6, "passed": 0}}
+
+    assert router.route(100, ["test"]).model == "big"
+    assert router.route(100, ["lint"]).model == "small"
+
+
+def test_loop_records_route_in_cycle_meta(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    script = tmp_path / "provider.py"
+    script.write_text("import sys\nsys.stdin.read()\nprint('no diff here')\n", encoding="utf-8")
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, str(script)]},
+            "model": "small",
+        },
+        "loop": {"max_cycles": 2, "cooldown_seconds": 0, "fast_path_on_fs_change": False},
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+        "router": {
+            "enabled": True,
+            "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+        },
+    }
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    monkeypatch.chdir(repo)
+
+    AgentLoop(repo, cfg).run()
+
+    artifacts = repo / "agent" / "artifacts"
+    metas = sorted(
+        (json.loads(p.read_text()) for p in artifacts.glob("*/cycle.meta.json")),
+        key=lambda m: m["cycle"],
+    )
+    assert [m["route"]["tier"] for m in metas] == ["fast", "strong"]
+    assert metas[0]["route"]["passed"] is False and metas[0]["route"]["generation_seconds"] >= 0
+
+
+def test_route_classifies_failures_by_the_configured_command(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for tool in ("ruff", "pytest"):
+        (bin_dir / tool).write_text("#!/bin/sh\necho 'E501 line too long'\nexit 1\n")
+        (bin_dir / tool).chmod(0o755)
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, "-c", "print()"]},
+            "model": "small",
+        },
+        "loop": {"fast_path_on_fs_change": False},
+        "commands": {"analyze": {"enabled": True, "cmd": f"{bin_dir}/ruff check"}},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+        "router": {
+            "enabled": True,
+            "min_samples": 1,
+            "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+        },
+    }
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    loop.router.stats = {"fast": {"attempts": 5, "passed": 0}}
+
+    lint = loop._route("fix it", loop._run_commands(tmp_path / "c1"))
+    assert lint.model == "small"
+    assert lint.reasons == [f"only mechanical findings: {bin_dir}/ruff check"]
+
+    loop.cfg["commands"]["test"] = {"enabled": True, "cmd": f"{bin_dir}/pytest -q"}
+    assert loop._route("fix it", loop._run_commands(tmp_path / "c2")).model == "big"
+
+
+def test_routed_tier_reaches_the_hosted_api_payload(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    cfg = {
+        "provider": {"type": "api", "backend": "openai", "model": "small"},
+        "loop": {"fast_path_on_fs_change": False},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+        "router": {
+            "enabled": True,
+            "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+        },
+    }
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    loop.router.escalate_from = 0  # the fast tier failed the gate last cycle
+
+    decision = loop._route("fix it", {})
+    payload, _, _ = loop.provider._build_request("fix it", "key")
+
+    assert decision.model == payload["model"] == "big"
+
+
+def test_prompt_is_resized_for_the_routed_tier(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, "-c", "print()"]},
+            "model": "big",
+        },
+        "loop": {"max_cycles": 1, "cooldown_seconds": 0, "fast_path_on_fs_change": False},
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+        "prompt": {"context_tokens": {"small": 3000, "big": 32000}, "reserve_output_tokens": 1000},
+        "router": {
+            "enabled": True,
+            "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+        },
+    }
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    monkeypatch.chdir(repo)
+
+    AgentLoop(repo, cfg).run()
+
+    cycle_dir = next((repo / "agent" / "artifacts").glob("cycle_*"))
+    meta = json.loads((cycle_dir / "cycle.meta.json").read_text())
+    assert meta["route"]["model"] == "small"
+    assert json.loads((cycle_dir / "prompt.meta.json").read_text())["budget_tokens"] == 2000
+
+
+def test_sandboxed_patch_that_does_not_apply_counts_as_a_failure(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    script = tmp_path / "provider.py"
+    script.write_text(
+        "import sys\nsys.stdin.read()\n"
+        "print('```diff\\n--- a/missing.txt\\n+++ b/missing.txt\\n"
+        "@@ -1 +1 @@\\n-old\\n+new\\n```')\n",
+        encoding="utf-8",
+    )
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, str(script)]},
+            "model": "small",
+        },
+        "loop": {
+            "max_cycles": 1,
+            "cooldown_seconds": 0,
+            "fast_path_on_fs_change": False,
+            "sandbox": {"enabled": True, "size": 1},
+        },
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+        "router": {
+            "enabled": True,
+            "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+        },
+    }
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    try:
+        loop.run()
+    finally:
+        loop.sandboxes.close(remove=True)
+
+    meta = json.loads(next((repo / "agent" / "artifacts").glob("*/cycle.meta.json")).read_text())
+    assert meta["sandbox"]["applies"] is False and meta["gate"] is None
+    assert meta["route"]["passed"] is False
+    assert loop.router.escalation_model() == "big"
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent.providers import httpclient  # noqa: E402
+from agent.providers.ollama import OllamaProvider, fetch_tags, invalidate_tags  # noqa: E402
+from agent_dashboard.core.model_downloader import ModelDownloader  # noqa: E402
+
+TAGS = {
+    "models": [
+        {"name": "deepseek-coder:6.7b-instruct", "model": "deepseek-coder:6.7b-instruct",
+         "details": {"family": "llama", "parameter_size": "7B", "quantization_level": "Q4_0"}},
+        {"name": "llama3:latest", "model": "llama3:latest", "details": {}},
+    ]
+}
+
+
+@pytest.fixture
+def ollama():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            hits.append(self.path)
+            body = json.dumps(TAGS).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    invalidate_tags()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", hits
+    invalidate_tags()
+    httpclient.close_all()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_list_models_uses_tags_endpoint_and_caches(ollama):
+    url, hits = ollama
+    provider = OllamaProvider({"model": "m", "base_url": url})
+
+    first = list(provider.list_models())
+    second = list(provider.list_models())
+
+    assert [m.name for m in first] == ["deepseek-coder:6.7b-instruct", "llama3:latest"]
+    assert first[0].description == "llama 7B Q4_0"
+    assert second == first
+    assert hits == ["/api/tags"]
+
+
+def test_invalidate_and_ttl_refetch(ollama):
+    url, hits = ollama
+
+    fetch_tags(url)
+    invalidate_tags(url + "/")
+    fetch_tags(url)
+    fetch_tags(url, ttl=0)
+
+    assert len(hits) == 3
+
+
+def test_unreachable_server_is_not_cached():
+    invalidate_tags()
+    assert fetch_tags("http://127.0.0.1:9", timeout=1) is None
+
+
+def test_model_downloader_checks_tags(ollama):
+    url, hits = ollama
+
+    assert ModelDownloader.check_model_exists("deepseek-coder:6.7b-instruct", url)
+    assert ModelDownloader.check_model_exists("llama3:latest", url)
+    assert not ModelDownloader.check_model_exists("deepseek-coder:33b", url)
+    assert len(hits) == 1
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent.patcher import extract_unified_diff  # noqa: E402
+from agent.providers.ollama import OllamaProvider  # noqa: E402
+
+DIFF_TOKENS = [
+    "Plan: fix it.\n", "```diff\n", "--- a/x.py\n", "+++ b/x.py\n", "@@ -1 +1 @@\n",
+    "-a = 1\n", "+a = 2\n", "```", "\n", "Some trailing explanation",
+]
+
+
+def _serve(tokens):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for token in tokens:
+                    event = {"response": token, "done": False}
+                    self.wfile.write((json.dumps(event) + "\n").encode())
+                    self.wfile.flush()
+                done = {
+                    "response": "",
+                    "done": True,
+                    "prompt_eval_count": 10,
+                    "prompt_eval_duration": 5_000_000,
+                }
+                self.wfile.write((json.dumps(done) + "\n").encode())
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def _provider(httpd, **cfg):
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    provider = OllamaProvider({"model": "m", "base_url": base_url, **cfg})
+    provider.has_cli = False
+    return provider
+
+
+def test_stream_stops_after_closing_diff_fence(tmp_path):
+    httpd = _serve(DIFF_TOKENS)
+    provider = _provider(httpd, stream_early_stop=True)
+    seen = []
+    provider.on_stream = seen.append
+    try:
+        output = provider.generate_patch("prompt", str(tmp_path))
+    finally:
+        httpd.shutdown()
+
+    assert output.endswith("+a = 2\n```\n")
+    assert "trailing" not in output
+    assert "".join(seen) == output == (tmp_path / "provider_output.txt").read_text()
+    stats = json.loads((tmp_path / "provider_stats.json").read_text())
+    assert stats == {"stopped": "diff_complete"}
+
+
+def test_stream_aborts_when_no_diff_appears(tmp_path):
+    httpd = _serve(["I am just talking. "] * 200)
+    provider = _provider(httpd, stream_abort_chars=500)
+    try:
+        output = provider.generate_patch("prompt", str(tmp_path))
+    finally:
+        httpd.shutdown()
+
+    assert 500 <= len(output) < 600
+    assert json.loads((tmp_path / "provider_stats.json").read_text())["stopped"] == "no_diff"
+
+
+def test_long_reasoning_before_the_diff_is_not_aborted_by_default(tmp_path):
+    httpd = _serve(["Thinking it through. "] * 1000 + DIFF_TOKENS)
+    provider = _provider(httpd)
+    try:
+        output = provider.generate_patch("prompt", str(tmp_path))
+    finally:
+        httpd.shutdown()
+
+    assert output.endswith("Some trailing explanation")
+    assert "stopped" not in json.loads((tmp_path / "provider_stats.json").read_text())
+
+
+def test_stream_runs_to_completion_by_default(tmp_path):
+    httpd = _serve(DIFF_TOKENS)
+    provider = _provider(httpd)
+    try:
+        output = provider.generate_patch("prompt", str(tmp_path))
+    finally:
+        httpd.shutdown()
+
+    assert output == "".join(DIFF_TOKENS)
+    stats = json.loads((tmp_path / "provider_stats.json").read_text())
+    assert stats == {"prompt_eval_count": 10, "prompt_eval_ms": 5}
+
+
+def test_revised_diff_block_is_kept_by_default(tmp_path):
+    revision = [
+        "Actually, y.py instead.\n", "```diff\n", "--- a/y.py\n", "+++ b/y.py\n", "@@ -1 +1 @@\n",
+        "-b = 1\n", "+b = 2\n", "```\n",
+    ]
+    httpd = _serve(DIFF_TOKENS + revision)
+    provider = _provider(httpd)
+    try:
+        output = provider.generate_patch("prompt", str(tmp_path))
+    finally:
+        httpd.shutdown()
+
+    assert "+++ b/y.py" in extract_unified_diff(output)
+
+
+def test_api_request_sends_the_model_context_window(tmp_path):
+    windows = {"default": 8192, "big": 32768}
+    big = OllamaProvider({"model": "big", "num_ctx": windows})
+    other = OllamaProvider({"model": "small", "num_ctx": windows})
+
+    assert big._api_request("p", str(tmp_path))[1]["options"]["num_ctx"] == 32768
+    assert other._api_request("p", str(tmp_path))[1]["options"]["num_ctx"] == 8192
+    plain = OllamaProvider({"model": "m"})
+    assert "num_ctx" not in plain._api_request("p", str(tmp_path))[1]["options"]
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+from agent import run as run_module
+from agent.gitquery import GitQuery
+from agent.run import AgentLoop
+
+PROVIDER_SCRIPT = r'''
+import pathlib, sys
+sys.stdin.read()
+counter = pathlib.Path(sys.argv[1])
+n = int(counter.read_text()) + 1 if counter.exists() else 1
+counter.write_text(str(n))
+print("```diff")
+print(f"diff --git a/f{n}.txt b/f{n}.txt")
+print("new file mode 100644")
+print("--- /dev/null")
+print(f"+++ b/f{n}.txt")
+print("@@ -0,0 +1 @@")
+print(f"+cycle {n}")
+print("```")
+'''
+
+
+def _make_repo(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    script = tmp_path / "provider.py"
+    script.write_text(PROVIDER_SCRIPT, encoding="utf-8")
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, str(script), str(tmp_path / "counter")]},
+        },
+        "loop": {
+            "max_cycles": 2,
+            "cooldown_seconds": 0,
+            "pipeline": True,
+            "fast_path_on_fs_change": False,
+        },
+        "commands": {},
+        "gate": {"cache": {"enabled": False}, "test_impact": {"enabled": False}},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    return repo, cfg
+
+
+def _cycle_metas(repo):
+    artifacts = repo / "agent" / "artifacts"
+    metas = [json.loads(p.read_text()) for p in artifacts.glob("*/cycle.meta.json")]
+    return sorted(metas, key=lambda m: m["cycle"])
+
+
+def test_pipelined_patch_is_adopted(tmp_path, monkeypatch):
+    repo, cfg = _make_repo(tmp_path)
+    monkeypatch.chdir(repo)
+
+    AgentLoop(repo, cfg).run()
+
+    metas = _cycle_metas(repo)
+    assert [m["proposed_files"] for m in metas] == [["f1.txt"], ["f2.txt"]]
+    assert metas[1]["pipeline"]["adopted"] is True
+    assert (repo / "f1.txt").exists() and (repo / "f2.txt").exists()
+    assert not GitQuery._instances  # cat-file helpers are shut down with the loop
+
+
+def test_adopted_cycle_reruns_commands_after_applied_patch(tmp_path, monkeypatch):
+    repo, cfg = _make_repo(tmp_path)
+    cfg["loop"]["max_cycles"] = 3
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    runs = []
+    original = loop._run_commands
+
+    def counting(cycle_dir):
+        runs.append(cycle_dir.name)
+        return original(cycle_dir)
+
+    loop._run_commands = counting
+    loop.run()
+
+    metas = _cycle_metas(repo)
+    assert [m["pipeline"].get("adopted") for m in metas[1:]] == [True, True]
+    assert all(m["pipeline"].get("commands_refreshed") for m in metas[1:])
+    assert len(runs) == 3
+
+
+def test_conflicting_pipelined_patch_is_discarded(tmp_path, monkeypatch):
+    repo, cfg = _make_repo(tmp_path)
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    original = loop._speculation_conflict
+
+    def touch_then_check(spec):
+        # Simulate the working tree moving under the speculative patch.
+        (repo / "f2.txt").write_text("someone else\n", encoding="utf-8")
+        return original(spec)
+
+    loop._speculation_conflict = touch_then_check
+    loop.run()
+
+    metas = _cycle_metas(repo)
+    assert metas[1]["pipeline"]["adopted"] is False
+    assert "f2.txt" in metas[1]["pipeline"]["discard_reason"]
+    assert list((repo / "agent" / "artifacts").glob("*_discarded"))
+
+
+def test_prompt_cache_savings_are_estimated_when_prefix_repeats(tmp_path, monkeypatch):
+    from agent.providers.ollama import generation_stats
+
+    repo, cfg = _make_repo(tmp_path)
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+
+    def cycle(name, stats):
+        cycle_dir = tmp_path / name
+        cycle_dir.mkdir()
+        meta = {"prompt_tokens": 1000, "prefix": {"tokens": 800, "sha256": "abc"}}
+        (cycle_dir / "prompt.meta.json").write_text(json.dumps(meta))
+        (cycle_dir / "provider_stats.json").write_text(json.dumps(generation_stats(stats)))
+        return loop._record_prompt_cache(cycle_dir)
+
+    cold = cycle("c1", {"prompt_eval_count": 1200, "prompt_eval_duration": 2_400_000_000})
+    warm = cycle("c2", {"prompt_eval_count": 300, "prompt_eval_duration": 600_000_000})
+
+    assert cold == {
+        "prefix_reused": False,
+        "prompt_tokens_estimate": 1000,
+        "prompt_eval_count": 1200,
+        "prompt_eval_ms": 2400,
+    }
+    assert warm["prefix_reused"] is True
+    assert warm["cached_tokens"] == 900 and warm["saved_ms"] == 1800
+
+
+def test_failed_gate_discards_the_fast_tier_speculation_and_escalates(tmp_path, monkeypatch):
+    repo, cfg = _make_repo(tmp_path)
+    cfg["loop"]["max_cycles"] = 3
+    cfg["router"] = {
+        "enabled": True,
+        "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+    }
+    monkeypatch.chdir(repo)
+    verdicts = [False, True, True]
+
+    def gate(*args, **kwargs):
+        return run_module.GateReport(allow=verdicts.pop(0), rationale=[], results={})
+
+    monkeypatch.setattr(run_module, "run_production_gate", gate)
+    loop = AgentLoop(repo, cfg)
+    loop.run()
+
+    metas = _cycle_metas(repo)
+    assert [m["route"]["tier"] for m in metas] == ["fast", "strong", "strong"]
+    assert metas[1]["pipeline"]["adopted"] is False
+    assert metas[1]["pipeline"]["discard_reason"] == "escalation pending to big"
+    assert metas[2]["pipeline"]["adopted"] is True and metas[2]["route"]["passed"] is True
+    assert loop.router.stats == {
+        "fast": {"attempts": 1, "passed": 0},
+        "strong": {"attempts": 2, "passed": 2},
+    }
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from agent.providers import (
+    CircuitBreaker,
+    FallbackProvider,
+    ProviderError,
+    ResilientProvider,
+    TokenBucket,
+    run_sync,
+)
+from agent.providers.base import Provider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class Scripted(Provider):
+    """Raises the queued errors in order, then answers."""
+
+    def __init__(self, name, errors=(), model="m"):
+        super().__init__({"model": model})
+        self.name = name
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_patch(self, prompt, cycle_dir):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"{self.name} ok"
+
+
+def test_token_bucket_makes_callers_wait_for_refill():
+    clock = Clock()
+    bucket = TokenBucket(60, clock)  # one per second
+
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    clock.now += 3
+    assert bucket.reserve(1) == 0
+
+
+def test_retries_rate_limits_with_backoff_but_not_client_errors(tmp_path):
+    clock = Clock()
+    inner = Scripted("api", [ProviderError("slow down", 429), ProviderError("boom", 503)])
+    provider = ResilientProvider(
+        inner, {"max_retries": 3, "backoff_base": 1}, clock=clock, sleep=clock.sleep
+    )
+
+    assert provider.generate_patch("p", str(tmp_path)) == "api ok"
+    assert inner.calls == 3 and len(clock.slept) == 2
+    assert 0 <= clock.slept[1] <= 2
+
+    bad = ResilientProvider(
+        Scripted("api", [ProviderError("bad key", 401)]), clock=clock, sleep=clock.sleep
+    )
+    with pytest.raises(ProviderError):
+        bad.generate_patch("p", str(tmp_path))
+    assert bad.attempts == 1
+
+
+def test_only_transport_errors_retry_without_a_status(tmp_path):
+    clock = Clock()
+    config = ResilientProvider(
+        Scripted("api", [ProviderError("No API key stored")]),
+        {"max_retries": 3},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    with pytest.raises(ProviderError):
+        config.generate_patch("p", str(tmp_path))
+    assert config.attempts == 1
+
+    refused = Scripted("ollama", [ProviderError("connection refused", transient=True)])
+    provider = ResilientProvider(refused, {"max_retries": 3}, clock=clock, sleep=clock.sleep)
+    assert provider.generate_patch("p", str(tmp_path)) == "ollama ok"
+    assert refused.calls == 2
+
+
+def test_retries_stop_at_the_time_budget(tmp_path):
+    clock = Clock()
+    inner = Scripted("api", [ProviderError("busy", 503)] * 10)
+    provider = ResilientProvider(
+        inner,
+        {"max_retries": 10, "backoff_base": 8, "backoff_max": 8, "max_retry_seconds": 20},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    provider._delay = lambda attempt: 8.0  # drop the jitter
+
+    with pytest.raises(ProviderError):
+        provider.generate_patch("p", str(tmp_path))
+    assert inner.calls == 3 and clock.now == 16
+
+
+def test_circuit_opens_then_half_opens_after_reset():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=2, reset_seconds=30, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow() and not breaker.allow()  # one trial call only
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_in_a_half_open_trial_reopens_the_circuit(tmp_path):
+    clock = Clock()
+    inner = Scripted("ollama", [TypeError("bad payload")])
+    provider = ResilientProvider(
+        inner, {"breaker_failures": 1, "breaker_reset_seconds": 30}, clock=clock, sleep=clock.sleep
+    )
+    provider.breaker.record(False)
+    clock.now += 30
+
+    with pytest.raises(TypeError):
+        provider.generate_patch("p", str(tmp_path))
+    assert provider.breaker.state == "open"
+
+    clock.now += 30
+    assert provider.generate_patch("p", str(tmp_path)) == "ollama ok"
+    assert provider.breaker.state == "closed"
+
+
+def test_fallback_chain_skips_a_degraded_provider(tmp_path):
+    clock = Clock()
+    failing = ResilientProvider(
+        Scripted("ollama", [ProviderError("down")] * 10),
+        {"max_retries": 0, "breaker_failures": 1, "breaker_reset_seconds": 60},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    backup = Scripted("openai")
+    chain = FallbackProvider([failing, backup])
+
+    assert chain.generate_patch("p", str(tmp_path)) == "openai ok"
+    assert run_sync(chain.variant(temperature=0.5).agenerate("p", str(tmp_path))) == "openai ok"
+    assert failing.inner.calls == 1  # the open circuit short-circuits the second request
+    record = json.loads((tmp_path / "provider_chain.json").read_text())
+    assert record["served_by"] == "openai:m"
+    assert "circuit open" in record["errors"][0]["error"]
+    assert chain.current_model() == "m"
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent.providers import httpclient  # noqa: E402
+from agent.providers.residency import ModelResidency, parse_keep_alive  # noqa: E402
+
+
+@pytest.fixture
+def ollama():
+    requests_seen = []
+    release = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            requests_seen.append(payload)
+            release.wait(5)
+            self._reply({
+                "model": payload["model"],
+                "response": "",
+                "done": True,
+                "load_duration": 1_500_000_000,
+            })
+
+        def do_GET(self):
+            self._reply({"models": [{"name": "deepseek-coder:6.7b-instruct"}]})
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests_seen, release
+    release.set()
+    httpclient.close_all()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_keep_alive_units():
+    assert parse_keep_alive("30m") == 1800
+    assert parse_keep_alive("300s") == 300
+    assert parse_keep_alive("1h") == 3600
+    assert parse_keep_alive(45) == 45
+    assert parse_keep_alive("-1") == -1
+    assert parse_keep_alive("soon") is None
+
+
+def test_keep_alive_spans_the_cooldown():
+    assert ModelResidency("http://x", "30m").keep_alive_for(120) == "30m"
+    assert ModelResidency("http://x", "1m").keep_alive_for(600) == 660
+    assert ModelResidency("http://x", -1).keep_alive_for(10_000) == -1
+    assert ModelResidency("http://x").keep_alive_for(120) == 180
+
+
+def test_warm_async_dedupes_in_flight_loads(ollama):
+    url, seen, release = ollama
+    residency = ModelResidency(url, "10m")
+    try:
+        first = residency.warm_async("deepseek-coder:6.7b-instruct")
+        assert residency.warm_async("deepseek-coder:6.7b-instruct") is first
+        release.set()
+        record = first.result(timeout=5)
+    finally:
+        residency.close()
+
+    assert len(seen) == 1
+    assert seen[0] == {"model": "deepseek-coder:6.7b-instruct", "keep_alive": "10m"}
+    assert record["ok"] and record["load_ms"] == 1500
+    assert residency.drain() == [record]
+    assert residency.drain() == []
+
+
+def test_failed_warmup_is_recorded_not_raised():
+    residency = ModelResidency("http://127.0.0.1:9", timeout=1)
+    started = time.time()
+    record = residency.warm("missing")
+    residency.close()
+
+    assert record["ok"] is False and record["error"]
+    assert time.time() - started < 30
+
+
+def test_loaded_lists_resident_models(ollama):
+    url, _, _ = ollama
+    assert ModelResidency(url).loaded() == ["deepseek-coder:6.7b-instruct"]
+
+
+def _loop(tmp_path, url, router=None):
+    import subprocess
+
+    from agent.run import AgentLoop
+
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    cfg = {
+        "provider": {"type": "ollama", "model": "small", "base_url": url, "use_api": True},
+        "loop": {"fast_path_on_fs_change": False},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    if router:
+        cfg["router"] = router
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    return AgentLoop(repo, cfg), repo / "agent" / "config.json", cfg
+
+
+def _wait_for(seen, count):
+    deadline = time.time() + 5
+    while len(seen) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_controls_warm_and_switch_only_when_the_configured_model_changes(tmp_path, ollama):
+    url, seen, release = ollama
+    release.set()
+    loop, config_path, cfg = _loop(tmp_path, url)
+    try:
+        loop._refresh_controls()
+        loop._refresh_controls()
+        assert seen == [] and loop.provider.current_model() == "small"
+
+        cfg["provider"]["model"] = "big"
+        config_path.write_text(json.dumps(cfg), encoding="utf-8")
+        loop._refresh_controls()
+        loop._refresh_controls()
+        _wait_for(seen, 1)
+    finally:
+        loop.residency.close()
+
+    assert [p["model"] for p in seen] == ["big"]
+    assert loop.provider.current_model() == "big"
+
+
+def test_controls_leave_model_choice_to_the_router(tmp_path, ollama):
+    url, seen, release = ollama
+    release.set()
+    router = {
+        "enabled": True,
+        "tiers": [{"name": "fast", "model": "small"}, {"name": "strong", "model": "big"}],
+    }
+    loop, config_path, cfg = _loop(tmp_path, url, router)
+    try:
+        loop.provider.set_model("big")  # chosen by the router for this cycle
+        cfg["provider"]["model"] = "other"
+        config_path.write_text(json.dumps(cfg), encoding="utf-8")
+        loop._refresh_controls()
+    finally:
+        loop.residency.close()
+
+    assert seen == [] and loop.provider.current_model() == "big"
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+from agent.providers import (
+    CachingProvider,
+    FallbackProvider,
+    ProviderError,
+    ResponseCache,
+    run_sync,
+)
+from agent.providers.base import Provider
+from agent.providers.cache import cache_key
+
+
+class Counting(Provider):
+    name = "counting"
+
+    def __init__(self, config=None):
+        super().__init__({"model": "m", "temperature": 0.2, **(config or {})})
+        self.calls = 0
+
+    def generate_patch(self, prompt, cycle_dir):
+        self.calls += 1
+        return f"answer to {prompt} #{self.calls}"
+
+
+def test_repeated_prompt_is_served_from_cache(tmp_path):
+    inner = Counting()
+    events = []
+    provider = CachingProvider(
+        inner, ResponseCache(tmp_path / "cache"), on_event=lambda hit, key: events.append(hit)
+    )
+
+    first = provider.generate_patch("p", str(tmp_path / "c1"))
+    second = provider.generate_patch("p", str(tmp_path / "c2"))
+    other = provider.variant(temperature=0.9).generate_patch("p", str(tmp_path / "c3"))
+
+    assert first == second == "answer to p #1"
+    assert other == "answer to p #2"
+    assert inner.calls == 1 and events == [False, True, False]
+    assert (tmp_path / "c2" / "provider_output.txt").read_text() == first
+    assert json.loads((tmp_path / "c2" / "provider_cache.json").read_text())["hit"] is True
+    assert run_sync(provider.agenerate("p", str(tmp_path / "c4"))) == first
+
+
+def test_replay_mode_never_calls_the_provider(tmp_path):
+    cache = ResponseCache(tmp_path / "cache")
+    CachingProvider(Counting(), cache).generate_patch("known", str(tmp_path / "c1"))
+    inner = Counting()
+    replay = CachingProvider(inner, cache, mode="replay")
+
+    assert replay.generate_patch("known", str(tmp_path / "c2")) == "answer to known #1"
+    with pytest.raises(ProviderError):
+        replay.generate_patch("unknown", str(tmp_path / "c3"))
+    assert inner.calls == 0
+
+
+class Down(Counting):
+    name = "down"
+
+    def generate_patch(self, prompt, cycle_dir):
+        self.calls += 1
+        raise ProviderError("unavailable", transient=True)
+
+
+def test_fallback_answer_is_cached_under_the_serving_provider(tmp_path):
+    cache = ResponseCache(tmp_path / "cache")
+    primary, backup = Down({"model": "big"}), Counting({"model": "small"})
+    provider = CachingProvider(FallbackProvider([primary, backup]), cache)
+
+    assert provider.generate_patch("p", str(tmp_path / "c1")) == "answer to p #1"
+    assert provider.generate_patch("p", str(tmp_path / "c2")) == "answer to p #2"
+
+    assert primary.calls == 2 and backup.calls == 2
+    assert cache.get(ResponseCache.digest(cache_key(primary, "p"))) is None
+    replayed = CachingProvider(backup, cache).generate_patch("p", str(tmp_path / "c3"))
+    assert replayed == "answer to p #2"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "cache", max_bytes=10_000)
+    for index in range(3):
+        cache.put(f"{index:02d}" * 32, {"n": index}, "x" * 3000)
+        path = cache._path(f"{index:02d}" * 32)
+        os.utime(path, (1000 + index, 1000 + index))
+    assert cache.get("00" * 32) is not None  # touch the oldest entry
+
+    cache.put("03" * 32, {"n": 3}, "x" * 3000)
+
+    assert cache.get("01" * 32) is None
+    assert cache.get("00" * 32) is not None and cache.get("03" * 32) is not None
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import agent.run as run_module
+from agent.run import AgentLoop, GateReport
+from agent.sandbox import SandboxError, WorktreePool
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        cwd=repo,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    (repo / "tracked.txt").write_text("one\n", encoding="utf-8")
+    (repo / ".gitignore").write_text("ignored.txt\n", encoding="utf-8")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "init")
+    return repo
+
+
+def _status(repo):
+    return subprocess.run(
+        ["git", "status", "--porcelain"], cwd=repo, capture_output=True, text=True
+    ).stdout
+
+
+def test_sandbox_mirrors_live_tree_without_touching_it(tmp_path):
+    repo = _repo(tmp_path)
+    (repo / "tracked.txt").write_text("two\n", encoding="utf-8")
+    (repo / "untracked.txt").write_text("new\n", encoding="utf-8")
+    (repo / "ignored.txt").write_text("skip\n", encoding="utf-8")
+    (repo / "agent" / "local").mkdir(parents=True)
+    (repo / "agent" / "local" / "secret.txt").write_text("key\n", encoding="utf-8")
+    status_before = _status(repo)
+
+    pool = WorktreePool(repo, size=1)
+    try:
+        with pool.acquire() as sandbox:
+            assert (sandbox.path / "tracked.txt").read_text() == "two\n"
+            assert (sandbox.path / "untracked.txt").read_text() == "new\n"
+            assert not (sandbox.path / "ignored.txt").exists()
+            assert not (sandbox.path / "agent" / "local").exists()
+            (sandbox.path / "tracked.txt").write_text("sandbox edit\n", encoding="utf-8")
+            (sandbox.path / "stray.txt").write_text("junk\n", encoding="utf-8")
+
+        assert (repo / "tracked.txt").read_text() == "two\n"
+        assert _status(repo) == status_before
+
+        # The same worktree is handed out again, reset to the new snapshot.
+        (repo / "untracked.txt").write_text("newer\n", encoding="utf-8")
+        with pool.acquire() as sandbox:
+            assert sandbox.index == 0
+            assert (sandbox.path / "tracked.txt").read_text() == "two\n"
+            assert (sandbox.path / "untracked.txt").read_text() == "newer\n"
+            assert not (sandbox.path / "stray.txt").exists()
+    finally:
+        pool.close(remove=True)
+    assert pool.paths() == []
+
+
+def test_concurrent_acquires_never_exceed_pool_size(tmp_path, monkeypatch):
+    repo = _repo(tmp_path)
+    pool = WorktreePool(repo, size=2)
+    snapshot = pool.snapshot()
+    real_create = pool._create
+    failed = []
+
+    def flaky_create(snap, index):
+        if not failed:  # the first creation fails and must give its slot back
+            failed.append(index)
+            raise SandboxError("worktree add failed")
+        time.sleep(0.1)  # widen the window between the size check and creation
+        return real_create(snap, index)
+
+    monkeypatch.setattr(pool, "_create", flaky_create)
+    used = []
+
+    def worker():
+        try:
+            with pool.acquire(snapshot, timeout=10) as sandbox:
+                used.append(sandbox.index)
+                time.sleep(0.05)
+        except SandboxError:
+            pass
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(used) == 5
+        assert set(used) == {0, 1}
+        assert len(pool.paths()) == 2
+    finally:
+        pool.close(remove=True)
+
+
+PROVIDER_SCRIPT = r'''
+import sys
+sys.stdin.read()
+print("```diff")
+print("diff --git a/tracked.txt b/tracked.txt")
+print("--- a/tracked.txt")
+print("+++ b/tracked.txt")
+print("@@ -1 +1 @@")
+print("-one")
+print("+patched")
+print("```")
+'''
+
+
+def _loop(tmp_path, monkeypatch, allow, during_gate=None):
+    repo = _repo(tmp_path)
+    script = tmp_path / "provider.py"
+    script.write_text(PROVIDER_SCRIPT, encoding="utf-8")
+    cfg = {
+        "provider": {"type": "command", "command": {"args": [sys.executable, str(script)]}},
+        "loop": {
+            "max_cycles": 1,
+            "cooldown_seconds": 0,
+            "fast_path_on_fs_change": False,
+            "sandbox": {"enabled": True, "size": 1},
+        },
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    (repo / "agent").mkdir()
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    gated = []
+
+    def fake_gate(repo_root, cfg, cycle_dir, proposed_files=None, state_root=None, fail_fast=None):
+        gated.append((repo_root / "tracked.txt").read_text())
+        if during_gate is not None:
+            during_gate()
+        return GateReport(allow=allow, rationale=[] if allow else ["blocked"], results={})
+
+    monkeypatch.setattr(run_module, "run_production_gate", fake_gate)
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    try:
+        loop.run()
+    finally:
+        loop.sandboxes.close(remove=True)
+    meta = json.loads(next((repo / "agent" / "artifacts").glob("*/cycle.meta.json")).read_text())
+    return repo, gated, meta
+
+
+def test_failed_patch_never_reaches_working_tree(tmp_path, monkeypatch):
+    repo, gated, meta = _loop(tmp_path, monkeypatch, allow=False)
+
+    assert gated == ["patched\n"]
+    assert (repo / "tracked.txt").read_text() == "one\n"
+    assert meta["applied"] is False
+    assert meta["sandbox"]["applies"] is True
+
+
+def test_passing_patch_is_applied_after_sandbox_gate(tmp_path, monkeypatch):
+    repo, gated, meta = _loop(tmp_path, monkeypatch, allow=True)
+
+    assert gated == ["patched\n"]
+    assert (repo / "tracked.txt").read_text() == "patched\n"
+    assert meta["applied"] is True
+
+
+def test_passing_patch_is_not_applied_when_the_live_tree_moved(tmp_path, monkeypatch):
+    def edit_live_tree():
+        (tmp_path / "repo" / "tracked.txt").write_text("edited meanwhile\n", encoding="utf-8")
+
+    repo, gated, meta = _loop(tmp_path, monkeypatch, allow=True, during_gate=edit_live_tree)
+
+    assert gated == ["patched\n"]
+    assert (repo / "tracked.txt").read_text() == "edited meanwhile\n"
+    assert not list(repo.glob("*.rej"))
+    assert meta["applied"] is False and meta["gate"]["allow"] is False
+    assert "no longer applies" in meta["gate"]["rationale"][-1]
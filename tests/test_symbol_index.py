@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import subprocess
+import time
+
+import pytest
+
+from agent.context import ContextBuilder, add_cycle_context
+from agent.symbols import Symbol, SymbolIndex, definition_source, names_in_output
+
+CALC = '''\
+import math
+from os import path
+
+
+class Calculator:
+    @staticmethod
+    def total(values):
+        return sum(values)
+
+    def mean(self, values):
+        return self.total(values) / len(values)
+
+
+def helper():
+    return math.pi
+'''
+
+TRACEBACK = '''\
+Traceback (most recent call last):
+  File "calc.py", line 11, in mean
+    return self.total(values) / len(values)
+ZeroDivisionError: division by zero
+'''
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    (repo / "calc.py").write_text(CALC)
+    (repo / "broken.py").write_text("def oops(:\n")
+    return repo
+
+
+def test_sync_indexes_definitions_and_imports(tmp_path):
+    repo = _repo(tmp_path)
+    index = SymbolIndex(tmp_path / "index.json")
+
+    assert index.sync(repo)
+
+    assert [(s.qualname, s.kind, s.start, s.end) for s in index.lookup("Calculator.total")] == [
+        ("Calculator.total", "method", 6, 8)
+    ]
+    assert index.lookup("helper")[0].kind == "function"
+    assert index.imports("calc.py") == ["math", "os.path"]
+    assert index.enclosing("calc.py", 11).qualname == "Calculator.mean"
+    assert index.files["broken.py"]["symbols"] == []
+
+
+def test_only_changed_blobs_are_reparsed(tmp_path):
+    repo = _repo(tmp_path)
+    index = SymbolIndex(tmp_path / "index.json")
+    index.sync(repo)
+    index.save()
+
+    reloaded = SymbolIndex(tmp_path / "index.json")
+    reloaded.sync(repo)
+    assert reloaded.parsed == 0
+
+    (repo / "calc.py").write_text(CALC + "\n\ndef extra():\n    pass\n")
+    reloaded.refresh(repo, [repo / "calc.py", repo / "notes.txt"])
+    assert reloaded.parsed == 1
+    assert reloaded.lookup("extra")
+
+    (repo / "broken.py").unlink()
+    reloaded.refresh(repo, [repo / "broken.py"])
+    assert "broken.py" not in reloaded.files
+
+
+def test_refresh_drops_files_under_a_removed_directory(tmp_path):
+    repo = _repo(tmp_path)
+    (repo / "pkg").mkdir()
+    (repo / "pkg" / "mod.py").write_text("def inner():\n    pass\n")
+    index = SymbolIndex(tmp_path / "index.json")
+    index.sync(repo)
+    assert index.lookup("inner")
+
+    (repo / "pkg" / "mod.py").unlink()
+    (repo / "pkg").rmdir()
+    index.refresh(repo, [repo / "pkg"])
+
+    assert "pkg/mod.py" not in index.files and not index.lookup("inner")
+
+
+def test_long_definition_is_windowed_around_the_failing_line(tmp_path):
+    body = "".join(f"    x{n} = {n}\n" for n in range(200))
+    (tmp_path / "big.py").write_text("def big():\n" + body)
+    symbol = Symbol("big", "big", "function", "big.py", 1, 201)
+
+    head = definition_source(tmp_path, symbol, max_lines=20)
+    around = definition_source(tmp_path, symbol, max_lines=20, focus=150)
+    tail = definition_source(tmp_path, symbol, max_lines=20, focus=200)
+
+    assert "    1 def big():" in head and "[181 more lines]" in head
+    assert "  150     x148 = 148" in around
+    assert "[139 lines above]" in around and "[42 more lines]" in around
+    assert "  201     x199 = 199" in tail and "more lines" not in tail
+
+
+def test_traceback_pulls_enclosing_definition_into_context(tmp_path):
+    repo = _repo(tmp_path)
+    index = SymbolIndex(tmp_path / "index.json")
+    index.sync(repo)
+    builder = ContextBuilder(None)
+
+    add_cycle_context(builder, repo, {"test": {"code": 1, "output": TRACEBACK}}, symbols=index)
+
+    sources = [s.text for s in builder.sections if s.name.startswith("source:")]
+    assert sources[0].startswith("# calc.py:10-11 method Calculator.mean")
+    assert any("Calculator.total" in text for text in sources)
+    assert "mean" in names_in_output(TRACEBACK)
+
+
+def test_monitor_events_drop_deleted_and_renamed_files(tmp_path):
+    pytest.importorskip("watchdog")
+    from agent.run import FastPathMonitor
+
+    repo = _repo(tmp_path)
+    (repo / "gone.py").write_text("def vanished():\n    pass\n")
+    (repo / "old_name.py").write_text("def renamed():\n    pass\n")
+    index = SymbolIndex(tmp_path / "index.json")
+    index.sync(repo)
+    monitor = FastPathMonitor(repo, enabled=True)
+    try:
+        (repo / "gone.py").unlink()
+        (repo / "old_name.py").rename(repo / "new_name.py")
+        deadline = time.time() + 5
+        paths = []
+        expected = {"gone.py", "old_name.py", "new_name.py"}
+        while time.time() < deadline and not expected <= {p.name for p in paths}:
+            time.sleep(0.05)
+            paths += monitor.drain()
+    finally:
+        monitor.stop()
+
+    index.refresh(repo, paths)
+
+    assert not index.lookup("vanished")
+    assert "old_name.py" not in index.files
+    assert [s.path for s in index.lookup("renamed")] == ["new_name.py"]
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from agent.analyzers.base import CommandResult
+from agent.analyzers.impact import TestImpactIndex
+from agent.analyzers.pytest_cov import PytestCoverageAnalyzer
+from agent.run import evaluate_gate
+
+
+def _coverage_payload(root):
+    return {
+        "files": {
+            f"{root}/pkg/core.py": {
+                "contexts": {
+                    "1": [""],
+                    "5": ["tests/test_core.py::test_add", "tests/test_api.py::test_call|run"],
+                }
+            },
+            "pkg/api.py": {"contexts": {"3": ["tests/test_api.py::test_call"]}},
+            "pkg/unused.py": {"contexts": {"1": [""]}},
+        }
+    }
+
+
+def test_rebuild_maps_sources_to_test_files(tmp_path):
+    index = TestImpactIndex(tmp_path / "impact.json")
+    index.rebuild(_coverage_payload(str(tmp_path)), str(tmp_path))
+    index.save()
+
+    reloaded = TestImpactIndex(tmp_path / "impact.json")
+    assert reloaded.files["pkg/core.py"] == ["tests/test_api.py", "tests/test_core.py"]
+    assert reloaded.files["pkg/api.py"] == ["tests/test_api.py"]
+    assert reloaded.files["pkg/unused.py"] == []
+
+
+def test_plan_selects_impacted_tests(tmp_path):
+    index = TestImpactIndex(tmp_path / "impact.json")
+    index.rebuild(_coverage_payload(str(tmp_path)), str(tmp_path))
+
+    tests, _ = index.plan(["pkg/api.py", "tests/test_new.py", "README.md"])
+
+    assert tests == ["tests/test_api.py", "tests/test_new.py"]
+
+
+def test_plan_falls_back_to_full_suite(tmp_path):
+    index = TestImpactIndex(tmp_path / "impact.json")
+    index.rebuild(_coverage_payload(str(tmp_path)), str(tmp_path))
+
+    assert index.plan(["pkg/brand_new.py"])[0] is None
+    assert index.plan(["pkg/unused.py"])[0] is None  # only executed at import time
+    assert index.plan(["README.md"])[0] == []
+    assert index.plan(["tests/conftest.py"])[0] is None
+    assert index.plan([])[0] is None
+
+
+def test_full_run_schedule(tmp_path):
+    index = TestImpactIndex(tmp_path / "impact.json")
+    assert index.full_run_reason(full_every=3, max_age=None) == "no impact index yet"
+
+    index.rebuild({"files": {}}, str(tmp_path))
+    assert index.full_run_reason(full_every=3, max_age=None) is None
+
+    index.runs_since_full = 3
+    assert "scheduled" in index.full_run_reason(full_every=3, max_age=None)
+
+    index.runs_since_full = 0
+    index.built_at = time.time() - 100
+    assert index.full_run_reason(full_every=3, max_age=10) is not None
+
+
+def test_parallel_gates_do_not_drop_index_updates(tmp_path):
+    path = tmp_path / "impact.json"
+    builder = TestImpactIndex(path)
+    builder.rebuild(_coverage_payload(str(tmp_path)), str(tmp_path))
+    gates = [TestImpactIndex(path) for _ in range(4)]  # loaded before the rebuild lands
+    builder.save()
+
+    threads = []
+    for gate in gates:
+        gate.record_selective_run()
+        threads.append(threading.Thread(target=gate.save))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = TestImpactIndex(path)
+    assert merged.runs_since_full == 4
+    assert merged.files["pkg/api.py"] == ["tests/test_api.py"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+class _StubCoverage(PytestCoverageAnalyzer):
+    """Records commands; ``coverage json`` writes a payload with contexts."""
+
+    def __init__(self, settings, repo_root, pytest_code, payload=None):
+        super().__init__(settings)
+        self.repo_root = repo_root
+        self.pytest_code = pytest_code
+        self.payload = payload or {
+            "files": {"pkg/mod.py": {"contexts": {"1": ["tests/test_mod.py::test_ok|run"]}}}
+        }
+        self.commands = []
+
+    def available(self):
+        return True
+
+    def _run(self, cmd, cwd=None, timeout=1200, env=None):
+        self.commands.append(list(cmd))
+        code = 0
+        if cmd[:2] == ["coverage", "run"]:
+            code = self.pytest_code
+        elif cmd[:2] == ["coverage", "json"]:
+            coverage_json = self.repo_root / "coverage.json"
+            coverage_json.write_text(json.dumps(self.payload), encoding="utf-8")
+        return CommandResult(cmd, code, "", 0.0)
+
+
+def test_full_run_with_failing_tests_still_builds_index(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "cycle").mkdir(parents=True)
+    index_path = tmp_path / "impact.json"
+    analyzer = _StubCoverage({"impact_index": str(index_path)}, repo, pytest_code=1)
+
+    result = analyzer.run_analysis(str(repo), str(repo / "cycle"))
+
+    pytest_cmd = next(c for c in analyzer.commands if c[:2] == ["coverage", "run"])
+    assert "--maxfail=1" not in pytest_cmd
+    assert result.status == "failed" and result.data["selection"]["index_rebuilt"] is True
+    assert TestImpactIndex(index_path).files == {"pkg/mod.py": ["tests/test_mod.py"]}
+
+    interrupted = _StubCoverage({"impact_index": str(tmp_path / "other.json")}, repo, pytest_code=2)
+    interrupted.run_analysis(str(repo), str(repo / "cycle"))
+    assert TestImpactIndex(tmp_path / "other.json").empty
+
+
+def test_uncovered_change_runs_the_full_suite(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "cycle").mkdir(parents=True)
+    index_path = tmp_path / "impact.json"
+    index = TestImpactIndex(index_path)
+    index.rebuild(_coverage_payload(str(repo)), str(repo))
+    index.save()
+    analyzer = _StubCoverage({"impact_index": str(index_path)}, repo, pytest_code=0)
+
+    files = ["pkg/unused.py", "README.md"]
+    result = analyzer.run_analysis(str(repo), str(repo / "cycle"), files=files)
+
+    assert result.data["selection"]["mode"] == "full"
+    assert any(c[:2] == ["coverage", "run"] for c in analyzer.commands)
+
+    docs = _StubCoverage({"impact_index": str(index_path)}, repo, pytest_code=0)
+    docs_only = docs.run_analysis(str(repo), str(repo / "cycle"), files=["README.md"])
+    assert docs_only.data["selection"]["mode"] == "impacted"
+    assert docs.commands == []
+
+
+def test_impacted_run_holds_changed_files_to_the_coverage_threshold(tmp_path):
+    repo = tmp_path / "repo"
+    (repo / "cycle").mkdir(parents=True)
+    index_path = tmp_path / "impact.json"
+    index = TestImpactIndex(index_path)
+    index.rebuild(_coverage_payload(str(repo)), str(repo))
+    index.save()
+    payload = {
+        "totals": {"percent_covered": 20.0},
+        "files": {
+            "pkg/api.py": {"summary": {"covered_lines": 3, "num_statements": 10}},
+            "pkg/core.py": {"summary": {"covered_lines": 50, "num_statements": 50}},
+        },
+    }
+    settings = {"impact_index": str(index_path)}
+    analyzer = _StubCoverage(settings, repo, pytest_code=0, payload=payload)
+
+    result = analyzer.run_analysis(str(repo), str(repo / "cycle"), files=["pkg/api.py"])
+    selection = result.data["selection"]
+    allow, rationale = evaluate_gate({"pytest_cov": result}, {"min_coverage": 0.5}, {})
+
+    assert selection["mode"] == "impacted"
+    assert selection["changed_coverage"] == {"files": ["pkg/api.py"], "percent_covered": 30.0}
+    assert not allow and rationale == ["changed-file coverage 0.30 below threshold 0.50"]
+    assert evaluate_gate({"pytest_cov": result}, {"min_coverage": 0.25}, {})[0]
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import threading
+
+from agent.run import AgentLoop
+from agent.tokens import (
+    Usage,
+    UsageLedger,
+    count_tokens,
+    heuristic_tokens,
+    usage_from_response,
+    usage_from_stats,
+)
+
+
+def test_heuristic_counts_code_pieces():
+    assert heuristic_tokens("") == 0
+    assert heuristic_tokens("def foo(x):") == 6  # def, foo, (, x, ), :
+    assert heuristic_tokens("generate_patch") == 4  # gener/ate, _, patch
+    assert heuristic_tokens("123456") == 2
+    assert heuristic_tokens("a\n    b") == 3
+    assert count_tokens("") == 0
+    assert count_tokens("x = 1") > 0
+
+
+def test_usage_from_each_provider_response():
+    openai = usage_from_response({"usage": {"prompt_tokens": 12, "completion_tokens": 5}})
+    anthropic = usage_from_response({"usage": {"input_tokens": 7, "output_tokens": 3}})
+    gemini = usage_from_response(
+        {"usageMetadata": {"promptTokenCount": 9, "candidatesTokenCount": 4}}
+    )
+    ollama = usage_from_response({
+        "prompt_eval_count": 100,
+        "eval_count": 50,
+        "prompt_eval_duration": 200_000_000,
+        "eval_duration": 2_500_000_000,
+        "total_duration": 3_000_000_000,
+    })
+
+    assert (openai.prompt_tokens, openai.completion_tokens) == (12, 5)
+    assert (anthropic.prompt_tokens, anthropic.completion_tokens) == (7, 3)
+    assert (gemini.prompt_tokens, gemini.completion_tokens) == (9, 4)
+    assert (ollama.prefill_ms, ollama.decode_ms, ollama.total_ms) == (200, 2500, 3000)
+    assert ollama.tokens_per_second == 20.0
+    assert usage_from_response({"choices": []}) is None
+
+
+def test_usage_from_stats_reads_both_layouts():
+    ollama = usage_from_stats(
+        {"prompt_eval_count": 10, "eval_count": 4, "eval_ms": 200, "prompt_eval_ms": 30}
+    )
+    hosted = usage_from_stats({"prompt_tokens": 8, "completion_tokens": 2, "total_ms": 400})
+
+    assert (ollama.prompt_tokens, ollama.prefill_ms, ollama.decode_ms) == (10, 30, 200)
+    assert (hosted.prompt_tokens, hosted.total_ms, hosted.tokens_per_second) == (8, 400, 5.0)
+    assert usage_from_stats({"total_ms": 10}) is None
+
+
+def test_ledger_aggregates_per_model_and_task_and_flags_slow_decodes(tmp_path):
+    path = tmp_path / "usage.json"
+    ledger = UsageLedger(path, slow_ratio=0.5, min_samples=2)
+    fast = Usage(100, 40, prefill_ms=50, decode_ms=1000, source="provider")
+
+    ledger.record("m", "fix tests", fast, estimate=90)
+    ledger.record("m", "fix tests", fast, estimate=90)
+    slow = ledger.record("m", None, Usage(100, 40, decode_ms=4000, source="provider"), estimate=90)
+
+    assert slow["slow"] is True and slow["baseline_tokens_per_second"] == 40.0
+    summary = UsageLedger(path).summary()
+    model = summary["models"]["m"]
+    assert (model["calls"], model["prompt_tokens"], model["prefill_ms"]) == (3, 300, 100)
+    assert model["tokens_per_second"] == 20.0
+    assert summary["tasks"]["fix tests"]["calls"] == 2
+    assert summary["tasks"]["(no task)"]["calls"] == 1
+    assert json.loads(path.read_text())["models"]["m"]["estimated_prompt_tokens"] == 270
+
+
+def test_loop_records_usage_per_cycle_and_model(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    script = tmp_path / "provider.py"
+    script.write_text("import sys\nsys.stdin.read()\nprint('no diff here')\n", encoding="utf-8")
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, str(script)]},
+            "model": "small",
+        },
+        "loop": {"max_cycles": 2, "cooldown_seconds": 0, "fast_path_on_fs_change": False},
+        "commands": {},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    (repo / "agent" / "config.json").write_text(json.dumps(cfg), encoding="utf-8")
+    monkeypatch.chdir(repo)
+
+    loop = AgentLoop(repo, cfg)
+    loop.run()
+
+    artifacts = repo / "agent" / "artifacts"
+    metas = [json.loads(p.read_text()) for p in artifacts.glob("*/cycle.meta.json")]
+    assert [len(m["usage"]) for m in metas] == [1, 1]
+    usage = metas[0]["usage"][0]
+    assert usage["source"] == "estimate"
+    assert usage["prompt_tokens"] == usage["estimated_prompt_tokens"] > 0
+    assert loop.usage.summary()["models"]["small"]["calls"] == 2
+
+
+def test_cache_hits_carry_no_timing_and_fallbacks_charge_the_serving_model(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "agent").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    cfg = {
+        "provider": {
+            "type": "command",
+            "command": {"args": [sys.executable, "-c", "print()"]},
+            "model": "small",
+        },
+        "loop": {"fast_path_on_fs_change": False},
+        "git": {"commit": False},
+        "sessions": {"enabled": False},
+    }
+    monkeypatch.chdir(repo)
+    loop = AgentLoop(repo, cfg)
+    loop.provider.set_model("small")
+    hit_dir, fallback_dir = tmp_path / "hit", tmp_path / "fallback"
+    hit_dir.mkdir()
+    fallback_dir.mkdir()
+    (hit_dir / "provider_cache.json").write_text(json.dumps({"hit": True}))
+    (fallback_dir / "provider_chain.json").write_text(
+        json.dumps({"served_by": "openai:gpt-4o-mini", "errors": []})
+    )
+    (fallback_dir / "provider_stats.json").write_text(
+        json.dumps({"prompt_tokens": 10, "completion_tokens": 5, "total_ms": 100})
+    )
+
+    hit = loop._account_usage("prompt", "cached answer", hit_dir, 0.001)
+    served = loop._account_usage("prompt", "answer", fallback_dir, 0.1)
+
+    assert (hit["source"], hit["total_ms"], hit["tokens_per_second"], hit["model"]) == (
+        "cache",
+        None,
+        None,
+        "small",
+    )
+    assert (served["model"], served["tokens_per_second"]) == ("gpt-4o-mini", 50.0)
+    models = loop.usage.summary()["models"]
+    assert models["small"]["cached_calls"] == 1 and models["small"]["tokens_per_second"] is None
+    assert models["gpt-4o-mini"]["prompt_tokens"] == 10
+
+
+def test_ledger_writes_are_atomic_and_thread_safe(tmp_path):
+    path = tmp_path / "state" / "usage.json"
+    ledger = UsageLedger(path)
+
+    threads = [
+        threading.Thread(target=ledger.record, args=("m", "task", Usage(10, 5, source="provider")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert UsageLedger(path).models["m"]["calls"] == 8
+    assert [p.name for p in path.parent.iterdir()] == ["usage.json"]